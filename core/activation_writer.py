@@ -0,0 +1,190 @@
+import os
+import time
+import json
+import sqlite3
+import threading
+
+from .metrics import METRICAS
+
+SQL_ACTIVAR = ("UPDATE activaciones SET usado = 1, device_id = ?, fecha_uso = ? "
+               "WHERE token = ? AND usado = 0")
+SQL_ESTADO = "SELECT usado, device_id FROM activaciones WHERE token = ?"
+
+
+class EscritorActivaciones:
+    """
+    Escritura diferida de activaciones para una base SQLite.
+
+    `activar` decide la respuesta con una lectura (concurrente en WAL) más el mapa de
+    activaciones pendientes, y encola la escritura. Un hilo agrupa lo encolado cada
+    `intervalo` segundos en una sola transacción, así el único escritor de SQLite hace
+    una confirmación por lote en lugar de una por petición.
+
+    Seguridad ante caídas: cada activación aceptada se anota en un diario
+    (<base>.journal) y no se responde hasta que esa línea está en disco (fsync). El fsync
+    se agrupa: las peticiones que llegan mientras uno está en curso quedan cubiertas por
+    el siguiente, uno solo para todas. Al confirmar un lote el diario se rota y se borra;
+    al arrancar, lo que quede en los diarios se vuelve a aplicar (el UPDATE ... usado = 0
+    es idempotente).
+
+    Lectura de lo propio: mientras una activación está pendiente, cualquier consulta
+    del mismo token en este proceso ve el device_id encolado.
+    """
+
+    def __init__(self, ruta_db, intervalo=0.005, log=None):
+        self.ruta_db = str(ruta_db)
+        self.diario = self.ruta_db + ".journal"
+        self.intervalo = intervalo
+        self.log = log or (lambda m: None)
+        self.pendientes = {}   # token -> device_id aceptado y aún no confirmado
+        self._cola = []
+        self._candado = threading.Lock()
+        self._candado_fsync = threading.Lock()  # se toma siempre antes que _candado
+        self._escritos = 0       # líneas escritas en el diario
+        self._sincronizados = 0  # líneas que ya están en disco
+        self._hay_trabajo = threading.Event()
+        self._detener = False
+        self._recuperar()
+        self._archivo = open(self.diario, "a", encoding="utf-8")
+        self._hilo = threading.Thread(target=self._bucle, name="escritor-activaciones", daemon=True)
+        self._hilo.start()
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.ruta_db, timeout=30)
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _recuperar(self):
+        eventos = []
+        for ruta in (self.diario + ".lote", self.diario):
+            if os.path.exists(ruta):
+                with open(ruta, "r", encoding="utf-8") as f:
+                    for linea in f:
+                        try:
+                            eventos.append(tuple(json.loads(linea)))
+                        except ValueError:
+                            pass  # última línea incompleta por la caída
+        if eventos:
+            conn = self._conectar()
+            try:
+                with conn:
+                    conn.executemany(SQL_ACTIVAR, [(d, f, t) for t, d, f in eventos])
+            finally:
+                conn.close()
+            self.log(f"✓ Recuperadas {len(eventos)} activaciones del diario de {os.path.basename(self.ruta_db)}")
+        for ruta in (self.diario + ".lote", self.diario):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    def activar(self, conn, token, device_id):
+        """Devuelve el device_id asociado al token (puede ser otro) o None si el token no existe."""
+        pendiente = self.pendientes.get(token)
+        if pendiente is not None:
+            self._sincronizar(self._escritos)
+            return pendiente
+        fila = conn.execute(SQL_ESTADO, (token,)).fetchone()
+        if fila is None:
+            return None
+        if fila[0]:
+            return fila[1]
+        with self._candado:
+            if token in self.pendientes:
+                asociado, linea = self.pendientes[token], self._escritos
+            else:
+                # Entre la lectura de arriba y el candado un lote pudo confirmarse y salir de
+                # `pendientes`: se relee ya con el candado (fetchall cierra la lectura y la
+                # siguiente ve lo confirmado) para no aceptar un segundo dispositivo.
+                filas = conn.execute(SQL_ESTADO, (token,)).fetchall()
+                if filas and filas[0][0]:
+                    return filas[0][1]
+                # fecha_uso en UTC, igual que datetime('now') en la escritura directa
+                evento = (token, device_id, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()))
+                self._archivo.write(json.dumps(evento) + "\n")
+                self._escritos += 1
+                asociado, linea = device_id, self._escritos
+                self.pendientes[token] = device_id
+                self._cola.append(evento)
+        self._sincronizar(linea)
+        self._hay_trabajo.set()
+        return asociado
+
+    def _sincronizar(self, linea):
+        """Vuelve cuando el diario está en disco al menos hasta `linea` (fsync agrupado)."""
+        if self._sincronizados >= linea:
+            return
+        with self._candado_fsync:
+            if self._sincronizados >= linea:
+                return  # lo cubrió el fsync de otra petición mientras se esperaba
+            with self._candado:
+                hasta = self._escritos
+                self._archivo.flush()
+                descriptor = self._archivo.fileno()
+            os.fsync(descriptor)  # fuera de _candado: las demás peticiones siguen anotando
+            self._sincronizados = hasta
+
+    def _rotar(self):
+        """Toma todo lo encolado y empieza un diario nuevo; lo tomado queda en <diario>.lote."""
+        with self._candado_fsync, self._candado:
+            lote, self._cola = self._cola, []
+            if not lote:
+                self._hay_trabajo.clear()
+                return lote
+            self._archivo.flush()
+            os.fsync(self._archivo.fileno())
+            self._archivo.close()
+            self._sincronizados = self._escritos
+            if os.path.exists(self.diario + ".lote"):
+                # Quedó un lote sin confirmar (reintento): se le suma el diario actual
+                with open(self.diario + ".lote", "a", encoding="utf-8") as f, \
+                        open(self.diario, "r", encoding="utf-8") as actual:
+                    f.write(actual.read())
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.remove(self.diario)
+            else:
+                os.replace(self.diario, self.diario + ".lote")
+            self._archivo = open(self.diario, "a", encoding="utf-8")
+            return lote
+
+    def _confirmar(self, conn, lote):
+        with conn:
+            conn.executemany(SQL_ACTIVAR, [(d, f, t) for t, d, f in lote])
+        os.remove(self.diario + ".lote")
+        with self._candado:
+            for token, _, _ in lote:
+                self.pendientes.pop(token, None)
+
+    def _bucle(self):
+        conn = self._conectar()
+        try:
+            while True:
+                self._hay_trabajo.wait(0.5)
+                if self._detener and not self._cola:
+                    return
+                time.sleep(self.intervalo)  # deja que se acumulen más activaciones en el lote
+                lote = self._rotar()
+                if not lote:
+                    continue
+                try:
+                    self._confirmar(conn, lote)
+                    METRICAS.lotes_activacion.observar(len(lote))
+                except sqlite3.Error as e:
+                    # El lote sigue en <diario>.lote; vuelve al frente de la cola para reintentar
+                    self.log(f"✗ Error confirmando {len(lote)} activaciones, se reintenta: {e}")
+                    with self._candado:
+                        self._cola[:0] = lote
+                    self._hay_trabajo.set()
+                    time.sleep(0.5)
+        finally:
+            conn.close()
+
+    def cerrar(self, timeout=10):
+        """Confirma lo pendiente y detiene el hilo (apagado ordenado del servidor)."""
+        self._detener = True
+        self._hay_trabajo.set()
+        self._hilo.join(timeout)
+        with self._candado_fsync, self._candado:
+            self._archivo.close()
+        if not self._cola and os.path.exists(self.diario) and os.path.getsize(self.diario) == 0:
+            os.remove(self.diario)
+        self.log(f"✓ Escritor de activaciones detenido ({len(self._cola)} pendientes quedan en el diario)")
@@ -0,0 +1,55 @@
+import os
+
+from .icons import generar_iconos, color_promedio
+from .utils import escribir_si_cambia
+
+ADAPTATIVO_XML = """<?xml version="1.0" encoding="utf-8"?>
+<adaptive-icon xmlns:android="http://schemas.android.com/apk/res/android">
+    <background android:drawable="@color/ic_launcher_background" />
+    <foreground android:drawable="@mipmap/ic_launcher_foreground" />
+</adaptive-icon>
+"""
+
+FONDO_ICONO_XML = """<?xml version="1.0" encoding="utf-8"?>
+<resources>
+    <color name="ic_launcher_background">{color}</color>
+</resources>
+"""
+
+# El logo del splash es un PNG propio: un <bitmap> no puede apuntar a @mipmap/ic_launcher
+# cuando este es un ícono adaptativo (XML) en API 26+.
+SPLASH_XML = """<?xml version="1.0" encoding="utf-8"?>
+<layer-list xmlns:android="http://schemas.android.com/apk/res/android">
+    <item android:drawable="@color/splash_background" />
+    <item>
+        <bitmap
+            android:gravity="center"
+            android:src="@drawable/splash_logo" />
+    </item>
+</layer-list>
+"""
+
+
+def generar_recursos_android(log, portada, res_dir, cache_dir, fondo_icono=None, max_workers=None):
+    """
+    Genera los recursos de ícono y splash del APK a partir de la portada:
+    ícono cuadrado y redondo por densidad (API < 26), ícono adaptativo con capa frontal
+    y color de fondo (API 26+) y el drawable del splash con su logo.
+    No borra nada y solo reescribe los archivos cuyo contenido cambió, para que las
+    tareas de recursos de Gradle sigan al día entre builds del mismo libro.
+    Devuelve la lista de archivos escritos.
+    """
+    escritos = generar_iconos(log, portada, res_dir, cache_dir, max_workers)
+    xmls = {
+        os.path.join("mipmap-anydpi-v26", "ic_launcher.xml"): ADAPTATIVO_XML,
+        os.path.join("mipmap-anydpi-v26", "ic_launcher_round.xml"): ADAPTATIVO_XML,
+        os.path.join("values", "ic_launcher_background.xml"):
+            FONDO_ICONO_XML.format(color=fondo_icono or color_promedio(portada)),
+        os.path.join("drawable", "splash_background.xml"): SPLASH_XML,
+    }
+    for relativa, contenido in xmls.items():
+        destino = os.path.join(res_dir, relativa)
+        if escribir_si_cambia(destino, contenido):
+            escritos.append(destino)
+    log(f"✓ Ícono adaptativo y splash al día ({len(escritos)} archivos de recursos reescritos)")
+    return escritos
@@ -0,0 +1,115 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .io_utils import hash_conocido, recordar_hash
+from .www_sync import enlazar_o_copiar
+
+
+# Un .tmp más nuevo que esto puede ser una adopción en curso de otro proceso
+EDAD_MINIMA_TMP = 3600
+
+
+class AlmacenAssets:
+    """
+    Almacén global de assets direccionado por contenido: cada contenido distinto existe
+    una sola vez como <raiz>/<sha[:2]>/<sha> y los paquetes de todos los libros lo
+    referencian con enlaces duros.
+
+    El conteo de referencias es el propio contador de enlaces del sistema de archivos
+    (st_nlink): no hay índice que se pueda desincronizar si el proceso se corta, y borrar
+    un paquete o un www libera sus referencias sin avisar al almacén. Un blob con un solo
+    enlace solo lo referencia el almacén y `recolectar` lo elimina.
+
+    Los assets enlazados no deben modificarse en su lugar (cambiarían en todos los
+    libros): los pasos del generador que los transforman escriben un archivo nuevo y lo
+    reemplazan con os.replace, lo que rompe el enlace.
+    """
+
+    def __init__(self, raiz):
+        self.raiz = str(raiz)
+
+    def ruta_blob(self, sha):
+        return os.path.join(self.raiz, sha[:2], sha)
+
+    def adoptar(self, ruta):
+        """
+        Pasa `ruta` al almacén: si el contenido ya existía, `ruta` se reemplaza por un
+        enlace al blob (y se libera la copia); si no, el archivo mismo se convierte en el
+        blob. Devuelve (sha, bytes_ahorrados).
+        """
+        sha = hash_conocido(ruta)
+        blob = self.ruta_blob(sha)
+        if os.path.exists(blob):
+            if os.path.samefile(blob, ruta):
+                return sha, 0
+            tamano = os.path.getsize(ruta)
+            metodo = enlazar_o_copiar(blob, ruta)
+            recordar_hash(ruta, sha)
+            return sha, (tamano if metodo == "enlace" else 0)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(ruta, blob + ".tmp")
+            os.replace(blob + ".tmp", blob)
+        except OSError:
+            pass  # otro volumen o sin soporte de enlaces: el asset queda como copia independiente
+        return sha, 0
+
+    def adoptar_todos(self, log, rutas, max_workers=None):
+        """Adopta en paralelo (el hash domina y libera el GIL). Devuelve {ruta: sha}."""
+        rutas = [r for r in rutas if os.path.isfile(r)]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            resultados = list(pool.map(self.adoptar, rutas))
+        ahorrado = sum(b for _, b in resultados)
+        unicos = len({sha for sha, _ in resultados})
+        log(f"✓ Almacén de assets: {len(rutas)} assets, {unicos} contenidos distintos, "
+            f"{ahorrado / 1048576:.1f} MB compartidos con otros libros")
+        return {ruta: sha for ruta, (sha, _) in zip(rutas, resultados)}
+
+    def _blobs(self):
+        if not os.path.isdir(self.raiz):
+            return
+        with os.scandir(self.raiz) as prefijos:
+            for prefijo in prefijos:
+                if prefijo.is_dir(follow_symlinks=False):
+                    with os.scandir(prefijo.path) as it:
+                        yield from (e for e in it if e.is_file(follow_symlinks=False))
+
+    def recolectar(self, log):
+        """
+        Elimina los blobs que ya no referencia ningún paquete y los .tmp abandonados (más
+        viejos que EDAD_MINIMA_TMP). Devuelve los bytes liberados.
+        """
+        borrados = liberado = 0
+        ahora = time.time()
+        for entrada in list(self._blobs()):
+            try:
+                st = os.stat(entrada.path)  # DirEntry.stat no trae st_nlink en Windows
+            except OSError:
+                continue
+            if entrada.name.endswith(".tmp"):
+                borrar = ahora - st.st_mtime >= EDAD_MINIMA_TMP
+            else:
+                borrar = st.st_nlink <= 1
+            if borrar:
+                try:
+                    os.remove(entrada.path)
+                except OSError:
+                    continue
+                borrados += 1
+                liberado += st.st_size
+        if borrados:
+            log(f"✓ Almacén de assets: {borrados} blobs sin referencias eliminados ({liberado / 1048576:.1f} MB)")
+        return liberado
+
+    def estadisticas(self):
+        """{"blobs", "bytes", "referencias"}: bytes es lo que ocupa realmente el contenido único."""
+        blobs = total = refs = 0
+        for entrada in self._blobs():
+            if entrada.name.endswith(".tmp"):
+                continue
+            st = os.stat(entrada.path)
+            blobs += 1
+            total += st.st_size
+            refs += st.st_nlink - 1
+        return {"blobs": blobs, "bytes": total, "referencias": refs}
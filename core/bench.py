@@ -0,0 +1,201 @@
+import time
+import threading
+import statistics
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def _descargar(url, cabeceras, tam_bloque=256 * 1024):
+    req = urllib.request.Request(url, headers=cabeceras)
+    inicio = time.perf_counter()
+    total = 0
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        for bloque in iter(lambda: resp.read(tam_bloque), b""):
+            total += len(bloque)
+        estado = resp.status
+    return time.perf_counter() - inicio, total, estado
+
+
+def bench_estaticos(log, base_url, rutas, clientes=16, peticiones=64, cabeceras=None):
+    """
+    Descarga `rutas` desde un servidor local con `clientes` conexiones concurrentes
+    y reporta latencia (p50/p95) y rendimiento agregado en MB/s.
+    """
+    cabeceras = cabeceras or {}
+    urls = [f"{base_url.rstrip('/')}/{r.lstrip('/')}" for r in rutas]
+    tiempos, errores = [], 0
+    bytes_totales = 0
+    candado = threading.Lock()
+
+    def una(i):
+        nonlocal errores, bytes_totales
+        try:
+            dt, n, _ = _descargar(urls[i % len(urls)], cabeceras)
+            with candado:
+                tiempos.append(dt)
+                bytes_totales += n
+        except Exception:
+            with candado:
+                errores += 1
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as pool:
+        list(pool.map(una, range(peticiones)))
+    duracion = time.perf_counter() - inicio
+
+    resultado = {
+        "clientes": clientes,
+        "peticiones": peticiones,
+        "errores": errores,
+        "segundos": round(duracion, 3),
+        "mb_s": round(bytes_totales / duracion / 1e6, 1) if duracion else 0.0,
+        "p50_ms": round(_percentil(tiempos, 0.50) * 1000, 1),
+        "p95_ms": round(_percentil(tiempos, 0.95) * 1000, 1),
+        "media_ms": round(statistics.mean(tiempos) * 1000, 1) if tiempos else 0.0,
+    }
+    log(f"Benchmark {base_url} ({clientes} clientes, {peticiones} peticiones): "
+        f"{resultado['mb_s']} MB/s, p50 {resultado['p50_ms']} ms, p95 {resultado['p95_ms']} ms, "
+        f"{errores} errores")
+    return resultado
+
+
+def verificar_rangos(log, url):
+    """Comprueba que el servidor responde 206 con Content-Range y reanuda descargas parciales."""
+    req = urllib.request.Request(url, headers={"Range": "bytes=0-1023"})
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        ok = resp.status == 206 and len(resp.read()) <= 1024 and resp.headers.get("Content-Range", "").startswith("bytes 0-")
+    log(f"{'✓' if ok else '✗'} Range en {url}: {'206 Partial Content' if ok else 'sin soporte de rangos'}")
+    return ok
+
+
+def bench_metricas(log, rutas=("/health",), peticiones=5000):
+    """
+    Compara el rendimiento de create_app con y sin métricas usando el cliente de pruebas
+    de Flask (sin red), para aislar el costo de la instrumentación por petición.
+    """
+    from .server import create_app
+
+    resultados = {}
+    for activo in (False, True):
+        cliente = create_app(metricas=activo).test_client()
+        for ruta in rutas:  # calentamiento
+            cliente.get(ruta)
+        inicio = time.perf_counter()
+        for i in range(peticiones):
+            cliente.get(rutas[i % len(rutas)])
+        duracion = time.perf_counter() - inicio
+        resultados["con_metricas" if activo else "sin_metricas"] = peticiones / duracion
+    costo_us = (1 / resultados["con_metricas"] - 1 / resultados["sin_metricas"]) * 1e6
+    log(f"Métricas: {resultados['sin_metricas']:.0f} req/s sin, {resultados['con_metricas']:.0f} req/s con "
+        f"({costo_us:+.1f} µs por petición)")
+    resultados["costo_us"] = costo_us
+    return resultados
+
+
+def bench_activaciones(log, tokens=5000, hilos=16):
+    """
+    Activaciones por segundo sostenidas con `hilos` concurrentes sobre una base temporal:
+    escritura directa (una transacción por activación) frente a escritura diferida por lotes.
+    """
+    import os
+    import sqlite3
+    import tempfile
+    from .migrations import migrar
+    from .db import _activar_en_db
+    from .activation_writer import EscritorActivaciones
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for modo in ("directa", "diferida"):
+            ruta = os.path.join(tmp, f"{modo}.db")
+            conn = sqlite3.connect(ruta)
+            migrar(conn)
+            with conn:
+                conn.executemany("INSERT INTO activaciones (token, fecha_creacion) VALUES (?, datetime('now'))",
+                                 [(f"T{i}",) for i in range(tokens)])
+            conn.close()
+            escritor = EscritorActivaciones(ruta) if modo == "diferida" else None
+            locales = threading.local()
+
+            def activar(i):
+                c = getattr(locales, "conn", None)
+                if c is None:
+                    c = locales.conn = sqlite3.connect(ruta, timeout=30, check_same_thread=False)
+                if escritor:
+                    escritor.activar(c, f"T{i}", f"D{i}")
+                else:
+                    _activar_en_db(c, f"T{i}", f"D{i}")
+
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=hilos) as pool:
+                list(pool.map(activar, range(tokens)))
+            if escritor:
+                escritor.cerrar()  # la medición incluye confirmar todo en disco
+            resultados[modo] = tokens / (time.perf_counter() - inicio)
+
+            conn = sqlite3.connect(ruta)
+            usados = conn.execute("SELECT COUNT(*) FROM activaciones WHERE usado = 1").fetchone()[0]
+            conn.close()
+            if usados != tokens:
+                log(f"✗ Modo {modo}: {usados}/{tokens} activaciones confirmadas")
+    log(f"Activaciones ({hilos} hilos): {resultados['directa']:.0f}/s directa, "
+        f"{resultados['diferida']:.0f}/s diferida por lotes")
+    return resultados
+
+
+def bench_limitador(log, clientes=10000, peticiones=200000, hilos=8):
+    """Costo por petición del limitador (IP + device_id) con `clientes` claves distintas y `hilos` concurrentes."""
+    import random
+    from .rate_limit import LimitadorTokens, LIMITES_POR_DEFECTO
+
+    por_ip = LimitadorTokens(*LIMITES_POR_DEFECTO["ip"])
+    por_device = LimitadorTokens(*LIMITES_POR_DEFECTO["device"])
+    claves = [(f"10.0.{i // 250}.{i % 250}", f"device-{i}") for i in range(clientes)]
+    secuencia = [random.choice(claves) for _ in range(peticiones)]
+
+    def lote(inicio):
+        for ip, device in secuencia[inicio::hilos]:
+            if not por_ip.permitir(ip):
+                por_device.permitir(device)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        list(pool.map(lote, range(hilos)))
+    costo_us = (time.perf_counter() - t0) / peticiones * 1e6
+    log(f"Limitador: {costo_us:.2f} µs por petición ({clientes} clientes, {hilos} hilos, "
+        f"{len(por_ip.cubetas) + len(por_device.cubetas)} cubetas en memoria)")
+    return costo_us
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark del servidor de estáticos con clientes concurrentes")
+    parser.add_argument("base_url", help="p. ej. http://localhost:5001; 'metricas', 'activaciones' o 'limitador' para los benchmarks internos")
+    parser.add_argument("rutas", nargs="*", default=["/health"], help="rutas relativas a www (p. ej. models/pagina1.glb)")
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--peticiones", type=int, default=64)
+    parser.add_argument("--gzip", action="store_true", help="enviar Accept-Encoding: gzip, br")
+    args = parser.parse_args()
+
+    if args.base_url == "metricas":
+        bench_metricas(print, tuple(args.rutas), args.peticiones * 100)
+        sys.exit(0)
+    if args.base_url == "limitador":
+        bench_limitador(print, peticiones=args.peticiones * 1000, hilos=args.clientes)
+        sys.exit(0)
+    if args.base_url == "activaciones":
+        bench_activaciones(print, args.peticiones * 100, args.clientes)
+        sys.exit(0)
+    verificar_rangos(print, f"{args.base_url.rstrip('/')}/{args.rutas[0].lstrip('/')}")
+    bench_estaticos(print, args.base_url, args.rutas, args.clientes, args.peticiones,
+                    {"Accept-Encoding": "gzip, br"} if args.gzip else None)
+    sys.exit(0)
@@ -0,0 +1,62 @@
+import os
+import re
+
+from .utils import limpiar_nombre
+
+EXT_IMAGENES = (".jpg", ".jpeg", ".png")
+EXT_MODELOS = (".glb", ".fbx")
+
+
+def orden_natural(texto):
+    """pagina2 antes que pagina10."""
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", texto)]
+
+
+def _escanear(carpeta, recursivo, encontrados):
+    with os.scandir(carpeta) as it:
+        for entrada in it:
+            if entrada.is_dir(follow_symlinks=False):
+                if recursivo and not entrada.name.startswith("."):
+                    _escanear(entrada.path, recursivo, encontrados)
+                continue
+            ext = os.path.splitext(entrada.name)[1].lower()
+            if ext in EXT_IMAGENES:
+                encontrados["imagen"].append(entrada.path)
+            elif ext in EXT_MODELOS:
+                encontrados["modelo"].append(entrada.path)
+
+
+def indexar(rutas):
+    """{base limpia: [rutas]} — más de una ruta por base es un duplicado."""
+    indice = {}
+    for ruta in rutas:
+        base = limpiar_nombre(os.path.splitext(os.path.basename(ruta))[0])
+        indice.setdefault(base, []).append(ruta)
+    return indice
+
+
+def escanear_libro(carpeta, recursivo=True):
+    """
+    Recorre la carpeta de un libro con os.scandir y empareja imágenes y modelos por el
+    nombre base normalizado con limpiar_nombre, usando un índice dict (O(n + m)).
+    Devuelve {"pares", "duplicados", "imagenes_huerfanas", "modelos_huerfanos"}:
+    los pares están en orden natural; los duplicados son (base, tipo, rutas) y para el
+    par se usa la primera ruta en orden natural.
+    """
+    encontrados = {"imagen": [], "modelo": []}
+    _escanear(carpeta, recursivo, encontrados)
+    imagenes = indexar(sorted(encontrados["imagen"], key=orden_natural))
+    modelos = indexar(sorted(encontrados["modelo"], key=orden_natural))
+
+    duplicados = [(base, tipo, rutas)
+                  for tipo, indice in (("imagen", imagenes), ("modelo", modelos))
+                  for base, rutas in indice.items() if len(rutas) > 1]
+    pares = [{"imagen": rutas[0], "modelo": modelos[base][0], "base": base}
+             for base, rutas in imagenes.items() if base in modelos]
+    pares.sort(key=lambda p: orden_natural(p["base"]))
+    return {
+        "pares": pares,
+        "duplicados": duplicados,
+        "imagenes_huerfanas": [rutas[0] for base, rutas in imagenes.items() if base not in modelos],
+        "modelos_huerfanos": [rutas[0] for base, rutas in modelos.items() if base not in imagenes],
+    }
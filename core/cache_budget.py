@@ -0,0 +1,162 @@
+import os
+import stat
+import time
+import shutil
+
+# Presupuesto total de las cachés gobernadas y espacio libre mínimo en el disco del
+# proyecto antes de compilar (Gradle necesita varios GB de margen para un build).
+PRESUPUESTO_GB = 30
+LIBRE_MINIMO_GB = 8
+
+GB = 1024 ** 3
+
+
+def grupo(nombre, raiz, prioridad, profundidad=1, conservar=0, edad_minima_dias=1, extensiones=None,
+          desalojable=True):
+    """
+    Describe un conjunto de elementos desalojables: los directorios a `profundidad`
+    niveles bajo `raiz`, o los archivos con `extensiones` a esa profundidad. Se desaloja
+    primero la `prioridad` más baja (lo más barato de regenerar) y, dentro de ella, lo
+    menos usado recientemente (mtime). Los `conservar` más recientes del grupo y los
+    usados hace menos de `edad_minima_dias` nunca se tocan. Un grupo no `desalojable`
+    solo cuenta para el presupuesto.
+    """
+    return {"nombre": nombre, "raiz": os.path.abspath(raiz), "prioridad": prioridad, "profundidad": profundidad,
+            "conservar": conservar, "edad_minima": edad_minima_dias * 86400,
+            "extensiones": tuple(extensiones) if extensiones else None, "desalojable": desalojable}
+
+
+def grupos_por_defecto(base_dir, gen_dir, node_cache, paquetes_dir, output_apk_dir, almacen_dir=None):
+    gradle = os.path.join(base_dir, "temporal", "gradle")
+    return [
+        # Primero el almacén de assets: los archivos que comparte con los paquetes (enlaces
+        # duros) se le atribuyen a él y no se cuentan otra vez en cada paquete. Sus blobs
+        # no se desalojan aquí: se liberan al quedar sin paquetes (parámetro `recolectar`
+        # de gobernar_caches)
+        *([grupo("Almacén de assets", almacen_dir, 9, desalojable=False)] if almacen_dir else []),
+        # Se regeneran solos: Gradle y npm vuelven a descargar lo que falte
+        grupo("Gradle (cachés)", os.path.join(gradle, "caches"), 0, conservar=2),
+        grupo("Gradle (wrapper)", os.path.join(gradle, "wrapper", "dists"), 0, conservar=1),
+        grupo("Gradle (daemon)", os.path.join(gradle, "daemon"), 0, conservar=1),
+        grupo("npm (caché)", node_cache, 0),
+        grupo("Builds Android antiguos", os.path.join(base_dir, "android_builds"), 0, conservar=1),
+        # Cachés del generador: regenerarlas cuesta tiempo de CPU
+        grupo("Marcadores (caché)", os.path.join(gen_dir, "marker_cache"), 1, profundidad=2),
+        grupo("Íconos (caché)", os.path.join(gen_dir, "icon_cache"), 1),
+        grupo("Runtime AR (caché)", os.path.join(gen_dir, "vendor_cache"), 1, extensiones=(".js",)),
+        # Salidas viejas: los APK se recompilan desde el paquete; las claves nunca se borran
+        grupo("APKs antiguos", output_apk_dir, 2, profundidad=2, conservar=3, edad_minima_dias=14,
+              extensiones=(".apk", ".aab")),
+        grupo("Paquetes antiguos", paquetes_dir, 3, conservar=5, edad_minima_dias=60),
+    ]
+
+
+def _elementos(g, indice, inodos):
+    """[(ruta, bytes, mtime)] de un grupo; los tamaños de directorios salen del IndiceDisco."""
+    padres = [g["raiz"]]
+    for _ in range(g["profundidad"] - 1):
+        hijos = []
+        for padre in padres:
+            try:
+                with os.scandir(padre) as it:
+                    hijos.extend(e.path for e in it if e.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+        padres = hijos
+
+    elementos = []
+    for padre in padres:
+        if g["extensiones"]:
+            try:
+                with os.scandir(padre) as it:
+                    for e in it:
+                        if e.is_file(follow_symlinks=False) and e.name.lower().endswith(g["extensiones"]):
+                            st = e.stat(follow_symlinks=False)
+                            elementos.append((e.path, st.st_size, st.st_mtime))
+            except OSError:
+                pass
+        else:
+            elementos.extend((ruta, total, mtime) for ruta, (total, _, mtime)
+                             in indice.tamanos_hijos(padre, inodos=inodos).items() if ruta != os.path.abspath(padre))
+    return elementos
+
+
+def _protegido(ruta, protegidos):
+    return any(parte in protegidos for parte in ruta.split(os.sep))
+
+
+def _borrar(ruta):
+    def _forzar(funcion, camino, _):
+        # Gradle deja archivos de solo lectura en Windows
+        os.chmod(camino, stat.S_IWRITE)
+        funcion(camino)
+    if os.path.isdir(ruta):
+        shutil.rmtree(ruta, onerror=_forzar)
+    else:
+        os.remove(ruta)
+
+
+def gobernar_caches(log, grupos, indice, disco, presupuesto_gb=PRESUPUESTO_GB, libre_minimo_gb=LIBRE_MINIMO_GB,
+                    protegidos=(), simular=False, recolectar=None):
+    """
+    Desaloja elementos de `grupos` hasta que su total quepa en `presupuesto_gb` y el
+    disco `disco` tenga al menos `libre_minimo_gb` libres. `protegidos` son nombres de
+    carpeta que nunca se borran (p. ej. el libro que se está compilando).
+
+    `recolectar(log)` (AlmacenAssets.recolectar) libera los blobs del almacén que quedan
+    sin paquetes y devuelve los bytes liberados. Como los archivos compartidos se le
+    atribuyen al almacén, el tamaño contado de un paquete no incluye sus assets: se llama
+    antes de medir y tras cada desalojo, y lo que libera se suma a lo liberado por ese
+    elemento antes de decidir si hace falta desalojar más. Con `simular` no se borra nada
+    y los tamaños mostrados no incluyen esos assets.
+    Devuelve los bytes liberados (o que se liberarían con `simular`).
+    """
+    ahora = time.time()
+    if recolectar and not simular:
+        recolectar(log)
+    candidatos, total = [], 0
+    inodos = set()  # archivos con enlaces duros ya contados en algún grupo
+    for g in grupos:
+        elementos = sorted(_elementos(g, indice, inodos), key=lambda e: e[2], reverse=True)
+        bytes_grupo = sum(e[1] for e in elementos)
+        total += bytes_grupo
+        if elementos:
+            log(f"  {g['nombre']}: {bytes_grupo / GB:.2f} GB en {len(elementos)} elementos")
+        if not g.get("desalojable", True):
+            continue
+        for ruta, tamano, mtime in elementos[g["conservar"]:]:
+            if ahora - mtime >= g["edad_minima"] and not _protegido(ruta, protegidos):
+                candidatos.append((g["prioridad"], mtime, ruta, tamano, g["nombre"]))
+    indice.guardar()
+
+    libre = shutil.disk_usage(disco).free
+    exceso = max(total - presupuesto_gb * GB, libre_minimo_gb * GB - libre, 0)
+    log(f"Cachés: {total / GB:.2f} GB de {presupuesto_gb} GB; libre en {disco}: {libre / GB:.1f} GB")
+    if not exceso:
+        log("✓ Cachés dentro del presupuesto")
+        return 0
+
+    liberado = 0
+    for _, mtime, ruta, tamano, nombre in sorted(candidatos):
+        if liberado >= exceso:
+            break
+        dias = (ahora - mtime) / 86400
+        if simular:
+            log(f"  (simulado) {nombre}: {ruta} ({tamano / GB:.2f} GB, sin uso hace {dias:.0f} días)")
+        else:
+            try:
+                _borrar(ruta)
+            except OSError as e:
+                log(f"⚠ No se pudo borrar {ruta}: {e}")
+                continue
+            # Assets del almacén que solo usaba este elemento
+            tamano += recolectar(lambda m: None) if recolectar else 0
+            log(f"  Desalojado {nombre}: {ruta} ({tamano / GB:.2f} GB, sin uso hace {dias:.0f} días)")
+        liberado += tamano
+
+    if liberado >= exceso:
+        log(f"✓ Liberados {liberado / GB:.2f} GB")
+    else:
+        log(f"⚠ Liberados {liberado / GB:.2f} GB de {exceso / GB:.2f} GB necesarios; "
+            f"lo que queda está protegido o en uso reciente")
+    return liberado
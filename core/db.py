@@ -1,25 +1,249 @@
+import os
+import atexit
 import sqlite3
+import threading
 from .env import get_paths
+from .metrics import METRICAS, medir_consulta
+from .migrations import migrar
+from .token_cache import CacheTokens
+from .activation_writer import EscritorActivaciones
+from .utils import limpiar_nombre
 
-def init_db():
+# Una conexión por hilo y por base: los workers del servidor atienden muchas peticiones
+# por hilo y abrir SQLite en cada una cuesta más que la consulta.
+_local = threading.local()
+
+# Tokens válidos y activaciones recientes de este proceso, por archivo de base (ver core/token_cache.py)
+_caches = {}
+_caches_candado = threading.Lock()
+
+# Escritura diferida y agrupada de activaciones, una por base (ver core/activation_writer.py).
+# Solo es segura con un único proceso servidor: cada proceso conoce sus propias pendientes.
+ESCRITURA_DIFERIDA = {"activa": False, "intervalo": 0.005, "log": None}
+_escritores = {}
+_cierre_registrado = False
+
+# Libros con base propia ya detectados (las particiones no se eliminan en caliente)
+_particiones = {}
+
+# Todas las particiones existentes, releídas solo cuando cambia la carpeta de las bases
+_todas_particiones = {"mtime": None, "rutas": []}
+
+ERROR_INVALIDO = "Código inválido."
+ERROR_OTRO_DISPOSITIVO = "Código ya utilizado en otro dispositivo."
+
+def ruta_particion(libro):
     p = get_paths()
-    conn = sqlite3.connect(p["BACKEND_DB"])
-    c = conn.cursor()
-    c.execute("""CREATE TABLE IF NOT EXISTS activaciones (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        token TEXT NOT NULL UNIQUE,
-        device_id TEXT,
-        fecha_creacion TEXT NOT NULL,
-        usado INTEGER DEFAULT 0,
-        fecha_uso TEXT
-    )""")
-    conn.commit()
-    conn.close()
-
-def insert_token(token):
+    return p["BACKEND_DB"].parent / f"activaciones_{limpiar_nombre(libro)}.db"
+
+def ruta_db(libro=None):
+    """
+    Router de particiones: la base propia del libro si existe (activaciones_<libro>.db),
+    si no la base compartida BACKEND_DB.
+    """
+    if libro:
+        ruta = _particiones.get(libro)
+        if ruta is not None:
+            return ruta
+        propia = ruta_particion(libro)
+        if propia.exists():
+            _particiones[libro] = propia
+            return propia
+    return get_paths()["BACKEND_DB"]
+
+def rutas_particiones():
+    """Archivos activaciones_<libro>.db existentes; la lista se cachea por mtime de la carpeta."""
+    carpeta = get_paths()["BACKEND_DB"].parent
+    try:
+        mtime = carpeta.stat().st_mtime_ns
+    except OSError:
+        return []
+    if _todas_particiones["mtime"] != mtime:
+        _todas_particiones.update(mtime=mtime, rutas=sorted(carpeta.glob("activaciones_*.db")))
+    return _todas_particiones["rutas"]
+
+def init_db(log=None):
+    """Crea la base compartida si falta y migra al esquema actual todas las bases existentes."""
     p = get_paths()
-    conn = sqlite3.connect(p["BACKEND_DB"])
-    c = conn.cursor()
-    c.execute("INSERT INTO activaciones (token, fecha_creacion) VALUES (?, datetime('now'))", (token,))
-    conn.commit()
-    conn.close()
+    p["BACKEND_DB"].parent.mkdir(parents=True, exist_ok=True)
+    for ruta in [p["BACKEND_DB"]] + rutas_particiones():
+        conn = sqlite3.connect(ruta)
+        try:
+            migrar(conn, log)
+        finally:
+            conn.close()
+
+def conexion(ruta=None):
+    """Conexión SQLite reutilizable del hilo actual para la base `ruta` (por defecto la compartida)."""
+    ruta = ruta or get_paths()["BACKEND_DB"]
+    conexiones = getattr(_local, "conexiones", None)
+    if conexiones is None:
+        conexiones = _local.conexiones = {}
+    conn = conexiones.get(ruta)
+    if conn is None:
+        conn = sqlite3.connect(ruta, timeout=10)
+        conn.execute("PRAGMA busy_timeout=10000")
+        conexiones[ruta] = conn
+    return conn
+
+def cache_tokens(ruta):
+    cache = _caches.get(ruta)
+    if cache is None:
+        with _caches_candado:
+            cache = _caches.setdefault(ruta, CacheTokens())
+    return cache
+
+def activar_escritura_diferida(activa=True, intervalo=0.005, log=None):
+    ESCRITURA_DIFERIDA.update(activa=activa, intervalo=intervalo, log=log)
+
+def escritor_activaciones(ruta):
+    global _cierre_registrado
+    escritor = _escritores.get(ruta)
+    if escritor is None:
+        with _caches_candado:
+            escritor = _escritores.get(ruta)
+            if escritor is None:
+                if not _cierre_registrado:
+                    # Solo los procesos que llegan a diferir escrituras necesitan vaciarlas al salir
+                    atexit.register(cerrar_escritores)
+                    _cierre_registrado = True
+                escritor = _escritores[ruta] = EscritorActivaciones(ruta, ESCRITURA_DIFERIDA["intervalo"],
+                                                                    ESCRITURA_DIFERIDA["log"])
+    return escritor
+
+def cerrar_escritores():
+    """Confirma las activaciones encoladas; se llama en el apagado ordenado del servidor."""
+    for escritor in list(_escritores.values()):
+        escritor.cerrar()
+    _escritores.clear()
+
+def insert_token(token, libro=""):
+    insertar_tokens([token], libro)
+
+def insertar_tokens(tokens, libro=""):
+    """Inserta tokens nuevos del libro en su partición; los repetidos se omiten. Devuelve cuántos se insertaron."""
+    ruta = ruta_db(libro)
+    conn = sqlite3.connect(ruta)
+    try:
+        with conn:
+            antes = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO activaciones (token, libro, fecha_creacion) VALUES (?, ?, datetime('now'))",
+                [(t, libro) for t in tokens])
+            insertados = conn.total_changes - antes
+    finally:
+        conn.close()
+    cache = cache_tokens(ruta)
+    for t in tokens:
+        cache.agregar(t)
+    return insertados
+
+@medir_consulta("activar")
+def _activar_en_db(conn, token, device_id):
+    """Devuelve el device_id que queda asociado al token, o None si el token no existe."""
+    with conn:
+        cur = conn.execute(
+            "UPDATE activaciones SET usado = 1, device_id = ?, fecha_uso = datetime('now') "
+            "WHERE token = ? AND usado = 0", (device_id, token))
+        if cur.rowcount:
+            return device_id
+        fila = conn.execute("SELECT device_id FROM activaciones WHERE token = ?", (token,)).fetchone()
+    return None if fila is None else fila[0]
+
+@medir_consulta("activar_diferido")
+def _activar_diferido(escritor, conn, token, device_id):
+    return escritor.activar(conn, token, device_id)
+
+def _activar_en(ruta, token, device_id):
+    """Activa en la base `ruta`. Devuelve (valido, mensaje_error), o None si el token no está en ella."""
+    conn = conexion(ruta)
+    cache = cache_tokens(ruta)
+    if not cache.podria_existir(token, conn):
+        return None
+    previo = cache.dispositivo(token)
+    if previo is not None:
+        METRICAS.cache_tokens.inc("acierto")
+        return (True, None) if previo == device_id else (False, ERROR_OTRO_DISPOSITIVO)
+    METRICAS.cache_tokens.inc("sqlite")
+    if ESCRITURA_DIFERIDA["activa"]:
+        asociado = _activar_diferido(escritor_activaciones(ruta), conn, token, device_id)
+    else:
+        asociado = _activar_en_db(conn, token, device_id)
+    if asociado is None:
+        return None
+    cache.recordar_activacion(token, asociado)
+    if asociado == device_id:
+        return True, None
+    return False, ERROR_OTRO_DISPOSITIVO
+
+def activar_token(token, device_id, libro=None):
+    """
+    Marca el token como usado por `device_id`. Un token ya usado sigue siendo válido
+    para el mismo dispositivo (reinstalación). Devuelve (valido, mensaje_error).
+    Los tokens desconocidos y las reactivaciones recientes se resuelven en memoria.
+    Sin `libro` (páginas de activación anteriores a las particiones) el token se busca
+    en la base compartida y, si no está, en las particiones.
+    """
+    rutas = [ruta_db(libro)] if libro else [get_paths()["BACKEND_DB"]] + rutas_particiones()
+    for ruta in rutas:
+        resultado = _activar_en(ruta, token, device_id)
+        if resultado is not None:
+            return resultado
+    METRICAS.cache_tokens.inc("rechazado")
+    return False, ERROR_INVALIDO
+
+@medir_consulta("listar")
+def listar_tokens(libro=None):
+    """Claves del libro (de su partición si la tiene) o, sin libro, de todas las bases."""
+    consulta = "SELECT token, libro, device_id, fecha_creacion, usado, fecha_uso FROM activaciones"
+    if libro:
+        filas = conexion(ruta_db(libro)).execute(consulta + " WHERE libro = ? ORDER BY id", (libro,)).fetchall()
+    else:
+        filas = []
+        for ruta in [get_paths()["BACKEND_DB"]] + rutas_particiones():
+            filas += conexion(ruta).execute(consulta + " ORDER BY id").fetchall()
+    return [dict(zip(("token", "libro", "device_id", "fecha_creacion", "usado", "fecha_uso"), f)) for f in filas]
+
+def crear_particion(log, libro):
+    """
+    Mueve las claves de `libro` de la base compartida a activaciones_<libro>.db sin
+    detener el servidor: la base compartida queda bloqueada para escritura (BEGIN
+    IMMEDIATE) mientras se copian las filas, la partición aparece con un rename
+    atómico y recién entonces se borran las filas de la compartida.
+    Solo las páginas de activación que envían `libro` se enrutan a la partición.
+    """
+    destino = ruta_particion(libro)
+    if destino.exists():
+        log(f"La partición de '{libro}' ya existe: {destino}")
+        return destino
+    init_db()
+    temporal = destino.with_name(destino.name + ".tmp")
+    if temporal.exists():
+        temporal.unlink()
+    compartida = sqlite3.connect(get_paths()["BACKEND_DB"], timeout=30, isolation_level=None)
+    try:
+        compartida.execute("BEGIN IMMEDIATE")
+        filas = compartida.execute(
+            "SELECT token, libro, device_id, fecha_creacion, usado, fecha_uso FROM activaciones WHERE libro = ? ORDER BY id",
+            (libro,)).fetchall()
+        nueva = sqlite3.connect(temporal)
+        try:
+            migrar(nueva)
+            with nueva:
+                nueva.executemany(
+                    "INSERT INTO activaciones (token, libro, device_id, fecha_creacion, usado, fecha_uso) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", filas)
+            nueva.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            nueva.close()
+        os.replace(temporal, destino)
+        compartida.execute("DELETE FROM activaciones WHERE libro = ?", (libro,))
+        compartida.execute("COMMIT")
+    except Exception:
+        if compartida.in_transaction:
+            compartida.execute("ROLLBACK")
+        raise
+    finally:
+        compartida.close()
+    log(f"✓ Partición creada para '{libro}' con {len(filas)} claves: {destino}")
+    return destino
@@ -0,0 +1,150 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# En Windows, tamaño desde el que se hace un stat completo para detectar enlaces duros
+ENLACES_DESDE_BYTES = 256 * 1024
+
+
+class IndiceDisco:
+    """
+    Índice persistente del tamaño de árboles de directorios.
+
+    Por cada directorio se guarda (mtime_ns, bytes de sus archivos, nº de archivos,
+    subdirectorios, archivos con varios enlaces). Un directorio cuyo mtime no cambió no
+    se vuelve a listar: en una pasada en caliente solo se hace un stat por directorio,
+    no por archivo. Los tamaños salen del stat que ya trae os.scandir (gratis en Windows).
+
+    Enlaces duros: los paquetes, www y el almacén de assets comparten archivos (ver
+    core/asset_store.py). Los archivos con más de un enlace se guardan aparte por
+    (st_dev, st_ino) y cada inodo se suma una sola vez por recorrido. En Windows el stat
+    de os.scandir no trae inodo ni enlaces: solo se consulta para archivos grandes
+    (ENLACES_DESDE_BYTES), que son los que se enlazan y pesan.
+
+    Limitación: el mtime de un directorio cambia al crear, borrar o renombrar entradas,
+    no al reescribir un archivo existente. Gradle, npm y el generador escriben archivos
+    nuevos, así que el desvío es despreciable para un diagnóstico o una poda.
+    """
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        self.dirs = {}
+        self._candado = threading.Lock()
+        if cache_path:
+            try:
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    # Las entradas sin la lista de enlaces (índices anteriores) se vuelven a listar
+                    self.dirs = {k: (v[0], v[1], v[2], tuple(v[3]), tuple(tuple(e) for e in v[4]))
+                                 for k, v in json.load(f).items() if len(v) > 4}
+            except (OSError, ValueError, IndexError, TypeError):
+                self.dirs = {}
+
+    def _directorio(self, ruta, st=None):
+        st = st or os.stat(ruta)
+        previo = self.dirs.get(ruta)
+        if previo is not None and previo[0] == st.st_mtime_ns:
+            return previo
+        total = archivos = 0
+        subdirs, enlazados = [], []
+        with os.scandir(ruta) as it:
+            for entrada in it:
+                try:
+                    if entrada.is_dir(follow_symlinks=False):
+                        subdirs.append(entrada.path)
+                    elif entrada.is_file(follow_symlinks=False):
+                        st_archivo = entrada.stat(follow_symlinks=False)
+                        if os.name == "nt" and st_archivo.st_size >= ENLACES_DESDE_BYTES:
+                            st_archivo = os.stat(entrada.path, follow_symlinks=False)
+                        archivos += 1
+                        if st_archivo.st_nlink > 1:
+                            enlazados.append((st_archivo.st_dev, st_archivo.st_ino, st_archivo.st_size))
+                        else:
+                            total += st_archivo.st_size
+                except OSError:
+                    pass  # borrado mientras se recorría
+        datos = (st.st_mtime_ns, total, archivos, tuple(subdirs), tuple(enlazados))
+        with self._candado:
+            self.dirs[ruta] = datos
+        return datos
+
+    def _sin_contar(self, enlazados, inodos):
+        """Bytes de los archivos enlazados cuyo inodo aún no se contó; los marca como contados."""
+        total = 0
+        with self._candado:
+            for dev, ino, tamano in enlazados:
+                if (dev, ino) not in inodos:
+                    inodos.add((dev, ino))
+                    total += tamano
+        return total
+
+    def _recorrer(self, ruta, vistos, inodos):
+        """Suma el subárbol de `ruta` con una pila explícita (árboles de Gradle muy profundos)."""
+        total = archivos = 0
+        pila = [ruta]
+        while pila:
+            actual = pila.pop()
+            try:
+                _, bytes_dir, n, subdirs, enlazados = self._directorio(actual)
+            except OSError:
+                continue
+            vistos.append(actual)
+            total += bytes_dir + self._sin_contar(enlazados, inodos)
+            archivos += n
+            pila.extend(subdirs)
+        return total, archivos
+
+    def tamanos_hijos(self, ruta, max_workers=8, inodos=None):
+        """
+        {hijo: (bytes, archivos, mtime)} de cada subdirectorio inmediato de `ruta`,
+        calculados en paralelo (un subárbol por tarea). Los archivos sueltos de `ruta`
+        van bajo la clave `ruta`. `inodos` es el conjunto de archivos enlazados ya
+        contados: compartirlo entre llamadas evita sumar dos veces un archivo que aparece
+        en varios árboles (se atribuye al primero que lo recorre).
+        """
+        ruta = os.path.abspath(ruta)
+        vistos = []
+        inodos = set() if inodos is None else inodos
+        try:
+            _, bytes_raiz, n_raiz, subdirs, enlazados = self._directorio(ruta)
+        except OSError:
+            return {}
+        vistos.append(ruta)
+        resultado = {ruta: (bytes_raiz + self._sin_contar(enlazados, inodos), n_raiz, os.stat(ruta).st_mtime)}
+        if subdirs:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(subdirs))) as pool:
+                for hijo, (total, archivos) in zip(subdirs, pool.map(lambda d: self._recorrer(d, vistos, inodos),
+                                                                     subdirs)):
+                    try:
+                        resultado[hijo] = (total, archivos, os.stat(hijo).st_mtime)
+                    except OSError:
+                        pass
+        self._olvidar_no_vistos(ruta, vistos)
+        return resultado
+
+    def tamano(self, ruta, max_workers=8, inodos=None):
+        """(bytes, archivos) de todo el árbol bajo `ruta`; (0, 0) si no existe."""
+        hijos = self.tamanos_hijos(ruta, max_workers, inodos)
+        return sum(h[0] for h in hijos.values()), sum(h[1] for h in hijos.values())
+
+    def _olvidar_no_vistos(self, raiz, vistos):
+        """Descarta del índice los directorios de `raiz` que ya no existen."""
+        vistos = set(vistos)
+        prefijo = os.path.join(raiz, "")
+        with self._candado:
+            for ruta in [r for r in self.dirs if r.startswith(prefijo) and r not in vistos]:
+                del self.dirs[ruta]
+
+    def guardar(self):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with self._candado:
+                datos = dict(self.dirs)
+            with open(self.cache_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(datos, f, separators=(",", ":"))
+            os.replace(self.cache_path + ".tmp", self.cache_path)
+        except OSError:
+            pass  # sin índice la próxima pasada vuelve a recorrer, no es un error
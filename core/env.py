@@ -1,7 +1,7 @@
 from pathlib import Path
 import os
-import subprocess
 import sqlite3
+from .toolchain import sondear, sonda, sonda_npm
 
 BASE_DIR = Path(r"F:\linux\3d-AR")
 
@@ -48,46 +48,22 @@ def validate_env(log):
         log(f"✗ CRÍTICO: No se encontró node.exe en {NODE_DIR}")
         ok = False
 
-    # --- Java Validation ---
-    try:
-        r_java = subprocess.run("java -version", shell=True, capture_output=True, text=True, check=True)
-        log(f"✓ Java: {(r_java.stderr or r_java.stdout).strip().splitlines()[0]}")
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        log("✗ Java: No encontrado en PATH.")
-        ok = False
-
-    # --- Node/NPM/NPX Validation (Direct Call Method) ---
-    log("--- Verificando Node.js (Método de Llamada Directa) ---")
-    
+    # --- Java / Node / NPM / NPX: sondas en paralelo con caché por ruta + mtime ---
+    sondas = [sonda("java", ["java", "-version"])]
     if ok: # Only try node calls if node.exe was found
-        # 1. Node
-        try:
-            r_node = subprocess.run(f'"{NODE_EXE}" --version', shell=True, capture_output=True, text=True, check=True)
-            log(f"✓ node.exe: {r_node.stdout.strip()}")
-        except (subprocess.CalledProcessError, FileNotFoundError) as e:
-            log(f"✗ node.exe: No se pudo ejecutar desde {NODE_EXE}. Error: {e}")
-            ok = False
-
-        # 2. NPM and NPX
+        sondas.append(sonda("node.exe", [NODE_EXE, "--version"]))
         for tool_name in ["npm", "npx"]:
-            cli_js_path = os.path.join(NODE_DIR, 'node_modules', tool_name, 'bin', f'{tool_name}-cli.js')
-            
-            if not os.path.exists(cli_js_path):
-                log(f"✗ {tool_name}: No se encontró el script JS en: {cli_js_path}")
-                ok = False
-                continue
-
-            command = [NODE_EXE, cli_js_path, "--version"]
-            try:
-                result = subprocess.run(command, capture_output=True, text=True, check=True, cwd=NODE_DIR)
-                log(f"✓ {tool_name}: {result.stdout.strip()}")
-            except (subprocess.CalledProcessError, FileNotFoundError) as e:
-                error_output = e.stderr if hasattr(e, 'stderr') else str(e)
-                log(f"✗ {tool_name}: Error en llamada directa. Error: {error_output}")
-                ok = False
+            # La clave incluye node.exe y el script: cambiar cualquiera de los dos invalida la caché
+            sondas.append(sonda_npm(tool_name, NODE_DIR))
+    p = get_paths()
+    for nombre, r in sondear(sondas, str(p["GEN"]/"toolchain_cache.json")).items():
+        if r["ok"]:
+            log(f"✓ {nombre}: {r['salida']}{' (caché)' if r['cache'] else ''}")
+        else:
+            log(f"✗ {nombre}: {r['salida']}")
+            ok = False
 
     # --- Other Environment Validations ---
-    p = get_paths()
     if not p["BLENDER_EXE"].exists():
         log(f"✗ Blender no encontrado: {p['BLENDER_EXE']}")
         ok = False
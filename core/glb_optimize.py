@@ -0,0 +1,160 @@
+import os
+import json
+import shutil
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from .env import get_paths
+
+# Opciones por defecto de la etapa de optimización de modelos.
+#  compresion: 'meshopt' (cuantiza vértices + meshopt), 'quantize' o 'false'. Draco no
+#              se ofrece: el visor no carga DRACOLoader y los modelos no se verían.
+#  texturas:   'webp', 'ktx2' o 'false' (mantener el formato original)
+#  tam_textura: lado máximo en píxeles de cada textura
+#  presupuesto_mb: tamaño total permitido para los modelos de un libro (0 = sin límite)
+OPCIONES_POR_DEFECTO = {
+    "compresion": "meshopt",
+    "texturas": "webp",
+    "tam_textura": 2048,
+    "presupuesto_mb": 80,
+}
+
+COMPRESIONES = ("meshopt", "quantize", "false")
+
+# Versión fija: los defaults de `optimize` cambian entre versiones mayores y el visor
+# (three r128) solo entiende las extensiones que esta versión produce.
+GLTF_TRANSFORM_VERSION = "4.1.0"
+GLTF_TRANSFORM_NPX = ["npx", "--yes", f"@gltf-transform/cli@{GLTF_TRANSFORM_VERSION}"]
+
+_instalacion = threading.Lock()
+
+
+def _version_instalada(herramientas_dir):
+    pkg_json = os.path.join(herramientas_dir, "node_modules", "@gltf-transform", "cli", "package.json")
+    try:
+        with open(pkg_json, "r", encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def instalar_gltf_transform(log, herramientas_dir=None):
+    """
+    Instala @gltf-transform/cli en la versión fijada, una sola vez, en un node_modules
+    propio (GEN/herramientas). Devuelve el comando base para ejecutarlo; si npm no está
+    o la instalación falla, el de npx con la versión fijada.
+    """
+    herramientas_dir = herramientas_dir or os.path.join(str(get_paths()["GEN"]), "herramientas")
+    ejecutable = os.path.join(herramientas_dir, "node_modules", ".bin",
+                              "gltf-transform.cmd" if os.name == "nt" else "gltf-transform")
+    with _instalacion:
+        if _version_instalada(herramientas_dir) != GLTF_TRANSFORM_VERSION:
+            if shutil.which("npm") is None:
+                return GLTF_TRANSFORM_NPX
+            log(f"Instalando @gltf-transform/cli@{GLTF_TRANSFORM_VERSION} (una sola vez)...")
+            os.makedirs(herramientas_dir, exist_ok=True)
+            proc = subprocess.run(
+                ["npm", "install", "--prefix", herramientas_dir, "--no-audit", "--no-fund",
+                 f"@gltf-transform/cli@{GLTF_TRANSFORM_VERSION}"],
+                capture_output=True, text=True, timeout=600, shell=(os.name == "nt"))
+            if proc.returncode != 0 or _version_instalada(herramientas_dir) != GLTF_TRANSFORM_VERSION:
+                log(f"⚠ No se pudo instalar gltf-transform, se usará npx: {(proc.stderr or proc.stdout)[-300:]}")
+                return GLTF_TRANSFORM_NPX
+    return [ejecutable] if os.path.exists(ejecutable) else GLTF_TRANSFORM_NPX
+
+
+def comando_optimizar(origen, destino, opciones, base=None):
+    """Construye la llamada a `gltf-transform optimize` para un modelo."""
+    return (base or GLTF_TRANSFORM_NPX) + [
+        "optimize", os.path.abspath(origen), os.path.abspath(destino),
+        "--compress", str(opciones["compresion"]),
+        "--texture-compress", str(opciones["texturas"]),
+        "--texture-size", str(int(opciones["tam_textura"])),
+    ]
+
+
+def optimizar_glb(log, ruta, opciones=None, timeout=600, base=None):
+    """
+    Optimiza un GLB en su lugar. Si la herramienta falla o el resultado no es más
+    pequeño, se conserva el original. `base` es el comando de instalar_gltf_transform.
+    Devuelve un dict {"archivo", "antes", "despues", "ok"}.
+    """
+    opciones = {**OPCIONES_POR_DEFECTO, **(opciones or {})}
+    antes = os.path.getsize(ruta)
+    temporal = ruta + ".opt.glb"
+    resultado = {"archivo": os.path.basename(ruta), "antes": antes, "despues": antes, "ok": False}
+    try:
+        proc = subprocess.run(comando_optimizar(ruta, temporal, opciones, base), capture_output=True,
+                              text=True, timeout=timeout, shell=(os.name == "nt"))
+        if proc.returncode != 0 or not os.path.exists(temporal):
+            log(f"✗ Optimización fallida para {resultado['archivo']}: {(proc.stderr or proc.stdout)[-300:]}")
+            return resultado
+        despues = os.path.getsize(temporal)
+        if 0 < despues < antes:
+            os.replace(temporal, ruta)
+            resultado.update(despues=despues, ok=True)
+        else:
+            log(f"  - {resultado['archivo']}: la versión optimizada no es menor, se conserva el original")
+        return resultado
+    except subprocess.TimeoutExpired:
+        log(f"✗ Tiempo agotado optimizando {resultado['archivo']}")
+        return resultado
+    except Exception as e:
+        log(f"✗ Error optimizando {resultado['archivo']}: {e}")
+        return resultado
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def _mb(n):
+    return n / (1024 * 1024)
+
+
+def optimizar_modelos(log, rutas, opciones=None, reporte_path=None, max_workers=None):
+    """
+    Optimiza en paralelo todos los modelos de un libro, registra un informe
+    antes/después y verifica el presupuesto de tamaño.
+    Devuelve el informe (dict) con los resultados por modelo y los totales.
+    """
+    opciones = {**OPCIONES_POR_DEFECTO, **(opciones or {})}
+    if str(opciones["compresion"]) not in COMPRESIONES:
+        log(f"⚠ Compresión '{opciones['compresion']}' no soportada por el visor; se usa 'meshopt'.")
+        opciones["compresion"] = "meshopt"
+    if shutil.which("npx") is None:
+        log("⚠ 'npx' no disponible: se omite la optimización de modelos.")
+        return None
+    # Se instala antes de lanzar los hilos: varios `npx --yes` en paralelo compiten por la misma caché
+    base = instalar_gltf_transform(log)
+    log(f"Optimizando {len(rutas)} modelos (compresión: {opciones['compresion']}, "
+        f"texturas: {opciones['texturas']} ≤ {opciones['tam_textura']}px)...")
+    max_workers = max_workers or min(4, os.cpu_count() or 2)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        resultados = list(pool.map(lambda r: optimizar_glb(log, r, opciones, base=base), rutas))
+
+    total_antes = sum(r["antes"] for r in resultados)
+    total_despues = sum(r["despues"] for r in resultados)
+    for r in resultados:
+        log(f"  - {r['archivo']}: {_mb(r['antes']):.2f} MB → {_mb(r['despues']):.2f} MB")
+    ahorro = 100 * (1 - total_despues / total_antes) if total_antes else 0
+    log(f"✓ Modelos: {_mb(total_antes):.2f} MB → {_mb(total_despues):.2f} MB ({ahorro:.0f}% menos)")
+
+    presupuesto = float(opciones.get("presupuesto_mb") or 0)
+    dentro = not presupuesto or _mb(total_despues) <= presupuesto
+    if not dentro:
+        log(f"⚠ Los modelos ocupan {_mb(total_despues):.2f} MB y superan el presupuesto del libro ({presupuesto:.0f} MB).")
+        mayores = sorted(resultados, key=lambda r: r["despues"], reverse=True)[:3]
+        log("  Modelos más pesados: " + ", ".join(f"{r['archivo']} ({_mb(r['despues']):.1f} MB)" for r in mayores))
+
+    informe = {
+        "opciones": opciones,
+        "modelos": resultados,
+        "total_antes": total_antes,
+        "total_despues": total_despues,
+        "dentro_presupuesto": dentro,
+    }
+    if reporte_path:
+        with open(reporte_path, "w", encoding="utf-8") as f:
+            json.dump(informe, f, indent=2, ensure_ascii=False)
+    return informe
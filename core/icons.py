@@ -0,0 +1,164 @@
+import os
+import shutil
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import escribir_si_cambia
+from .io_utils import hash_conocido
+
+# Versión del formato de caché: subirla invalida todos los íconos cacheados.
+VERSION_CACHE = 2
+
+# Factor de escala de cada densidad respecto de mdpi (1 dp = 1 px)
+DENSIDADES = {
+    "xxxhdpi": 4,
+    "xxhdpi": 3,
+    "xhdpi": 2,
+    "hdpi": 1.5,
+    "mdpi": 1,
+}
+
+# Capa frontal del ícono adaptativo: lienzo de 108 dp con el contenido en los 72 dp
+# centrales (lo que queda visible bajo cualquier máscara del launcher)
+LADO_ADAPTATIVO_DP = 108
+CONTENIDO_ADAPTATIVO_DP = 72
+
+
+@lru_cache(maxsize=None)
+def mascara_circular(lado):
+    """Máscara "L" circular de `lado` px; se construye una vez por tamaño y se comparte entre hilos."""
+    from PIL import Image, ImageDraw
+    # Dibujada al cuádruple y reducida: borde suavizado en lugar de escalonado
+    grande = Image.new("L", (lado * 4, lado * 4), 0)
+    ImageDraw.Draw(grande).ellipse((0, 0, lado * 4 - 1, lado * 4 - 1), fill=255)
+    return grande.resize((lado, lado), Image.Resampling.LANCZOS)
+
+
+def escalas(portada, lados):
+    """
+    Decodifica la portada una sola vez y devuelve {lado: imagen RGBA cuadrada}.
+    Se arma una pirámide reduciendo a la mitad desde el lado mayor y cada tamaño sale
+    del nivel inmediato mayor (como mucho el doble): mucho más barato que reducir cada
+    uno desde el original y sin el suavizado de encadenar muchas reducciones pequeñas.
+    """
+    from PIL import Image, ImageOps
+    lados = sorted(set(lados), reverse=True)
+    with Image.open(portada) as img:
+        # En JPEG el decodificador reduce por DCT directamente a >= el tamaño pedido
+        img.draft("RGB", (lados[0] * 2, lados[0] * 2))
+        piramide = [ImageOps.fit(img.convert("RGBA"), (lados[0], lados[0]), Image.Resampling.LANCZOS)]
+    while piramide[-1].width // 2 >= lados[-1]:
+        lado = piramide[-1].width // 2
+        piramide.append(piramide[-1].resize((lado, lado), Image.Resampling.LANCZOS))
+    resultado = {}
+    for lado in lados:
+        fuente = min((p for p in piramide if p.width >= lado), key=lambda p: p.width)
+        resultado[lado] = fuente if fuente.width == lado else fuente.resize((lado, lado), Image.Resampling.LANCZOS)
+    return resultado
+
+
+def color_promedio(portada):
+    """Color medio de la portada como #RRGGBB (fondo del ícono adaptativo)."""
+    from PIL import Image
+    with Image.open(portada) as img:
+        img.draft("RGB", (64, 64))
+        r, g, b = img.convert("RGB").resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+    return f"#{r:02X}{g:02X}{b:02X}"
+
+
+def _contenido_adaptativo(lado):
+    return round(lado * CONTENIDO_ADAPTATIVO_DP / LADO_ADAPTATIVO_DP)
+
+
+def _cuadrado(imagenes, lado):
+    return imagenes[lado]
+
+
+def _redondo(imagenes, lado):
+    redondo = imagenes[lado].copy()
+    redondo.putalpha(mascara_circular(lado))
+    return redondo
+
+
+def _primer_plano(imagenes, lado):
+    from PIL import Image
+    contenido = _contenido_adaptativo(lado)
+    lienzo = Image.new("RGBA", (lado, lado), (0, 0, 0, 0))
+    margen = (lado - contenido) // 2
+    lienzo.paste(imagenes[contenido], (margen, margen))
+    return lienzo
+
+
+# archivo -> (carpeta de recursos, lado en dp, transformación)
+VARIANTES = {
+    "ic_launcher.png": ("mipmap", 48, _cuadrado),
+    "ic_launcher_round.png": ("mipmap", 48, _redondo),
+    "ic_launcher_foreground.png": ("mipmap", LADO_ADAPTATIVO_DP, _primer_plano),
+    "splash_logo.png": ("drawable", 160, _cuadrado),
+}
+
+
+def _tareas():
+    """[(carpeta, archivo, lado_px)] de todas las variantes en todas las densidades."""
+    return [(f"{tipo}-{densidad}", archivo, round(dp * factor))
+            for densidad, factor in DENSIDADES.items()
+            for archivo, (tipo, dp, _) in VARIANTES.items()]
+
+
+def _lados_necesarios():
+    lados = set()
+    for _, archivo, lado in _tareas():
+        lados.add(lado)
+        if VARIANTES[archivo][2] is _primer_plano:
+            lados.add(_contenido_adaptativo(lado))
+    return lados
+
+
+def _renderizar(portada, entrada_dir, max_workers):
+    imagenes = escalas(portada, _lados_necesarios())
+    trabajo_dir = entrada_dir + ".tmp"
+    shutil.rmtree(trabajo_dir, ignore_errors=True)
+
+    def _guardar(tarea):
+        carpeta, archivo, lado = tarea
+        VARIANTES[archivo][2](imagenes, lado).save(os.path.join(trabajo_dir, carpeta, archivo), "PNG")
+
+    tareas = _tareas()
+    for carpeta in {t[0] for t in tareas}:
+        os.makedirs(os.path.join(trabajo_dir, carpeta), exist_ok=True)
+    # La codificación PNG libera el GIL: los archivos se escriben realmente en paralelo
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(_guardar, tareas))
+    shutil.rmtree(entrada_dir, ignore_errors=True)
+    os.replace(trabajo_dir, entrada_dir)
+
+
+def generar_iconos(log, portada, res_dir, cache_dir, max_workers=None):
+    """
+    Escribe en res_dir las variantes de VARIANTES para todas las densidades (ícono
+    cuadrado, redondo, capa frontal adaptativa y logo del splash). El resultado se
+    cachea por hash de la portada en `cache_dir`: con la misma portada no se vuelve a
+    decodificar ni a codificar nada. Solo se reescriben los archivos que cambiaron,
+    así Gradle ve los recursos al día entre builds.
+    Devuelve la lista de archivos escritos.
+    """
+    entrada_dir = os.path.join(cache_dir, f"v{VERSION_CACHE}-{hash_conocido(portada)[:32]}")
+    if os.path.isdir(entrada_dir):
+        origen = "caché"
+        os.utime(entrada_dir)  # último uso, para la poda LRU de core/cache_budget.py
+    else:
+        origen = "portada"
+        _renderizar(portada, entrada_dir, max_workers)
+
+    def _copiar(tarea):
+        carpeta, archivo, _ = tarea
+        with open(os.path.join(entrada_dir, carpeta, archivo), "rb") as f:
+            datos = f.read()
+        destino = os.path.join(res_dir, carpeta, archivo)
+        return destino if escribir_si_cambia(destino, datos) else None
+
+    tareas = _tareas()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        escritos = [d for d in pool.map(_copiar, tareas) if d]
+    log(f"✓ Íconos (desde {origen}): {len(escritos)} actualizados, {len(tareas) - len(escritos)} sin cambios")
+    return escritos
@@ -0,0 +1,104 @@
+import os
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Bloques grandes: con assets de cientos de MB el costo está en las llamadas al sistema
+BUFFER = 4 * 1024 * 1024
+
+# SHA-256 ya conocidos por (ruta, tamaño, mtime): los calcula la copia y los aprovechan
+# las cachés y manifiestos (íconos, almacén de assets, exportación) sin volver a leer.
+_hashes = OrderedDict()
+_hashes_candado = threading.Lock()
+MAX_HASHES = 20000
+
+
+def _clave(ruta, st):
+    return (os.path.normcase(os.path.abspath(ruta)), st.st_size, st.st_mtime_ns)
+
+
+def recordar_hash(ruta, sha):
+    """Anota el SHA-256 ya calculado de `ruta` (p. ej. tras enlazarla a un blob)."""
+    clave = _clave(ruta, os.stat(ruta))
+    with _hashes_candado:
+        _hashes[clave] = sha
+        _hashes.move_to_end(clave)
+        if len(_hashes) > MAX_HASHES:
+            _hashes.popitem(last=False)
+
+
+def hash_conocido(ruta):
+    """SHA-256 de `ruta`; si una copia o un hash anterior ya lo calculó (y el archivo no cambió), sin leerlo."""
+    clave = _clave(ruta, os.stat(ruta))
+    with _hashes_candado:
+        sha = _hashes.get(clave)
+    if sha is None:
+        h = hashlib.sha256()
+        with open(ruta, "rb") as f:
+            _leer(f, h.update)
+        sha = h.hexdigest()
+        recordar_hash(ruta, sha)
+    return sha
+
+
+def _leer(f, consumir):
+    bufer = bytearray(BUFFER)
+    vista = memoryview(bufer)
+    while True:
+        n = f.readinto(bufer)
+        if not n:
+            return
+        consumir(vista[:n])
+
+
+def _iguales(origen, destino, h):
+    """Compara bloque a bloque calculando el hash de `origen` en la misma lectura."""
+    with open(origen, "rb") as a, open(destino, "rb") as b:
+        while True:
+            bloque = a.read(BUFFER)
+            if bloque != b.read(len(bloque) or 1):
+                return False
+            if not bloque:
+                return True
+            h.update(bloque)
+
+
+def copiar(origen, destino, omitir_iguales=True):
+    """
+    Copia `origen` a `destino` (ruta de archivo) con bloques grandes y calcula el SHA-256
+    en la misma pasada; conserva fechas como shutil.copy2 y reemplaza de forma atómica.
+    Si `destino` ya tiene el mismo contenido no se escribe nada (sigue al día para las
+    tareas incrementales). Devuelve (sha256, escrito).
+    """
+    st_origen = os.stat(origen)
+    if omitir_iguales:
+        try:
+            st_destino = os.stat(destino)
+            if st_destino.st_size == st_origen.st_size:
+                if st_destino.st_ino and st_destino.st_ino == st_origen.st_ino and st_destino.st_dev == st_origen.st_dev:
+                    return hash_conocido(origen), False  # enlace duro al mismo archivo
+                h = hashlib.sha256()
+                if _iguales(origen, destino, h):
+                    sha = h.hexdigest()
+                    recordar_hash(origen, sha)
+                    recordar_hash(destino, sha)
+                    return sha, False
+        except FileNotFoundError:
+            pass
+
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    temporal = destino + ".tmp"
+    h = hashlib.sha256()
+    with open(origen, "rb") as src, open(temporal, "wb") as dst:
+        def _consumir(bloque):
+            h.update(bloque)
+            dst.write(bloque)
+        _leer(src, _consumir)
+    shutil.copystat(origen, temporal)
+    os.replace(temporal, destino)
+    sha = h.hexdigest()
+    recordar_hash(origen, sha)
+    recordar_hash(destino, sha)
+    return sha, True
+
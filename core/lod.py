@@ -0,0 +1,106 @@
+import os
+import json
+import uuid
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Proporción de caras que conserva cada LOD respecto al original, del más detallado al más liviano.
+RATIOS_POR_DEFECTO = (0.4, 0.1)
+
+# Por debajo de esta cantidad de caras no vale la pena generar LODs.
+MIN_CARAS = 20000
+
+BLENDER_LOD_SCRIPT = """
+import bpy, json
+with open(r"{trabajos}", "r", encoding="utf-8") as f:
+    trabajos = json.load(f)
+resultados = {{}}
+for t in trabajos:
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    bpy.ops.import_scene.gltf(filepath=t["origen"])
+    mallas = [o for o in bpy.context.scene.objects if o.type == 'MESH']
+    caras = sum(len(o.data.polygons) for o in mallas)
+    generados = []
+    if caras >= t["min_caras"]:
+        mods = [o.modifiers.new("lod", 'DECIMATE') for o in mallas]
+        for ratio, destino in t["lods"]:
+            for m in mods:
+                m.ratio = ratio
+            # export_apply aplica el decimate solo en el archivo exportado
+            bpy.ops.export_scene.gltf(filepath=destino, export_format='GLB', export_apply=True)
+            generados.append(destino)
+    resultados[t["origen"]] = {{"caras": caras, "lods": generados}}
+with open(r"{salida}", "w", encoding="utf-8") as f:
+    json.dump(resultados, f)
+"""
+
+
+def ruta_lod(modelo, nivel):
+    """models/pagina.glb -> models/pagina_lod1.glb (nivel 1 = más detallado)."""
+    base, ext = os.path.splitext(modelo)
+    return f"{base}_lod{nivel}{ext}"
+
+
+def _lote_blender(log, blender_exe, gen_dir, trabajos, timeout):
+    uid = uuid.uuid4().hex
+    trabajos_path = os.path.join(gen_dir, f"lod_trabajos_{uid}.json")
+    salida_path = os.path.join(gen_dir, f"lod_salida_{uid}.json")
+    script_path = os.path.join(gen_dir, f"lod_{uid}.py")
+    with open(trabajos_path, "w", encoding="utf-8") as f:
+        json.dump(trabajos, f)
+    with open(script_path, "w", encoding="utf-8") as f:
+        f.write(BLENDER_LOD_SCRIPT.format(trabajos=trabajos_path, salida=salida_path))
+    try:
+        proc = subprocess.run([blender_exe, "--background", "--python", script_path],
+                              capture_output=True, text=True, encoding="utf-8", errors="replace", timeout=timeout)
+        if proc.returncode != 0 or not os.path.exists(salida_path):
+            log(f"✗ ERROR generando LODs: {(proc.stderr or proc.stdout)[-400:]}")
+            return {}
+        with open(salida_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except subprocess.TimeoutExpired:
+        log("✗ Tiempo agotado generando LODs con Blender")
+        return {}
+    finally:
+        for ruta in (trabajos_path, salida_path, script_path):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+def generar_lods(log, modelos, blender_exe, gen_dir, ratios=RATIOS_POR_DEFECTO, min_caras=MIN_CARAS,
+                 procesos=2, timeout=1800):
+    """
+    Genera versiones decimadas de cada modelo con el modificador Decimate de Blender.
+    Los modelos se reparten en `procesos` lotes; cada lote es una sola instancia de Blender.
+    Devuelve {modelo: [lod_mas_liviano, ..., lod1]} solo para los modelos con LODs.
+    """
+    if not modelos:
+        return {}
+    if not os.path.exists(blender_exe):
+        log(f"⚠ Blender no encontrado en {blender_exe}: se omite la generación de LODs.")
+        return {}
+    os.makedirs(gen_dir, exist_ok=True)
+    trabajos = [{
+        "origen": os.path.abspath(m),
+        "lods": [[r, os.path.abspath(ruta_lod(m, i + 1))] for i, r in enumerate(ratios)],
+        "min_caras": min_caras,
+    } for m in modelos]
+    procesos = max(1, min(procesos, len(trabajos)))
+    lotes = [trabajos[i::procesos] for i in range(procesos)]
+    log(f"Generando LODs ({', '.join(str(r) for r in ratios)}) para {len(modelos)} modelos en {procesos} procesos de Blender...")
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=procesos) as pool:
+        for parcial in pool.map(lambda lote: _lote_blender(log, blender_exe, gen_dir, lote, timeout), lotes):
+            resultados.update(parcial)
+
+    lods = {}
+    for m in modelos:
+        r = resultados.get(os.path.abspath(m))
+        if not r:
+            continue
+        if r["lods"]:
+            lods[m] = list(reversed(r["lods"]))
+            log(f"  - {os.path.basename(m)}: {r['caras']} caras → {len(r['lods'])} LODs")
+        else:
+            log(f"  - {os.path.basename(m)}: {r['caras']} caras, no requiere LODs")
+    return lods
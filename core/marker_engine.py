@@ -0,0 +1,273 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from .env import get_paths
+
+# Versión del formato de caché: subirla invalida todos los marcadores cacheados.
+CACHE_VERSION = 2
+
+# Cantidad de códigos disponibles en la matriz 3x3 de AR.js (6 bits de datos).
+BARCODE_3X3_MAX = 64
+
+# Imagen imprimible del código: celdas de la matriz en px y proporción del patrón
+# interior respecto del marcador completo (patternRatio por defecto de AR.js).
+BARCODE_CELDA_PX = 100
+BARCODE_PATTERN_RATIO = 0.5
+
+BACKENDS = {}
+
+
+def registrar_backend(nombre):
+    """
+    Registra una función generadora de marcadores bajo `nombre`.
+    La función recibe (log, imagen_path, trabajo_dir, nombre_marcador, opciones)
+    y devuelve un dict con los campos del marcador para ar_content_list, o None si falla.
+    Los archivos que escriba en trabajo_dir son los que se cachean y se copian al destino.
+    """
+    def decorador(fn):
+        BACKENDS[nombre] = fn
+        return fn
+    return decorador
+
+
+@registrar_backend("pattern")
+def _backend_pattern(log, imagen_path, trabajo_dir, nombre_marcador, opciones):
+    from .markers import create_patt
+    patt_path = os.path.join(trabajo_dir, f"{nombre_marcador}.patt")
+    if not create_patt(log, imagen_path, patt_path):
+        return None
+    return {"markerUrl": f"patterns/{nombre_marcador}.patt"}
+
+
+@registrar_backend("nft")
+def _backend_nft(log, imagen_path, trabajo_dir, nombre_marcador, opciones):
+    from .markers import create_nft
+    if not create_nft(log, imagen_path, nombre_marcador, out_dir=trabajo_dir):
+        return None
+    # AR.js espera la ruta de los descriptores sin extensión (.fset/.fset3/.iset)
+    return {"descriptorsUrl": f"patterns/{nombre_marcador}"}
+
+
+def _celdas_barcode_3x3(valor):
+    """
+    Matriz 3x3 (True = negro) del código `valor` según ARToolKit (AR_MATRIX_CODE_3x3):
+    las esquinas superior izquierda y superior derecha negras y la inferior izquierda
+    blanca dan la orientación; las 6 celdas restantes son los bits del valor, de arriba
+    abajo y de izquierda a derecha, el más significativo primero.
+    """
+    orientacion = {(0, 0): True, (0, 2): True, (2, 0): False}
+    bits = iter(f"{valor:06b}")
+    return [[orientacion[(f, c)] if (f, c) in orientacion else next(bits) == "1" for c in range(3)]
+            for f in range(3)]
+
+
+def dibujar_barcode(valor, ruta):
+    """Escribe en `ruta` el PNG imprimible del código 3x3 `valor`: borde negro y margen blanco."""
+    from PIL import Image, ImageDraw
+    interior = 3 * BARCODE_CELDA_PX
+    marcador = round(interior / BARCODE_PATTERN_RATIO)
+    borde = (marcador - interior) // 2
+    margen = borde  # zona blanca alrededor para que el borde se distinga del papel recortado
+    img = Image.new("L", (marcador + 2 * margen, marcador + 2 * margen), 255)
+    dibujo = ImageDraw.Draw(img)
+    dibujo.rectangle((margen, margen, margen + marcador - 1, margen + marcador - 1), fill=0)
+    dibujo.rectangle((margen + borde, margen + borde, margen + borde + interior - 1,
+                      margen + borde + interior - 1), fill=255)
+    for f, fila in enumerate(_celdas_barcode_3x3(valor)):
+        for c, negro in enumerate(fila):
+            if negro:
+                x = margen + borde + c * BARCODE_CELDA_PX
+                y = margen + borde + f * BARCODE_CELDA_PX
+                dibujo.rectangle((x, y, x + BARCODE_CELDA_PX - 1, y + BARCODE_CELDA_PX - 1), fill=0)
+    img.save(ruta, "PNG")
+
+
+@registrar_backend("barcode")
+def _backend_barcode(log, imagen_path, trabajo_dir, nombre_marcador, opciones):
+    valor = opciones.get("barcodeValue")
+    if valor is None or not (0 <= int(valor) < BARCODE_3X3_MAX):
+        log(f"✗ Valor de código de barras inválido para {nombre_marcador}: {valor}")
+        return None
+    # La página no se detecta como barcode: lo que se imprime es esta imagen
+    dibujar_barcode(int(valor), os.path.join(trabajo_dir, f"{nombre_marcador}.png"))
+    return {"barcodeValue": int(valor), "markerImage": f"patterns/{nombre_marcador}.png"}
+
+
+def evaluar_calidad(imagen_path, tipo):
+    """
+    Revisa que la imagen sirva como marcador para el backend indicado.
+    Devuelve una lista de advertencias (vacía si la imagen es adecuada).
+    """
+    if tipo == "barcode":
+        return []
+    import cv2
+    img = cv2.imread(imagen_path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return [f"No se pudo leer la imagen: {imagen_path}"]
+    advertencias = []
+    alto, ancho = img.shape[:2]
+    contraste = float(img.std())
+    nitidez = float(cv2.Laplacian(img, cv2.CV_64F).var())
+    if contraste < 40:
+        advertencias.append(f"contraste bajo ({contraste:.0f}); el marcador puede no detectarse")
+    if tipo == "nft":
+        if min(ancho, alto) < 480:
+            advertencias.append(f"resolución baja para NFT ({ancho}x{alto}); se recomiendan 480px o más")
+        if nitidez < 100:
+            advertencias.append(f"pocos detalles para NFT (nitidez {nitidez:.0f}); use 'pattern' o 'barcode'")
+    return advertencias
+
+
+def _clave_cache(imagen_path, tipo, opciones):
+    h = hashlib.sha256()
+    h.update(f"{CACHE_VERSION}:{tipo}:{json.dumps(opciones, sort_keys=True)}:".encode("utf-8"))
+    if tipo != "barcode":
+        with open(imagen_path, "rb") as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(bloque)
+    return h.hexdigest()
+
+
+def _copiar_archivos(origen_dir, destino_dir, nombre_origen, nombre_destino):
+    for archivo in os.listdir(origen_dir):
+        if archivo == "entry.json":
+            continue
+        base, ext = os.path.splitext(archivo)
+        nuevo = f"{nombre_destino}{ext}" if base == nombre_origen else archivo
+        shutil.copy2(os.path.join(origen_dir, archivo), os.path.join(destino_dir, nuevo))
+
+
+def _renombrar_entrada(entrada, nombre_origen, nombre_destino):
+    renombrada = {}
+    for k, v in entrada.items():
+        if isinstance(v, str) and "/" in v:
+            carpeta, archivo = v.rsplit("/", 1)
+            base, ext = os.path.splitext(archivo)
+            if base == nombre_origen:
+                v = f"{carpeta}/{nombre_destino}{ext}"
+        renombrada[k] = v
+    return renombrada
+
+
+def generar_marcador(log, imagen_path, tipo, nombre_marcador, destino_dir, opciones=None, cache_dir=None):
+    """
+    Genera (o recupera de la caché) el marcador de una página con el backend `tipo`.
+    Devuelve el dict para ar_content_list (sin modelUrl) o None si falla.
+    """
+    opciones = opciones or {}
+    if tipo not in BACKENDS:
+        log(f"✗ Tipo de marcador desconocido '{tipo}' para {nombre_marcador}")
+        return None
+    for advertencia in evaluar_calidad(imagen_path, tipo):
+        log(f"⚠ {nombre_marcador} ({tipo}): {advertencia}")
+
+    cache_dir = cache_dir or os.path.join(str(get_paths()["GEN"]), "marker_cache")
+    clave = _clave_cache(imagen_path, tipo, opciones)
+    entrada_dir = os.path.join(cache_dir, tipo, clave)
+    entrada_json = os.path.join(entrada_dir, "entry.json")
+    os.makedirs(destino_dir, exist_ok=True)
+
+    if os.path.exists(entrada_json):
+        with open(entrada_json, "r", encoding="utf-8") as f:
+            cacheado = json.load(f)
+        _copiar_archivos(entrada_dir, destino_dir, cacheado["nombre"], nombre_marcador)
+        os.utime(entrada_dir)  # último uso, para la poda LRU de core/cache_budget.py
+        entrada = _renombrar_entrada(cacheado["entrada"], cacheado["nombre"], nombre_marcador)
+        log(f"✓ Marcador '{tipo}' recuperado de caché: {nombre_marcador}")
+        return {"type": tipo, **entrada}
+
+    # Carpeta de trabajo única: dos libros con la misma página pueden generar a la vez
+    os.makedirs(os.path.dirname(entrada_dir), exist_ok=True)
+    trabajo_dir = tempfile.mkdtemp(prefix=f"{clave[:16]}-", suffix=".tmp", dir=os.path.dirname(entrada_dir))
+    try:
+        entrada = BACKENDS[tipo](log, imagen_path, trabajo_dir, nombre_marcador, opciones)
+        if entrada is None:
+            return None
+        with open(os.path.join(trabajo_dir, "entry.json"), "w", encoding="utf-8") as f:
+            json.dump({"nombre": nombre_marcador, "entrada": entrada}, f)
+        try:
+            os.rename(trabajo_dir, entrada_dir)  # atómico; falla si otro proceso ya la publicó
+            origen_dir = entrada_dir
+        except OSError:
+            origen_dir = trabajo_dir  # ya existe con el mismo contenido: se usa el propio y se descarta
+        _copiar_archivos(origen_dir, destino_dir, nombre_marcador, nombre_marcador)
+        log(f"✓ Marcador '{tipo}' generado: {nombre_marcador}")
+        return {"type": tipo, **entrada}
+    except Exception as e:
+        log(f"✗ Error generando marcador '{tipo}' para {nombre_marcador}: {e}")
+        return None
+    finally:
+        shutil.rmtree(trabajo_dir, ignore_errors=True)
+
+
+def _leer_ids_barcode(ruta):
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            return {k: int(v) for k, v in json.load(f).items()}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def asignar_barcodes(nombres, anteriores=None):
+    """
+    Valor de la matriz 3x3 para cada nombre de página. Los que ya tenían valor lo
+    conservan (los marcadores impresos siguen sirviendo); los nuevos parten de un valor
+    derivado del nombre y, si está ocupado, toman el siguiente libre. Así agregar,
+    quitar o reordenar páginas no cambia el código de las demás.
+    Devuelve {nombre: valor}; los que no entran en la matriz quedan fuera.
+    """
+    anteriores = anteriores or {}
+    ids, usados = {}, set()
+    for nombre in nombres:
+        valor = anteriores.get(nombre)
+        if valor is not None and 0 <= valor < BARCODE_3X3_MAX and valor not in usados:
+            ids[nombre] = valor
+            usados.add(valor)
+    for nombre in nombres:
+        if nombre in ids or len(usados) >= BARCODE_3X3_MAX:
+            continue
+        valor = int(hashlib.sha256(nombre.encode("utf-8")).hexdigest()[:8], 16) % BARCODE_3X3_MAX
+        while valor in usados:
+            valor = (valor + 1) % BARCODE_3X3_MAX
+        ids[nombre] = valor
+        usados.add(valor)
+    return ids
+
+
+def generar_marcadores(log, trabajos, destino_dir, cache_dir=None, max_workers=None, ids_barcode_path=None):
+    """
+    Genera en paralelo los marcadores de un libro.
+    trabajos: lista de dicts {"imagen": ruta, "tipo": backend, "nombre": nombre_limpio}
+    Devuelve una lista alineada con `trabajos` con el dict del marcador o None.
+    Los marcadores 'barcode' reciben valores estables por nombre de página (ver
+    asignar_barcodes), guardados en `ids_barcode_path` para las regeneraciones.
+    """
+    nombres_barcode = [t["nombre"] for t in trabajos
+                       if t["tipo"] == "barcode" and "barcodeValue" not in (t.get("opciones") or {})]
+    ids = asignar_barcodes(nombres_barcode, _leer_ids_barcode(ids_barcode_path) if ids_barcode_path else None)
+    if len(nombres_barcode) > len(ids):
+        log(f"⚠ Hay {len(nombres_barcode)} marcadores 'barcode' y la matriz 3x3 solo admite {BARCODE_3X3_MAX}")
+    if ids_barcode_path and ids:
+        os.makedirs(os.path.dirname(ids_barcode_path) or ".", exist_ok=True)
+        with open(ids_barcode_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(ids, f, indent=2, ensure_ascii=False)
+        os.replace(ids_barcode_path + ".tmp", ids_barcode_path)
+
+    preparados = []
+    for t in trabajos:
+        opciones = dict(t.get("opciones") or {})
+        if t["tipo"] == "barcode" and "barcodeValue" not in opciones and t["nombre"] in ids:
+            opciones["barcodeValue"] = ids[t["nombre"]]
+        preparados.append((t, opciones))
+
+    max_workers = max_workers or min(8, os.cpu_count() or 2)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futuros = [
+            pool.submit(generar_marcador, log, t["imagen"], t["tipo"], t["nombre"], destino_dir, opciones, cache_dir)
+            for t, opciones in preparados
+        ]
+        return [f.result() for f in futuros]
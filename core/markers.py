@@ -2,6 +2,7 @@ import os
 import subprocess
 import shutil
 import cv2
+from pathlib import Path
 
 from .env import get_paths
 
@@ -23,7 +24,7 @@ def verificar_nft_marker_creator(log):
         log(f"✗ Error verificando NFT-Marker-Creator: {e}")
         return False
 
-def create_nft(log, image_path, marker_name):
+def create_nft(log, image_path, marker_name, out_dir=None):
     if not verificar_nft_marker_creator(log):
         return False
     p = get_paths()
@@ -35,12 +36,15 @@ def create_nft(log, image_path, marker_name):
         if res.returncode != 0 or "error" in res.stderr.lower():
             log(f"✗ Error NFT: {res.stderr or res.stdout}")
             return False
-        out_dir = p["WWW"] / "assets" / "markers"
+        out_dir = Path(out_dir) if out_dir else p["WWW"] / "assets" / "markers"
         out_dir.mkdir(parents=True, exist_ok=True)
         base = os.path.splitext(os.path.basename(image_path))[0]
         count = 0
         for ext in [".fset", ".fset3", ".iset"]:
-            src = nft_dir / f"{base}{ext}"
+            # NFT-Marker-Creator escribe en output/; versiones antiguas lo hacían en la raíz
+            src = nft_dir / "output" / f"{base}{ext}"
+            if not src.exists():
+                src = nft_dir / f"{base}{ext}"
             if src.exists():
                 dest = out_dir / f"{marker_name}{ext}"
                 shutil.move(str(src), str(dest))
@@ -0,0 +1,163 @@
+import time
+import bisect
+import threading
+from functools import wraps
+
+# Límites de los histogramas de latencia, en segundos.
+BUCKETS_HTTP = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_SQLITE = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+
+
+def _etiquetas(nombres, valores):
+    if not nombres:
+        return ""
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(nombres, valores)) + "}"
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, etiquetas
+        self.valores = {}
+        self._candado = threading.Lock()
+
+    def inc(self, *valores, n=1):
+        with self._candado:
+            self.valores[valores] = self.valores.get(valores, 0) + n
+
+    def exponer(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} counter"
+        with self._candado:
+            valores_copia = list(self.valores.items())
+        for valores, n in sorted(valores_copia):
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {n}"
+
+
+class Medidor:
+    def __init__(self, nombre, ayuda):
+        self.nombre, self.ayuda = nombre, ayuda
+        self.valor = 0
+        self._candado = threading.Lock()
+
+    def sumar(self, n):
+        with self._candado:
+            self.valor += n
+
+    def exponer(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} gauge"
+        yield f"{self.nombre} {self.valor}"
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_HTTP):
+        self.nombre, self.ayuda, self.etiquetas, self.buckets = nombre, ayuda, etiquetas, buckets
+        self.series = {}  # valores de etiquetas -> [conteos por bucket (+Inf al final), suma]
+        self._candado = threading.Lock()
+
+    def observar(self, segundos, *valores):
+        i = bisect.bisect_left(self.buckets, segundos)
+        with self._candado:
+            serie = self.series.get(valores)
+            if serie is None:
+                serie = self.series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += segundos
+
+    def exponer(self):
+        yield f"# HELP {self.nombre} {self.ayuda}"
+        yield f"# TYPE {self.nombre} histogram"
+        # Copia bajo el candado: observar() modifica las listas en su lugar y una lectura
+        # a medias daría buckets que no suman _count
+        with self._candado:
+            series = [(valores, (list(conteos), suma)) for valores, (conteos, suma) in self.series.items()]
+        for valores, (conteos, suma) in sorted(series):
+            acumulado = 0
+            for limite, n in zip(self.buckets + ("+Inf",), conteos):
+                acumulado += n
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas + ('le',), valores + (limite,))} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {suma:.6f}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}"
+
+
+class Metricas:
+    """
+    Registro en memoria con exposición en formato de texto de Prometheus.
+    Cada proceso tiene su propio registro; por eso con métricas activas el servidor
+    corre en un único proceso (ver core/wsgi_server.servir).
+    """
+
+    def __init__(self):
+        self.activo = True
+        self.inicio = time.time()
+        self.latencia = Histograma("http_request_duration_seconds", "Latencia de las peticiones HTTP por ruta",
+                                   ("route", "method"))
+        self.peticiones = Contador("http_requests_total", "Peticiones HTTP por ruta y código",
+                                   ("route", "method", "code"))
+        self.bytes = Contador("http_response_bytes_total", "Bytes de cuerpo enviados por ruta", ("route",))
+        self.activas = Medidor("http_requests_in_flight", "Peticiones (conexiones activas) en curso")
+        self.sqlite = Histograma("sqlite_query_duration_seconds", "Tiempo de las consultas SQLite",
+                                 ("query",), BUCKETS_SQLITE)
+        self.cache_tokens = Contador("activation_token_cache_total",
+                                     "Activaciones por resultado de la caché: rechazado, acierto o sqlite", ("result",))
+        self.limitadas = Contador("activation_rate_limited_total", "Activaciones rechazadas por límite de frecuencia",
+                                  ("key",))
+        self.lotes_activacion = Histograma("activation_batch_size", "Activaciones confirmadas por transacción",
+                                           buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+    def exponer(self):
+        lineas = []
+        for metrica in (self.latencia, self.peticiones, self.bytes, self.activas, self.sqlite, self.cache_tokens,
+                        self.limitadas, self.lotes_activacion):
+            lineas.extend(metrica.exponer())
+        lineas.append("# TYPE process_uptime_seconds gauge")
+        lineas.append(f"process_uptime_seconds {time.time() - self.inicio:.0f}")
+        return "\n".join(lineas) + "\n"
+
+
+METRICAS = Metricas()
+
+
+def medir_consulta(nombre):
+    """Decorador: registra la duración de la función en sqlite_query_duration_seconds."""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not METRICAS.activo:
+                return funcion(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                METRICAS.sqlite.observar(time.perf_counter() - t0, nombre)
+        return envoltura
+    return decorador
+
+
+def instrumentar(app, metricas=METRICAS):
+    """Registra los hooks de Flask que alimentan las métricas HTTP y agrega la ruta /metrics."""
+    from flask import request, g, Response
+
+    @app.before_request
+    def _metricas_inicio():
+        if metricas.activo:
+            g._t0 = time.perf_counter()
+            metricas.activas.sumar(1)
+
+    @app.after_request
+    def _metricas_fin(resp):
+        t0 = g.pop("_t0", None)
+        if t0 is not None:
+            ruta = request.url_rule.rule if request.url_rule else "<sin ruta>"
+            metricas.latencia.observar(time.perf_counter() - t0, ruta, request.method)
+            metricas.peticiones.inc(ruta, request.method, str(resp.status_code))
+            if resp.content_length:
+                metricas.bytes.inc(ruta, n=resp.content_length)
+            metricas.activas.sumar(-1)
+        return resp
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(metricas.exponer(), mimetype="text/plain; version=0.0.4")
+
+    return app
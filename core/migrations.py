@@ -0,0 +1,72 @@
+def _agregar_columna(tabla, columna, definicion):
+    """Paso de migración: ADD COLUMN solo si la columna no existe todavía."""
+    def paso(conn):
+        if columna not in {fila[1] for fila in conn.execute(f"PRAGMA table_info({tabla})")}:
+            conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+    return paso
+
+
+# Versión del esquema -> pasos (SQL o funciones que reciben la conexión).
+# PRAGMA user_version guarda la última versión aplicada.
+# Reglas para poder migrar con el servidor en marcha:
+# - nada de reescribir la tabla: ADD COLUMN con DEFAULT constante solo toca el esquema;
+# - una transacción corta por versión, así los lectores (WAL) nunca quedan bloqueados
+#   y un escritor concurrente solo espera lo que dura esa transacción (busy_timeout).
+MIGRACIONES = [
+    (1, [
+        """CREATE TABLE IF NOT EXISTS activaciones (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token TEXT NOT NULL UNIQUE,
+            device_id TEXT,
+            fecha_creacion TEXT NOT NULL,
+            usado INTEGER DEFAULT 0,
+            fecha_uso TEXT
+        )""",
+    ]),
+    (2, [
+        _agregar_columna("activaciones", "libro", "TEXT NOT NULL DEFAULT ''"),
+    ]),
+    (3, [
+        "CREATE INDEX IF NOT EXISTS idx_activaciones_libro_usado ON activaciones (libro, usado)",
+        "CREATE INDEX IF NOT EXISTS idx_activaciones_device ON activaciones (device_id)",
+    ]),
+]
+
+VERSION_ACTUAL = MIGRACIONES[-1][0]
+
+
+def migrar(conn, log=None):
+    """
+    Lleva la base al esquema VERSION_ACTUAL aplicando solo las migraciones pendientes.
+    Es idempotente y segura entre procesos: cada versión se aplica dentro de
+    BEGIN IMMEDIATE y vuelve a comprobar user_version antes de ejecutar.
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    aplicadas = []
+    for version, pasos in MIGRACIONES:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+            continue
+        conn.isolation_level = None
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                conn.execute("ROLLBACK")
+                continue
+            for paso in pasos:
+                if callable(paso):
+                    paso(conn)
+                else:
+                    conn.execute(paso)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+            aplicadas.append(version)
+        except Exception:
+            # Cualquier fallo de un paso (SQL o Python) deshace la versión entera
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.isolation_level = ""
+    if log and aplicadas:
+        log(f"✓ Esquema de activaciones migrado a la versión {VERSION_ACTUAL} (aplicadas: {aplicadas})")
+    return aplicadas
@@ -0,0 +1,173 @@
+import os
+import json
+import hashlib
+
+from .io_utils import hash_conocido
+
+MANIFEST_NAME = "precache-manifest.json"
+SW_NAME = "sw.js"
+
+# Fragmento que registran las páginas generadas.
+SCRIPT_REGISTRO = """<script>
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', () => navigator.serviceWorker.register('sw.js').catch(e => console.warn('Service worker no registrado:', e)));
+}
+</script>"""
+
+# Extensiones que se descargan bajo demanda (modelos y sus LOD) en lugar de precargarse:
+# el visor las pide al detectar cada marcador y así la primera visita no baja el libro entero.
+BAJO_DEMANDA = (".glb", ".gltf", ".bin", ".ktx2")
+
+# El service worker incluye la versión del manifiesto: cualquier cambio en www cambia
+# sw.js y el navegador lo reinstala. Cada versión usa sus propias cachés (interfaz y
+# modelos); al instalar se reutiliza de la versión anterior todo lo que no cambió de hash
+# y al activar se borran las cachés de otras versiones.
+SW_TEMPLATE = """// sw.js - generado automáticamente, no editar
+const VERSION = '__VERSION__';
+const PREFIJO = 'libro3dar-';
+const SHELL = PREFIJO + 'shell-' + VERSION;
+const MODELOS = PREFIJO + 'modelos-' + VERSION;
+const MANIFEST_KEY = '__MANIFEST__';
+const BAJO_DEMANDA = /__BAJO_DEMANDA__$/i;
+const DESCARGAS_SIMULTANEAS = 4;
+
+self.addEventListener('install', (event) => {
+    event.waitUntil(precache().then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(limpiarVersiones().then(() => self.clients.claim()));
+});
+
+async function manifiestoDe(cache) {
+    const res = await cache.match(MANIFEST_KEY);
+    return res ? res.json() : null;
+}
+
+async function versionesAnteriores() {
+    const nombres = await caches.keys();
+    return nombres.filter(n => n.startsWith(PREFIJO + 'shell-') && n !== SHELL);
+}
+
+// Ejecuta `tarea` sobre cada elemento con como mucho `limite` a la vez
+async function enParalelo(elementos, limite, tarea) {
+    const pendientes = elementos.slice();
+    const trabajadores = Array.from({ length: Math.min(limite, pendientes.length) }, async () => {
+        while (pendientes.length) await tarea(pendientes.shift());
+    });
+    await Promise.all(trabajadores);
+}
+
+async function precache() {
+    const response = await fetch(MANIFEST_KEY, { cache: 'no-store' });
+    const manifest = await response.clone().json();
+    const cache = await caches.open(SHELL);
+    const anteriores = [];
+    for (const nombre of await versionesAnteriores()) {
+        const viejo = await caches.open(nombre);
+        anteriores.push({ cache: viejo, manifest: await manifiestoDe(viejo) });
+    }
+
+    let descargados = 0;
+    await enParalelo(Object.entries(manifest.files), DESCARGAS_SIMULTANEAS, async ([path, hash]) => {
+        for (const anterior of anteriores) {
+            if (!anterior.manifest || anterior.manifest.files[path] !== hash) continue;
+            const reutilizable = await anterior.cache.match(path);
+            if (reutilizable) {
+                await cache.put(path, reutilizable);
+                return;
+            }
+        }
+        try {
+            const res = await fetch(path, { cache: 'no-store' });
+            if (res.ok) {
+                await cache.put(path, res);
+                descargados++;
+            }
+        } catch (e) {
+            console.warn('No se pudo precargar', path, e);
+        }
+    });
+    // El manifiesto se guarda al final: una instalación a medias no pasa por completa
+    await cache.put(MANIFEST_KEY, response);
+    console.log(`Precache ${VERSION}: ${Object.keys(manifest.files).length} archivos (${descargados} descargados)`);
+}
+
+async function limpiarVersiones() {
+    const actual = await manifiestoDe(await caches.open(SHELL));
+    const modelos = await caches.open(MODELOS);
+    for (const nombre of await versionesAnteriores()) {
+        // Los modelos ya descargados que no cambiaron pasan a la caché de esta versión
+        const anterior = await manifiestoDe(await caches.open(nombre));
+        const nombreModelos = PREFIJO + 'modelos-' + nombre.slice((PREFIJO + 'shell-').length);
+        if (actual && anterior && await caches.has(nombreModelos)) {
+            const viejos = await caches.open(nombreModelos);
+            for (const [path, hash] of Object.entries(actual.bajo_demanda || {})) {
+                if ((anterior.bajo_demanda || {})[path] !== hash) continue;
+                const res = await viejos.match(path);
+                if (res) await modelos.put(path, res);
+            }
+        }
+    }
+    const vigentes = [SHELL, MODELOS];
+    for (const nombre of await caches.keys()) {
+        if (nombre.startsWith(PREFIJO) && !vigentes.includes(nombre)) await caches.delete(nombre);
+    }
+}
+
+async function modeloBajoDemanda(request, path) {
+    const cache = await caches.open(MODELOS);
+    const cached = await cache.match(path);
+    if (cached) return cached;
+    const res = await fetch(request);
+    // Solo respuestas completas: un 206 de un Range no sirve como copia offline
+    if (res.status === 200) await cache.put(path, res.clone());
+    return res;
+}
+
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    let url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin) return;
+    if (url.pathname.endsWith('/')) url = new URL('index.html', url);
+    if (BAJO_DEMANDA.test(url.pathname)) {
+        event.respondWith(modeloBajoDemanda(request, url.origin + url.pathname));
+        return;
+    }
+    event.respondWith((async () => {
+        const cache = await caches.open(SHELL);
+        const cached = await cache.match(url.href, { ignoreSearch: true });
+        return cached || fetch(request);
+    })());
+});
+"""
+
+
+def generar_precache(log, www_dir):
+    """
+    Escribe en www el manifiesto de precarga (ruta -> hash de contenido, con los
+    modelos aparte en "bajo_demanda") y el service worker que lo usa. Devuelve el
+    dict del manifiesto.
+    """
+    archivos, bajo_demanda = {}, {}
+    for raiz, _, nombres in os.walk(www_dir):
+        for nombre in nombres:
+            ruta = os.path.join(raiz, nombre)
+            rel = os.path.relpath(ruta, www_dir).replace(os.sep, "/")
+            # .gz/.br son variantes precomprimidas que el servidor negocia por su cuenta
+            if rel in (MANIFEST_NAME, SW_NAME) or nombre.endswith((".gz", ".br")):
+                continue
+            destino = bajo_demanda if nombre.lower().endswith(BAJO_DEMANDA) else archivos
+            destino[rel] = hash_conocido(ruta)[:16]
+    version = hashlib.sha256(json.dumps([archivos, bajo_demanda], sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    manifiesto = {"version": version, "files": dict(sorted(archivos.items())),
+                  "bajo_demanda": dict(sorted(bajo_demanda.items()))}
+
+    with open(os.path.join(www_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=1)
+    with open(os.path.join(www_dir, SW_NAME), "w", encoding="utf-8") as f:
+        f.write(SW_TEMPLATE.replace("__VERSION__", version).replace("__MANIFEST__", MANIFEST_NAME)
+                .replace("__BAJO_DEMANDA__", "(" + "|".join("\\" + e for e in BAJO_DEMANDA) + ")"))
+    log(f"✓ Service worker y manifiesto de precarga generados ({len(archivos)} archivos precargados, "
+        f"{len(bajo_demanda)} bajo demanda, versión {version})")
+    return manifiesto
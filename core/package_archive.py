@@ -0,0 +1,255 @@
+import io
+import os
+import json
+import shutil
+import hashlib
+import tarfile
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from .io_utils import hash_conocido
+
+# Formatos ya comprimidos: se guardan tal cual, recomprimirlos solo gasta CPU
+ALMACENAR = (".glb", ".jpg", ".jpeg", ".png", ".webp", ".ktx2", ".mp4", ".webm", ".mp3", ".ogg",
+             ".gz", ".br", ".zip", ".apk")
+
+BUFFER = 1024 * 1024
+MANIFIESTO = "manifiesto.json"
+VERSION_ARCHIVO = 1
+# Nivel 3 (el predeterminado de zstd) comprime a cientos de MB/s; 19 tarda decenas de
+# veces más y en paquetes dominados por GLB y JPEG casi no reduce. Para archivos donde
+# casi todo son binarios ya comprimidos conviene .zip: los guarda sin recomprimir.
+NIVEL_ZSTD = 3
+
+
+def _zstd():
+    """Módulo zstd disponible: `compression.zstd` (Python 3.14+) o el paquete opcional `zstandard`."""
+    try:
+        from compression import zstd
+        return "stdlib", zstd
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        return "zstandard", zstandard
+    except ImportError:
+        return None, None
+
+
+def _escritor_zstd(archivo):
+    origen, modulo = _zstd()
+    if origen == "stdlib":
+        return modulo.ZstdFile(archivo, "wb", level=NIVEL_ZSTD)
+    if origen == "zstandard":
+        return modulo.ZstdCompressor(level=NIVEL_ZSTD, threads=-1).stream_writer(archivo, closefd=False)
+    raise RuntimeError("tar.zst requiere Python 3.14+ o el paquete 'zstandard' (pip install zstandard)")
+
+
+def _lector_zstd(archivo):
+    origen, modulo = _zstd()
+    if origen == "stdlib":
+        return modulo.ZstdFile(archivo, "rb")
+    if origen == "zstandard":
+        return modulo.ZstdDecompressor().stream_reader(archivo, closefd=False)
+    raise RuntimeError("tar.zst requiere Python 3.14+ o el paquete 'zstandard' (pip install zstandard)")
+
+
+def _formato(ruta):
+    if ruta.lower().endswith(".zip"):
+        return "zip"
+    if ruta.lower().endswith((".tar.zst", ".tzst")):
+        return "tar.zst"
+    raise ValueError(f"Formato no soportado: {ruta} (use .zip o .tar.zst)")
+
+
+def _archivos(raiz):
+    """Rutas relativas (con '/') de todos los archivos bajo `raiz`, en orden estable."""
+    rutas = []
+    for carpeta, subcarpetas, archivos in os.walk(raiz):
+        subcarpetas.sort()
+        for nombre in sorted(archivos):
+            rutas.append(os.path.relpath(os.path.join(carpeta, nombre), raiz).replace(os.sep, "/"))
+    return rutas
+
+
+def _plan(paquetes, dedup, max_workers):
+    """
+    Lista de entradas (nombre_en_archivo, ruta_local) y el manifiesto. Con `dedup` cada
+    contenido distinto se guarda una sola vez en blobs/<sha256> aunque lo usen varios libros.
+    """
+    archivos = [(os.path.basename(os.path.normpath(p)), rel, os.path.join(p, *rel.split("/")))
+                for p in paquetes for rel in _archivos(p)]
+    manifiesto = {"version": VERSION_ARCHIVO, "dedup": dedup, "libros": {}}
+    if not dedup:
+        for libro, rel, ruta in archivos:
+            manifiesto["libros"].setdefault(libro, {})[rel] = {"tam": os.path.getsize(ruta)}
+        return [(f"{libro}/{rel}", ruta) for libro, rel, ruta in archivos], manifiesto
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        hashes = list(pool.map(lambda a: hash_conocido(a[2]), archivos))
+    entradas, vistos = [], set()
+    for (libro, rel, ruta), sha in zip(archivos, hashes):
+        manifiesto["libros"].setdefault(libro, {})[rel] = {"sha256": sha, "tam": os.path.getsize(ruta)}
+        if sha not in vistos:
+            vistos.add(sha)
+            entradas.append((f"blobs/{sha[:2]}/{sha}{os.path.splitext(rel)[1].lower()}", ruta))
+    return entradas, manifiesto
+
+
+def exportar(log, paquetes, destino, dedup=False, max_workers=None):
+    """
+    Escribe los `paquetes` (carpetas de paquetes/<nombre>) en un .zip o .tar.zst sin
+    copias intermedias: cada archivo se lee del disco y se escribe directo en el archivo.
+    En zip, los formatos ya comprimidos (GLB, JPEG...) se guardan sin recomprimir y el
+    texto se comprime al máximo. El manifiesto va primero para que la importación
+    pueda hacerse en streaming. Devuelve {"entradas", "bytes_origen", "bytes_archivo"}.
+    """
+    formato = _formato(destino)
+    entradas, manifiesto = _plan(paquetes, dedup, max_workers)
+    datos_manifiesto = json.dumps(manifiesto, indent=1, ensure_ascii=False).encode("utf-8")
+    temporal = destino + ".tmp"
+    with open(temporal, "wb") as salida:
+        if formato == "zip":
+            with zipfile.ZipFile(salida, "w", allowZip64=True) as zf:
+                zf.writestr(MANIFIESTO, datos_manifiesto, zipfile.ZIP_DEFLATED, 9)
+                for nombre, ruta in entradas:
+                    info = zipfile.ZipInfo.from_file(ruta, nombre)
+                    if nombre.lower().endswith(ALMACENAR):
+                        info.compress_type = zipfile.ZIP_STORED
+                    else:
+                        info.compress_type = zipfile.ZIP_DEFLATED
+                        # Python 3.13 renombró el atributo del nivel de compresión
+                        if hasattr(info, "compress_level"):
+                            info.compress_level = 9
+                        else:
+                            info._compresslevel = 9
+                    with open(ruta, "rb") as src, zf.open(info, "w", force_zip64=True) as dst:
+                        shutil.copyfileobj(src, dst, BUFFER)
+        else:
+            comprimido = _escritor_zstd(salida)
+            try:
+                with tarfile.open(fileobj=comprimido, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                    info = tarfile.TarInfo(MANIFIESTO)
+                    info.size = len(datos_manifiesto)
+                    tar.addfile(info, io.BytesIO(datos_manifiesto))
+                    for nombre, ruta in entradas:
+                        info = tar.gettarinfo(ruta, nombre)
+                        info.uid = info.gid = 0
+                        info.uname = info.gname = ""
+                        with open(ruta, "rb") as src:
+                            tar.addfile(info, src)
+            finally:
+                comprimido.close()
+    os.replace(temporal, destino)
+
+    bytes_origen = sum(d["tam"] for archivos in manifiesto["libros"].values() for d in archivos.values())
+    resultado = {"entradas": len(entradas), "bytes_origen": bytes_origen, "bytes_archivo": os.path.getsize(destino)}
+    log(f"✓ Exportado {destino}: {len(manifiesto['libros'])} libros, {len(entradas)} entradas, "
+        f"{bytes_origen / 1048576:.1f} MB → {resultado['bytes_archivo'] / 1048576:.1f} MB")
+    return resultado
+
+
+def _ruta_segura(destino_dir, relativa):
+    ruta = os.path.normpath(os.path.join(destino_dir, *relativa.split("/")))
+    if os.path.isabs(relativa) or os.path.commonpath([os.path.abspath(destino_dir), os.path.abspath(ruta)]) \
+            != os.path.abspath(destino_dir):
+        raise ValueError(f"Entrada fuera del destino en el archivo: {relativa}")
+    return ruta
+
+
+def _volcar(src, ruta, sha_esperado=None):
+    """Copia en streaming a `ruta` (atómico); si se indica, verifica el SHA-256 en la misma pasada."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    h = hashlib.sha256() if sha_esperado else None
+    with open(ruta + ".tmp", "wb") as dst:
+        while True:
+            bloque = src.read(BUFFER)
+            if not bloque:
+                break
+            if h:
+                h.update(bloque)
+            dst.write(bloque)
+    if h and h.hexdigest() != sha_esperado:
+        os.remove(ruta + ".tmp")
+        raise ValueError(f"Contenido corrupto en el archivo: {os.path.basename(ruta)}")
+    os.replace(ruta + ".tmp", ruta)
+
+
+def importar(log, archivo, destino_dir, reemplazar=False):
+    """
+    Restaura en `destino_dir` los libros de un archivo creado con `exportar`, leyéndolo
+    en streaming. En modo dedup cada blob se escribe una vez y las demás rutas que lo
+    usan se enlazan (ver core/www_sync.py). Devuelve la lista de libros importados.
+
+    Todo se extrae primero en una carpeta temporal dentro de `destino_dir` y cada libro
+    se pone en su lugar con un rename al final: si el archivo está corrupto o la
+    importación se corta, los libros existentes quedan intactos. Un libro que ya existe
+    solo se reemplaza con `reemplazar`; si no, la importación se rechaza antes de escribir.
+    """
+    from .www_sync import enlazar_o_copiar
+    formato = _formato(archivo)
+    os.makedirs(destino_dir, exist_ok=True)
+    temporal = tempfile.mkdtemp(prefix=".importando-", dir=destino_dir)
+    manifiesto, destinos = None, {}
+
+    def _procesar(nombre, src):
+        nonlocal manifiesto
+        if nombre == MANIFIESTO:
+            manifiesto = json.loads(src.read().decode("utf-8"))
+            if manifiesto.get("version") != VERSION_ARCHIVO:
+                raise ValueError(f"Versión de archivo no soportada: {manifiesto.get('version')}")
+            existentes = [l for l in manifiesto["libros"] if os.path.exists(_ruta_segura(destino_dir, l))]
+            if existentes and not reemplazar:
+                raise FileExistsError(f"Ya existen en {destino_dir}: {', '.join(sorted(existentes))}")
+            for libro, archivos in manifiesto["libros"].items():
+                for rel, datos in archivos.items():
+                    clave = datos["sha256"] if manifiesto["dedup"] else f"{libro}/{rel}"
+                    destinos.setdefault(clave, []).append(_ruta_segura(temporal, f"{libro}/{rel}"))
+            return
+        if manifiesto is None:
+            raise ValueError("El archivo no empieza con el manifiesto; ¿fue creado con exportar()?")
+        if manifiesto["dedup"]:
+            sha = os.path.splitext(nombre.rsplit("/", 1)[-1])[0]
+            rutas = destinos.get(sha, [])
+            if rutas:
+                _volcar(src, rutas[0], sha)
+                for otra in rutas[1:]:
+                    enlazar_o_copiar(rutas[0], otra)
+        else:
+            for ruta in destinos.get(nombre, []):
+                _volcar(src, ruta)
+
+    try:
+        with open(archivo, "rb") as entrada:
+            if formato == "zip":
+                with zipfile.ZipFile(entrada) as zf:
+                    for info in zf.infolist():
+                        if not info.is_dir():
+                            with zf.open(info) as src:
+                                _procesar(info.filename, src)
+            else:
+                descomprimido = _lector_zstd(entrada)
+                try:
+                    with tarfile.open(fileobj=descomprimido, mode="r|") as tar:
+                        for miembro in tar:
+                            if miembro.isfile():
+                                _procesar(miembro.name, tar.extractfile(miembro))
+                finally:
+                    descomprimido.close()
+
+        libros = sorted(manifiesto["libros"]) if manifiesto else []
+        for libro in libros:
+            nuevo, final = os.path.join(temporal, libro), _ruta_segura(destino_dir, libro)
+            os.makedirs(nuevo, exist_ok=True)  # libro sin archivos
+            if os.path.exists(final):
+                anterior = os.path.join(temporal, f".anterior-{libro}")
+                os.replace(final, anterior)
+                os.replace(nuevo, final)
+                shutil.rmtree(anterior, ignore_errors=True)
+            else:
+                os.replace(nuevo, final)
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+    log(f"✓ Importados {len(libros)} libros en {destino_dir}: {', '.join(libros)}")
+    return libros
@@ -0,0 +1,58 @@
+import time
+import threading
+from collections import OrderedDict
+
+# capacidad (ráfaga) y recarga en intentos por segundo. La IP es generosa porque un aula
+# entera puede salir por la misma IP pública; el dispositivo es estricto.
+LIMITES_POR_DEFECTO = {
+    "ip": (60, 2.0),
+    "device": (5, 0.2),
+}
+
+
+class LimitadorTokens:
+    """
+    Token bucket por clave con memoria acotada: como mucho `max_claves` cubetas en un
+    LRU; la menos usada se descarta (equivale a que ese cliente empiece con la cubeta
+    llena). Cada consulta es O(1).
+    """
+
+    def __init__(self, capacidad, recarga, max_claves=100000):
+        self.capacidad = float(capacidad)
+        self.recarga = float(recarga)
+        self.max_claves = max_claves
+        self.cubetas = OrderedDict()  # clave -> [tokens, último instante]
+        self._candado = threading.Lock()
+
+    def permitir(self, clave, ahora=None):
+        """Consume un intento. Devuelve 0 si se permite o los segundos a esperar si no."""
+        ahora = time.monotonic() if ahora is None else ahora
+        with self._candado:
+            cubeta = self.cubetas.get(clave)
+            if cubeta is None:
+                cubeta = self.cubetas[clave] = [self.capacidad, ahora]
+                if len(self.cubetas) > self.max_claves:
+                    self.cubetas.popitem(last=False)
+            else:
+                self.cubetas.move_to_end(clave)
+                cubeta[0] = min(self.capacidad, cubeta[0] + (ahora - cubeta[1]) * self.recarga)
+                cubeta[1] = ahora
+            if cubeta[0] >= 1.0:
+                cubeta[0] -= 1.0
+                return 0
+            return (1.0 - cubeta[0]) / self.recarga
+
+
+def ip_cliente(request):
+    """
+    IP del cliente. X-Forwarded-For solo se acepta si la conexión viene de un proxy local
+    (ngrok), y de ella se toma la última entrada: la que agregó el proxy con la IP real.
+    Las anteriores las escribe el propio cliente y no sirven para limitarlo.
+    """
+    remota = request.remote_addr or ""
+    reenviada = request.headers.get("X-Forwarded-For")
+    if reenviada and remota in ("127.0.0.1", "::1"):
+        ultima = reenviada.rsplit(",", 1)[-1].strip()
+        if ultima:
+            return ultima
+    return remota
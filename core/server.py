@@ -1,20 +1,76 @@
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from .env import get_paths
+from .db import activar_token, activar_escritura_diferida
+from .static_cache import enviar_estatico
+from .metrics import METRICAS, instrumentar
+from .rate_limit import LimitadorTokens, LIMITES_POR_DEFECTO, ip_cliente
 
-def create_app():
+# Longitud máxima de los campos de /activar. Las claves son UUID formateados y los
+# device_id identificadores cortos; el device_id es además clave del limitador, que
+# guarda como mucho max_claves cubetas, así que su largo acota la memoria de este.
+MAX_CAMPO = 128
+
+
+def _campo(datos, clave):
+    """Texto del campo `clave` sin espacios, "" si falta o None si no es texto o es demasiado largo."""
+    valor = datos.get(clave)
+    if valor is None:
+        return ""
+    if not isinstance(valor, str) or len(valor) > MAX_CAMPO:
+        return None
+    return valor.strip()
+
+
+def create_app(metricas=True, escritura_diferida=False, limites=None, log=None):
     p = get_paths()
     app = Flask(__name__, static_folder=str(p["PROJECT"]/"www"))
     CORS(app)
 
+    activar_escritura_diferida(escritura_diferida, log=log)
+    METRICAS.activo = metricas
+    if metricas:
+        instrumentar(app)
+
+    # Token bucket por IP y por device_id para /activar; limites = {"ip": (capacidad, por_segundo), ...}
+    limites = {**LIMITES_POR_DEFECTO, **(limites or {})}
+    limitadores = {clave: LimitadorTokens(*valores) for clave, valores in limites.items()}
+
+    def _demasiados(clave, espera):
+        METRICAS.limitadas.inc(clave)
+        resp = jsonify({"valid": False, "error": "Demasiados intentos. Espera unos segundos y vuelve a probar."})
+        resp.status_code = 429
+        resp.headers["Retry-After"] = str(int(espera) + 1)
+        return resp
+
     @app.get("/health")
     def health():
         return jsonify({"ok": True})
 
+    @app.post("/activar")
+    def activar():
+        espera = limitadores["ip"].permitir(ip_cliente(request))
+        if espera:
+            return _demasiados("ip", espera)
+        datos = request.get_json(silent=True)
+        if not isinstance(datos, dict):
+            return jsonify({"valid": False, "error": "Se esperaba un objeto JSON."}), 400
+        token, device_id, libro = (_campo(datos, c) for c in ("token", "device_id", "libro"))
+        if token is None or device_id is None or libro is None:
+            return jsonify({"valid": False, "error": f"token, device_id y libro deben ser texto de hasta {MAX_CAMPO} caracteres."}), 400
+        if not token or not device_id:
+            return jsonify({"valid": False, "error": "Faltan token o device_id."}), 400
+        espera = limitadores["device"].permitir(device_id)
+        if espera:
+            return _demasiados("device", espera)
+        # Las páginas de activación generadas envían el libro para enrutar a su partición
+        valido, error = activar_token(token, device_id, libro or None)
+        return jsonify({"valid": True} if valido else {"valid": False, "error": error})
+
     @app.route("/", defaults={"path": "index.html"})
     @app.route("/<path:path>")
     def static_serve(path):
         root = p["PROJECT"]/ "www"
-        return send_from_directory(root, path)
+        return enviar_estatico(root, path)
 
     return app
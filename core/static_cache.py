@@ -0,0 +1,275 @@
+import os
+import re
+import gzip
+import mimetypes
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+from .io_utils import hash_conocido
+
+try:
+    import brotli  # opcional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Extensiones que vale la pena comprimir. Los GLB/BIN quedan fuera: son los archivos
+# más grandes, sus texturas (JPEG/PNG/KTX2) ya vienen comprimidas y se sirven con
+# Range; JPEG/PNG/WebP tampoco se recomprimen.
+COMPRIMIBLES = {".html", ".js", ".css", ".json", ".svg", ".txt", ".patt", ".dat",
+                ".gltf", ".wasm", ".fset", ".fset3", ".iset"}
+
+# Solo se conserva la versión comprimida si ahorra al menos este porcentaje.
+AHORRO_MINIMO = 0.10
+
+# Archivos más grandes que esto se sirven sin precomprimir.
+MAX_PRECOMPRIMIR = 64 * 1024 * 1024
+
+# Niveles de compresión: brotli 11 tarda decenas de veces más que 9 para ganar un par de puntos.
+NIVEL_GZIP = 9
+CALIDAD_BROTLI = 9
+
+BUFFER_COMPRESION = 1024 * 1024
+
+# Archivos con hash de contenido en el nombre (three.min.3fa2b1c4d5.js, vendor/basis-3fa2b1c4d5/...)
+PATRON_HASH = re.compile(r"[.-][0-9a-f]{8,}[./]")
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+
+# Un solo intervalo "bytes=inicio-fin" (cualquiera de los dos puede faltar).
+PATRON_RANGO = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Tamaño de lectura cuando el servidor no tiene sendfile y se envía desde Python.
+BUFFER_ENVIO = 256 * 1024
+
+
+class _Brotli:
+    """Escritor en streaming con la misma interfaz que gzip.GzipFile (write/close)."""
+
+    def __init__(self, salida):
+        self.salida = salida
+        self.compresor = brotli.Compressor(quality=CALIDAD_BROTLI)
+
+    def write(self, datos):
+        self.salida.write(self.compresor.process(datos))
+
+    def close(self):
+        self.salida.write(self.compresor.finish())
+
+
+def _gzip(salida):
+    return gzip.GzipFile(fileobj=salida, mode="wb", compresslevel=NIVEL_GZIP, mtime=0)
+
+
+def _comprimir(ruta):
+    """
+    Escribe los hermanos .gz/.br de un archivo si no existen o están desactualizados.
+    Se comprime en streaming por bloques: la memoria no depende del tamaño del archivo.
+    """
+    st = os.stat(ruta)
+    escritos = 0
+    for ext, escritor in ((".gz", _gzip), (".br", _Brotli if brotli else None)):
+        destino = ruta + ext
+        if escritor is None:
+            continue
+        if os.path.exists(destino) and os.path.getmtime(destino) >= st.st_mtime:
+            continue
+        with open(ruta, "rb") as src, open(destino + ".tmp", "wb") as out:
+            comprimido = escritor(out)
+            for bloque in iter(lambda: src.read(BUFFER_COMPRESION), b""):
+                comprimido.write(bloque)
+            comprimido.close()
+        if os.path.getsize(destino + ".tmp") <= st.st_size * (1 - AHORRO_MINIMO):
+            os.replace(destino + ".tmp", destino)
+            escritos += 1
+        else:
+            os.remove(destino + ".tmp")
+            if os.path.exists(destino):
+                os.remove(destino)
+    return escritos
+
+
+def precomprimir(log, www_dir, max_workers=None):
+    """
+    Genera versiones .gz (y .br si está instalado `brotli`) de los archivos comprimibles
+    de www, para que el servidor las entregue sin comprimir en cada petición.
+    """
+    rutas, hermanos = [], []
+    for raiz, _, nombres in os.walk(www_dir):
+        for nombre in nombres:
+            ruta = os.path.join(raiz, nombre)
+            if nombre.endswith((".gz", ".br")):
+                hermanos.append(ruta)
+            elif os.path.splitext(nombre)[1].lower() in COMPRIMIBLES and os.path.getsize(ruta) <= MAX_PRECOMPRIMIR:
+                rutas.append(ruta)
+    # Versiones comprimidas que ya no corresponden (p. ej. .glb.gz de builds anteriores)
+    vigentes = set(rutas)
+    for hermano in hermanos:
+        base = hermano[:-3]
+        if base not in vigentes and os.path.isfile(base):
+            os.remove(hermano)
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, os.cpu_count() or 2)) as pool:
+        escritos = sum(pool.map(_comprimir, rutas))
+    formatos = "gzip + brotli" if brotli else "gzip (instale 'brotli' para .br)"
+    log(f"✓ Precompresión ({formatos}): {escritos} archivos escritos de {len(rutas)} comprimibles")
+    return escritos
+
+
+@lru_cache(maxsize=4096)
+def _etag(ruta, mtime_ns, tamano):
+    # mtime y tamaño forman parte de la clave: si el archivo cambia se recalcula
+    return hash_conocido(ruta)[:32]
+
+
+def es_inmutable(path):
+    """True si la ruta lleva hash de contenido y puede cachearse para siempre."""
+    return bool(PATRON_HASH.search(path))
+
+
+def _rango(cabecera, tamano):
+    """
+    Interpreta una cabecera Range de un solo intervalo. Devuelve (inicio, fin) inclusivos,
+    None si no aplica (ausente o multi-rango: se responde el archivo completo) o
+    False si el rango no es satisfacible.
+    """
+    m = PATRON_RANGO.match(cabecera or "")
+    if not m:
+        return None
+    inicio, fin = m.groups()
+    if inicio == "":
+        if fin == "" or int(fin) == 0:
+            return False
+        return max(0, tamano - int(fin)), tamano - 1
+    inicio = int(inicio)
+    fin = tamano - 1 if fin == "" else min(int(fin), tamano - 1)
+    if inicio >= tamano or fin < inicio:
+        return False
+    return inicio, fin
+
+
+def codificaciones_aceptadas(cabecera):
+    """
+    {codificación: q} de una cabecera Accept-Encoding. q=0 significa "no aceptada";
+    "*" cubre las que no aparecen explícitamente.
+    """
+    aceptadas = {}
+    for parte in (cabecera or "").split(","):
+        nombre, _, parametros = parte.partition(";")
+        nombre = nombre.strip().lower()
+        if not nombre:
+            continue
+        q = 1.0
+        for parametro in parametros.split(";"):
+            clave, _, valor = parametro.partition("=")
+            if clave.strip().lower() == "q":
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        aceptadas[nombre] = q
+    return aceptadas
+
+
+def _elegir_codificacion(cabecera, disponibles):
+    """La codificación de `disponibles` (en orden de preferencia del servidor) con mayor q > 0, o None."""
+    aceptadas = codificaciones_aceptadas(cabecera)
+    mejor, mejor_q = None, 0.0
+    for enc in disponibles:
+        q = aceptadas.get(enc, aceptadas.get("*", 0.0))
+        if q > mejor_q:
+            mejor, mejor_q = enc, q
+    return mejor
+
+
+def enviar_estatico(root, path):
+    """
+    Sirve un archivo de `root` con negociación de Accept-Encoding (usa los .br/.gz
+    precomprimidos), ETag fuerte por contenido, Cache-Control inmutable para archivos
+    con hash, respuestas 304 para peticiones condicionales y 206 para Range.
+
+    El cuerpo se entrega como archivo abierto vía `wsgi.file_wrapper`: los servidores
+    que lo implementan con sendfile (gunicorn, waitress) envían los bytes sin pasar
+    por Python; el rango se expresa con la posición inicial del archivo y Content-Length.
+    """
+    from flask import request, abort
+    from werkzeug.security import safe_join
+    from werkzeug.wrappers import Response
+    from werkzeug.wsgi import wrap_file
+    from werkzeug.http import http_date
+
+    ruta = safe_join(str(root), path)
+    if ruta is None or not os.path.isfile(ruta):
+        abort(404)
+    st = os.stat(ruta)
+    etag = _etag(ruta, st.st_mtime_ns, st.st_size)
+
+    servir = ruta
+    extensiones = {"br": ".br", "gzip": ".gz"}
+    disponibles = [enc for enc, ext in extensiones.items()
+                   if os.path.isfile(ruta + ext) and os.path.getmtime(ruta + ext) >= st.st_mtime]
+    encoding = _elegir_codificacion(request.headers.get("Accept-Encoding"), disponibles)
+    if encoding:
+        servir = ruta + extensiones[encoding]
+        etag = f"{etag}-{encoding}"
+
+    cabeceras = {
+        "ETag": f'"{etag}"',
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+        "Cache-Control": CACHE_INMUTABLE if es_inmutable(path) else CACHE_REVALIDAR,
+        "Last-Modified": http_date(st.st_mtime),
+    }
+    if encoding:
+        cabeceras["Content-Encoding"] = encoding
+
+    if etag in [e.strip().strip('"') for e in request.headers.get("If-None-Match", "").split(",")]:
+        return Response(status=304, headers=cabeceras)
+
+    tamano = os.path.getsize(servir)
+    inicio, fin, estado = 0, tamano - 1, 200
+    if_range = request.headers.get("If-Range")
+    if request.method == "GET" and (if_range is None or if_range.strip('"') == etag):
+        rango = _rango(request.headers.get("Range"), tamano)
+        if rango is False:
+            cabeceras["Content-Range"] = f"bytes */{tamano}"
+            return Response(status=416, headers=cabeceras)
+        if rango:
+            inicio, fin = rango
+            estado = 206
+            cabeceras["Content-Range"] = f"bytes {inicio}-{fin}/{tamano}"
+
+    cabeceras["Content-Length"] = str(fin - inicio + 1)
+    mimetype = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+    if request.method == "HEAD":
+        return Response(status=estado, headers=cabeceras, mimetype=mimetype)
+    f = open(servir, "rb")
+    f.seek(inicio)
+    if estado == 200 or "wsgi.file_wrapper" in request.environ:
+        # El file_wrapper del servidor respeta la posición inicial y Content-Length
+        cuerpo = wrap_file(request.environ, f, BUFFER_ENVIO)
+    else:
+        cuerpo = _LectorRango(f, fin - inicio + 1)
+    return Response(cuerpo, status=estado, headers=cabeceras, mimetype=mimetype, direct_passthrough=True)
+
+
+class _LectorRango:
+    """Iterable que entrega `restantes` bytes desde la posición actual del archivo (servidor de desarrollo)."""
+
+    def __init__(self, f, restantes):
+        self.f = f
+        self.restantes = restantes
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.restantes <= 0:
+            raise StopIteration
+        bloque = self.f.read(min(BUFFER_ENVIO, self.restantes))
+        if not bloque:
+            raise StopIteration
+        self.restantes -= len(bloque)
+        return bloque
+
+    def close(self):
+        self.f.close()
@@ -0,0 +1,69 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class CacheTokens:
+    """
+    Vía rápida de activación en memoria:
+    - `validos`: conjunto con todos los tokens existentes, cargado al inicio y ampliado
+      en cada inserción. Un token que no está se rechaza sin leer la tabla; como otros
+      procesos (la GUI, otros workers) también insertan, ante un fallo se leen solo las
+      filas nuevas (id > último id visto), como mucho una vez cada `refresco` segundos.
+    - `activados`: LRU token -> device_id de las activaciones recientes, para responder
+      desde memoria las verificaciones repetidas del mismo dispositivo.
+    """
+
+    def __init__(self, max_activados=50000, refresco=2.0):
+        self.validos = set()
+        self.activados = OrderedDict()
+        self.max_activados = max_activados
+        self.refresco = refresco
+        self._ultimo_id = 0
+        self._ultima_lectura = 0.0
+        self._cargado = False
+        self._candado = threading.Lock()
+
+    def _leer_nuevos(self, conn):
+        filas = conn.execute("SELECT id, token FROM activaciones WHERE id > ?", (self._ultimo_id,)).fetchall()
+        for id_, token in filas:
+            self.validos.add(token)
+            if id_ > self._ultimo_id:
+                self._ultimo_id = id_
+        self._ultima_lectura = time.monotonic()
+        return len(filas)
+
+    def cargar(self, conn):
+        with self._candado:
+            if not self._cargado:
+                self._leer_nuevos(conn)
+                self._cargado = True
+
+    def podria_existir(self, token, conn):
+        """False solo si el token seguro no existe (consultando SQLite a lo sumo una vez por intervalo)."""
+        if not self._cargado:
+            self.cargar(conn)
+        if token in self.validos:
+            return True
+        with self._candado:
+            if time.monotonic() - self._ultima_lectura >= self.refresco:
+                self._leer_nuevos(conn)
+        return token in self.validos
+
+    def agregar(self, token):
+        self.validos.add(token)
+
+    def dispositivo(self, token):
+        """device_id que activó el token, si está en el LRU; None si no se sabe."""
+        with self._candado:
+            device_id = self.activados.get(token)
+            if device_id is not None:
+                self.activados.move_to_end(token)
+            return device_id
+
+    def recordar_activacion(self, token, device_id):
+        with self._candado:
+            self.activados[token] = device_id
+            self.activados.move_to_end(token)
+            if len(self.activados) > self.max_activados:
+                self.activados.popitem(last=False)
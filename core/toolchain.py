@@ -0,0 +1,123 @@
+import os
+import json
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+def primera_linea(stdout, stderr):
+    """`java -version` escribe en stderr; el resto de herramientas en stdout."""
+    texto = (stdout or "").strip() or (stderr or "").strip()
+    return texto.splitlines()[0] if texto else ""
+
+
+def sonda(nombre, comando, archivos=None, timeout=20, cwd=None):
+    """
+    Describe una herramienta a verificar. `archivos` son los binarios/scripts cuya ruta,
+    mtime y tamaño forman la clave de caché (por defecto, el ejecutable del comando).
+    """
+    return {"nombre": nombre, "comando": list(comando), "archivos": list(archivos or comando[:1]),
+            "timeout": timeout, "cwd": cwd}
+
+
+def _cli_npm(herramienta, node_dir):
+    """<herramienta>-cli.js de la instalación de npm que acompaña a node, o None."""
+    candidatos = [
+        os.path.join(node_dir, "node_modules", "npm", "bin", f"{herramienta}-cli.js"),  # Windows
+        os.path.join(os.path.dirname(node_dir), "lib", "node_modules", "npm", "bin", f"{herramienta}-cli.js"),  # POSIX
+    ]
+    return next((c for c in candidatos if os.path.exists(c)), None)
+
+
+def sonda_npm(herramienta, node_dir=None, timeout=20):
+    """
+    Sonda de npm o npx ejecutando node con su script -cli.js. La clave de caché es node
+    más el script, no el shim npm.cmd/npx.cmd (que no cambia al actualizar node o npm);
+    así todas las verificaciones del generador comparten la misma huella.
+    `node_dir` es la carpeta de node; por defecto la del node del PATH.
+    """
+    if node_dir is None:
+        node = shutil.which("node")
+        node_dir = os.path.dirname(os.path.realpath(node)) if node else None
+    if node_dir:
+        node = os.path.join(node_dir, "node.exe" if os.name == "nt" else "node")
+        cli = _cli_npm(herramienta, node_dir)
+        if cli:
+            return sonda(herramienta, [node, cli, "--version"], archivos=[node, cli], timeout=timeout, cwd=node_dir)
+        return sonda(herramienta, [herramienta, "--version"], archivos=[herramienta, node], timeout=timeout)
+    return sonda(herramienta, [herramienta, "--version"], timeout=timeout)
+
+
+def _resolver(archivo):
+    if os.path.isabs(archivo) or os.sep in archivo:
+        return archivo if os.path.exists(archivo) else None
+    return shutil.which(archivo)
+
+
+def _clave(rutas):
+    partes = []
+    for ruta in rutas:
+        st = os.stat(ruta)
+        partes.append(f"{os.path.normcase(os.path.abspath(ruta))}:{st.st_mtime_ns}:{st.st_size}")
+    return "|".join(partes)
+
+
+def _ejecutar(s, comando):
+    try:
+        proc = subprocess.run(comando, capture_output=True, text=True, encoding="utf-8", errors="replace",
+                              timeout=s["timeout"], cwd=s["cwd"])
+    except subprocess.TimeoutExpired:
+        return {"ok": False, "salida": f"sin respuesta en {s['timeout']} s"}
+    except OSError as e:
+        return {"ok": False, "salida": str(e)}
+    salida = primera_linea(proc.stdout, proc.stderr)
+    if proc.returncode != 0:
+        return {"ok": False, "salida": salida or f"código {proc.returncode}"}
+    return {"ok": True, "salida": salida}
+
+
+def sondear(sondas, cache_path, max_workers=None):
+    """
+    Ejecuta las sondas en paralelo. Las que tienen en caché un resultado correcto con la
+    misma clave (ruta + mtime + tamaño de sus archivos) no lanzan ningún proceso.
+    Devuelve {nombre: {"ok", "salida", "cache"}} en el orden de `sondas`.
+    """
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    resultados, pendientes = {}, []
+    for s in sondas:
+        rutas = [_resolver(a) for a in s["archivos"]]
+        if None in rutas:
+            faltante = s["archivos"][rutas.index(None)]
+            resultados[s["nombre"]] = {"ok": False, "salida": f"no encontrado: {faltante}", "cache": False}
+            continue
+        clave = _clave(rutas)
+        previo = cache.get(s["nombre"])
+        if previo and previo.get("clave") == clave:
+            resultados[s["nombre"]] = {"ok": True, "salida": previo["salida"], "cache": True}
+            continue
+        # El ejecutable resuelto evita depender de shell=True para encontrarlo en el PATH
+        comando = [rutas[0]] + s["comando"][1:] if s["archivos"][0] == s["comando"][0] else s["comando"]
+        pendientes.append((s, clave, comando))
+
+    if pendientes:
+        with ThreadPoolExecutor(max_workers=max_workers or len(pendientes)) as pool:
+            for (s, clave, _), r in zip(pendientes, pool.map(lambda p: _ejecutar(p[0], p[2]), pendientes)):
+                resultados[s["nombre"]] = {**r, "cache": False}
+                if r["ok"]:
+                    cache[s["nombre"]] = {"clave": clave, "salida": r["salida"]}
+                else:
+                    cache.pop(s["nombre"], None)
+        try:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(cache, f, indent=1)
+            os.replace(cache_path + ".tmp", cache_path)
+        except OSError:
+            pass  # sin caché el próximo arranque vuelve a sondear, no es un error
+
+    return {s["nombre"]: resultados[s["nombre"]] for s in sondas}
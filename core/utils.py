@@ -1,3 +1,4 @@
+import os
 import unicodedata
 import re
 
@@ -11,3 +12,25 @@ def limpiar_nombre(nombre: str) -> str:
     s = re.sub(r'[^a-zA-Z0-9_]', '', s)
     # Retorna en minúsculas y limitado en longitud
     return s.lower()[:50]
+
+def escribir_si_cambia(ruta: str, datos) -> bool:
+    """
+    Escribe `datos` (bytes o str UTF-8) en `ruta` solo si el contenido actual es distinto,
+    de forma atómica. Devuelve True si escribió. Un archivo sin cambios conserva su mtime,
+    así las tareas incrementales (Gradle, cap sync) lo siguen viendo al día.
+    """
+    if isinstance(datos, str):
+        datos = datos.encode("utf-8")
+    try:
+        if os.path.getsize(ruta) == len(datos):
+            with open(ruta, "rb") as f:
+                if f.read() == datos:
+                    return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+    return True
@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import subprocess
+import urllib.request
+
+THREE_VERSION = "0.128.0"
+ARJS_VERSION = "3.4.7"
+MESHOPT_VERSION = "0.18.1"
+# Versión fija de terser: otra versión minifica distinto y cambiaría el hash de los archivos
+TERSER_VERSION = "5.31.0"
+
+# Nombres que genera vendorizar_runtime (con sus .gz/.br): lo que no esté vigente se poda
+PATRON_VENDORIZADO = re.compile(r"^(?:[\w.-]+\.min\.[0-9a-f]{10}\.js(?:\.gz|\.br)?|basis-[0-9a-f]{10})$")
+# Minificados en la caché: min-<terser>-<nombre lógico>-<hash del original>.js
+# (los de formato anterior no llevan nombre y se podan como obsoletos)
+PATRON_MINIFICADO = re.compile(r"^min-(?P<terser>[\w.]+?)-(?:(?P<nombre>\w+)-)?[0-9a-f]{10}\.js$")
+
+# Runtime del visor AR: nombre lógico -> (paquete npm, versión, ruta dentro del paquete, URL CDN).
+# El orden es el orden de carga en el HTML.
+RUNTIME = {
+    "three": ("three", THREE_VERSION, "build/three.min.js",
+              f"https://cdn.jsdelivr.net/npm/three@{THREE_VERSION}/build/three.min.js"),
+    "gltf_loader": ("three", THREE_VERSION, "examples/js/loaders/GLTFLoader.js",
+                    f"https://cdn.jsdelivr.net/npm/three@{THREE_VERSION}/examples/js/loaders/GLTFLoader.js"),
+    "ktx2_loader": ("three", THREE_VERSION, "examples/js/loaders/KTX2Loader.js",
+                    f"https://cdn.jsdelivr.net/npm/three@{THREE_VERSION}/examples/js/loaders/KTX2Loader.js"),
+    "meshopt_decoder": ("meshoptimizer", MESHOPT_VERSION, "meshopt_decoder.js",
+                        f"https://cdn.jsdelivr.net/npm/meshoptimizer@{MESHOPT_VERSION}/meshopt_decoder.js"),
+    "ar_threex": ("@ar-js-org/ar.js", ARJS_VERSION, "three.js/build/ar-threex.js",
+                  f"https://cdn.jsdelivr.net/gh/AR-js-org/AR.js@{ARJS_VERSION}/three.js/build/ar-threex.js"),
+    "ar_nft": ("@ar-js-org/ar.js", ARJS_VERSION, "three.js/build/ar-nft.js",
+               f"https://cdn.jsdelivr.net/gh/AR-js-org/AR.js@{ARJS_VERSION}/three.js/build/ar-nft.js"),
+}
+
+# ar-threex.js no trae el rastreador de imágenes: si alguna página usa marcadores 'nft'
+# se carga en su lugar ar-nft.js (que también detecta patrones y códigos de barras).
+# Nunca se cargan los dos: cada uno define su propio THREEx.
+AR_BUILDS = {False: "ar_threex", True: "ar_nft"}
+
+
+def runtime_para(nft=False):
+    """Nombres lógicos del runtime a cargar, en orden, según si el libro usa NFT."""
+    return [n for n in RUNTIME if n not in AR_BUILDS.values() or n == AR_BUILDS[nft]]
+
+
+def usa_nft(ar_content):
+    return any(c.get("type") == "nft" for c in ar_content or [])
+
+# Transcodificador Basis para KTX2Loader: se sirve como carpeta con nombres fijos.
+BASIS_ARCHIVOS = ("basis_transcoder.js", "basis_transcoder.wasm")
+BASIS_CDN = f"https://cdn.jsdelivr.net/npm/three@{THREE_VERSION}/examples/js/libs/basis/"
+
+
+def urls_cdn():
+    """Mapa de URLs remotas, usado cuando no hay copia local del runtime."""
+    urls = {nombre: r[3] for nombre, r in RUNTIME.items()}
+    urls["basis"] = BASIS_CDN
+    return urls
+
+
+def _hash_bytes(*contenidos):
+    h = hashlib.sha256()
+    for c in contenidos:
+        h.update(c)
+    return h.hexdigest()[:10]
+
+
+def _version_local(node_modules, paquete):
+    pkg_json = os.path.join(node_modules, *paquete.split("/"), "package.json")
+    try:
+        with open(pkg_json, "r", encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def _nombre_cacheado(paquete, version, ruta):
+    return f"{paquete.replace('/', '_')}-{version}-{ruta.replace('/', '_')}"
+
+
+def _obtener(log, node_modules, cache_dir, paquete, version, ruta, url):
+    """Devuelve el contenido del archivo: node_modules si la versión coincide, si no caché/CDN."""
+    if node_modules and _version_local(node_modules, paquete) == version:
+        local = os.path.join(node_modules, *paquete.split("/"), *ruta.split("/"))
+        if os.path.exists(local):
+            with open(local, "rb") as f:
+                return f.read()
+    cacheado = os.path.join(cache_dir, _nombre_cacheado(paquete, version, ruta))
+    if os.path.exists(cacheado):
+        with open(cacheado, "rb") as f:
+            return f.read()
+    log(f"Descargando {url} (una sola vez)...")
+    with urllib.request.urlopen(url, timeout=30) as resp:
+        contenido = resp.read()
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cacheado + ".tmp", "wb") as f:
+        f.write(contenido)
+    os.replace(cacheado + ".tmp", cacheado)
+    return contenido
+
+
+def _clave_minificado(nombre, contenido):
+    return f"min-{TERSER_VERSION}-{nombre}-{_hash_bytes(contenido)}.js"
+
+
+def _minificar(log, contenido, cache_dir, nombre):
+    """Minifica con terser (vía npx) y cachea el resultado por hash; si no hay terser, devuelve el original."""
+    clave = os.path.join(cache_dir, _clave_minificado(nombre, contenido))
+    if os.path.exists(clave):
+        with open(clave, "rb") as f:
+            return f.read()
+    if shutil.which("npx") is None:
+        return contenido
+    origen = clave + ".src.js"
+    with open(origen, "wb") as f:
+        f.write(contenido)
+    try:
+        proc = subprocess.run(["npx", "--yes", f"terser@{TERSER_VERSION}", origen, "-c", "-m", "-o", clave],
+                              capture_output=True, text=True, timeout=300, shell=(os.name == "nt"))
+        if proc.returncode == 0 and os.path.exists(clave):
+            with open(clave, "rb") as f:
+                return f.read()
+        log(f"⚠ terser no pudo minificar; se usa la versión original. {(proc.stderr or '')[-200:]}")
+    except Exception as e:
+        log(f"⚠ terser no disponible ({e}); se usa la versión original.")
+    finally:
+        if os.path.exists(origen):
+            os.remove(origen)
+    return contenido
+
+
+def podar_vendor(log, vendor_dir, urls):
+    """
+    Borra de `vendor_dir` los archivos con hash de builds anteriores que ya no usa
+    ningún recurso de `urls`; sin esto cada versión nueva se suma a la anterior en el APK.
+    """
+    vigentes = {u[len("vendor/"):].rstrip("/") for u in urls.values() if u.startswith("vendor/")}
+    borrados = 0
+    try:
+        entradas = list(os.scandir(vendor_dir))
+    except OSError:
+        return 0
+    for entrada in entradas:
+        base = entrada.name[:-3] if entrada.name.endswith((".gz", ".br")) else entrada.name
+        if base in vigentes or not PATRON_VENDORIZADO.match(entrada.name):
+            continue
+        if entrada.is_dir(follow_symlinks=False):
+            shutil.rmtree(entrada.path, ignore_errors=True)
+        else:
+            os.remove(entrada.path)
+        borrados += 1
+    if borrados:
+        log(f"✓ {borrados} archivos de runtime antiguos eliminados de {vendor_dir}")
+    return borrados
+
+
+def podar_cache_vendor(log, cache_dir, minificados):
+    """
+    Borra de la caché del runtime (persistente entre builds, a diferencia de www/vendor)
+    lo que ya no puede volver a usarse: descargas de versiones que no son las fijadas
+    y minificados de otra versión de terser, de formato anterior o de un original
+    distinto al actual. `minificados` es {nombre lógico: archivo} de este build; los
+    minificados de nombres que no se usaron (p. ej. el build de AR.js del otro tipo de
+    marcadores) se conservan.
+    """
+    vigentes = {(paquete, ruta): _nombre_cacheado(paquete, version, ruta)
+                for paquete, version, ruta, _ in RUNTIME.values()}
+    vigentes.update({("three", f"examples/js/libs/basis/{a}"): _nombre_cacheado(
+        "three", THREE_VERSION, f"examples/js/libs/basis/{a}") for a in BASIS_ARCHIVOS})
+    borrados = liberado = 0
+    try:
+        entradas = [e for e in os.scandir(cache_dir) if e.is_file(follow_symlinks=False)]
+    except OSError:
+        return 0
+    for entrada in entradas:
+        nombre = entrada.name
+        minificado = PATRON_MINIFICADO.match(nombre)
+        if minificado:
+            obsoleto = (minificado["terser"] != TERSER_VERSION or minificado["nombre"] is None
+                        or (minificado["nombre"] in minificados and nombre != minificados[minificado["nombre"]]))
+        else:
+            obsoleto = any(nombre != actual and nombre.startswith(paquete.replace("/", "_") + "-")
+                           and nombre.endswith("-" + ruta.replace("/", "_"))
+                           for (paquete, ruta), actual in vigentes.items())
+        if obsoleto:
+            try:
+                liberado += entrada.stat().st_size
+                os.remove(entrada.path)
+                borrados += 1
+            except OSError:
+                pass
+    if borrados:
+        log(f"✓ {borrados} archivos obsoletos eliminados de la caché del runtime ({liberado / 1048576:.1f} MB)")
+    return borrados
+
+
+def vendorizar_runtime(log, node_modules, www_dir, cache_dir, minificar=True, nft=False):
+    """
+    Copia el runtime AR (three.js, loaders, decodificadores y AR.js) a www/vendor con el
+    hash del contenido en el nombre, para servirlo sin CDN y con caché inmutable.
+    Devuelve {nombre_logico: url_relativa}; los archivos que no se pudieron obtener
+    conservan su URL de CDN. Con `nft` se empaqueta el build de AR.js con NFT.
+    """
+    vendor_dir = os.path.join(www_dir, "vendor")
+    os.makedirs(vendor_dir, exist_ok=True)
+    urls = urls_cdn()
+    minificados = {}
+    for nombre in runtime_para(nft):
+        paquete, version, ruta, url = RUNTIME[nombre]
+        try:
+            contenido = _obtener(log, node_modules, cache_dir, paquete, version, ruta, url)
+            if minificar and not ruta.endswith(".min.js"):
+                minificados[nombre] = _clave_minificado(nombre, contenido)
+                contenido = _minificar(log, contenido, cache_dir, nombre)
+            base = os.path.splitext(os.path.basename(ruta))[0].replace(".min", "")
+            archivo = f"{base}.min.{_hash_bytes(contenido)}.js"
+            with open(os.path.join(vendor_dir, archivo), "wb") as f:
+                f.write(contenido)
+            urls[nombre] = f"vendor/{archivo}"
+        except Exception as e:
+            log(f"⚠ No se pudo vendorizar '{nombre}', se usará el CDN: {e}")
+
+    try:
+        partes = [_obtener(log, node_modules, cache_dir, "three", THREE_VERSION,
+                           f"examples/js/libs/basis/{a}", BASIS_CDN + a) for a in BASIS_ARCHIVOS]
+        basis_dir = f"basis-{_hash_bytes(*partes)}"
+        os.makedirs(os.path.join(vendor_dir, basis_dir), exist_ok=True)
+        for archivo, contenido in zip(BASIS_ARCHIVOS, partes):
+            with open(os.path.join(vendor_dir, basis_dir, archivo), "wb") as f:
+                f.write(contenido)
+        urls["basis"] = f"vendor/{basis_dir}/"
+    except Exception as e:
+        log(f"⚠ No se pudo vendorizar el transcodificador Basis, se usará el CDN: {e}")
+
+    podar_vendor(log, vendor_dir, {n: urls[n] for n in runtime_para(nft) + ["basis"]})
+    podar_cache_vendor(log, cache_dir, minificados)
+    necesarios = runtime_para(nft) + ["basis"]
+    locales = sum(1 for n in necesarios if urls[n].startswith("vendor/"))
+    log(f"✓ Runtime AR local en {vendor_dir} ({locales}/{len(necesarios)} recursos sin CDN)")
+    return urls
+
+
+def etiquetas_script(urls, sangria="", nft=False):
+    """Etiquetas <script> del runtime, en orden de carga, para insertar en el HTML del visor."""
+    return "\n".join(f'{sangria}<script src="{urls[nombre]}"></script>' for nombre in runtime_para(nft))
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import signal
+import threading
+import subprocess
+import urllib.request
+
+# Cada worker es un proceso (solo gunicorn, fuera de Windows); cada uno atiende `threads` peticiones a la vez.
+OPCIONES_POR_DEFECTO = {
+    "host": "0.0.0.0",
+    "port": 5001,
+    "workers": max(2, min(8, os.cpu_count() or 2)),
+    "threads": 8,
+    "keepalive": 5,    # segundos que se mantiene abierta una conexión inactiva
+    "apagado": 15,     # segundos para terminar las peticiones en curso al detener
+    # Métricas y escritura diferida viven en memoria de cada proceso: -1 (automático) las
+    # activa solo cuando se sirve con un único proceso; 1 las exige y 0 las desactiva.
+    "metricas": -1,    # instrumentación y /metrics
+    "diferido": -1,    # activaciones agrupadas en lotes
+}
+
+RAIZ_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def motor_disponible():
+    """'gunicorn' (POSIX), 'waitress' (Windows o sin gunicorn) o None si no hay ninguno instalado."""
+    if os.name != "nt":
+        try:
+            import gunicorn  # noqa: F401
+            return "gunicorn"
+        except ImportError:
+            pass
+    try:
+        import waitress  # noqa: F401
+        return "waitress"
+    except ImportError:
+        return None
+
+
+def _servir_gunicorn(app, op):
+    from gunicorn.app.base import BaseApplication
+    from .db import cerrar_escritores
+
+    class _Aplicacion(BaseApplication):
+        def load_config(self):
+            for clave, valor in {
+                "bind": f"{op['host']}:{op['port']}",
+                "workers": op["workers"],
+                "threads": op["threads"],
+                "worker_class": "gthread",
+                "keepalive": op["keepalive"],
+                "graceful_timeout": op["apagado"],
+                "timeout": 120,
+                "sendfile": True,
+                "accesslog": None,
+                "worker_exit": lambda servidor, worker: cerrar_escritores(),
+            }.items():
+                self.cfg.set(clave, valor)
+
+        def load(self):
+            return app
+
+    # gunicorn ya hace apagado ordenado con SIGTERM
+    _Aplicacion().run()
+
+
+def _servir_waitress(app, op):
+    from waitress import create_server
+    from .db import cerrar_escritores
+
+    # waitress no bifurca procesos: workers x threads se traduce en hilos de un único proceso
+    hilos = op["workers"] * op["threads"]
+    servidor = create_server(app, host=op["host"], port=op["port"], threads=hilos,
+                             channel_timeout=max(op["keepalive"], 1), connection_limit=max(100, hilos * 8),
+                             ident="libro3dar")
+
+    def _detener(*_):
+        # Cierra el socket de escucha; el bucle termina cuando se vacían las conexiones abiertas
+        print("Apagando servidor: se terminan las peticiones en curso...", flush=True)
+        servidor.close()
+
+    for nombre in ("SIGTERM", "SIGINT", "SIGBREAK"):
+        if hasattr(signal, nombre):
+            signal.signal(getattr(signal, nombre), _detener)
+    try:
+        servidor.run()
+    finally:
+        servidor.task_dispatcher.shutdown(timeout=op["apagado"])
+        cerrar_escritores()
+
+
+def servir(opciones=None):
+    """Ejecuta create_app en este proceso con el servidor de producción disponible."""
+    from .db import init_db
+    from .server import create_app
+
+    op = {**OPCIONES_POR_DEFECTO, **(opciones or {})}
+    init_db()
+    motor = motor_disponible()
+    varios_procesos = motor == "gunicorn" and op["workers"] > 1
+    # Con varios workers cada consulta a /metrics vería solo la parte de un proceso, y cada
+    # worker tendría sus propias activaciones pendientes sin ver las de los demás
+    if varios_procesos and (op["metricas"] > 0 or op["diferido"] > 0):
+        raise ValueError(f"--metricas 1 y --diferido 1 requieren un único proceso; "
+                         f"use --workers 1 o quítelas para servir con {op['workers']} workers")
+    metricas = not varios_procesos if op["metricas"] < 0 else bool(op["metricas"])
+    diferido = not varios_procesos if op["diferido"] < 0 else bool(op["diferido"])
+    if varios_procesos:
+        print(f"{op['workers']} workers: métricas y escritura diferida desactivadas "
+              f"(solo funcionan con un único proceso)", flush=True)
+    app = create_app(metricas=metricas, escritura_diferida=diferido, log=lambda m: print(m, flush=True))
+    print(f"Servidor de producción ({motor or 'werkzeug, instale waitress o gunicorn'}) en "
+          f"http://{op['host']}:{op['port']} con {op['workers']} workers x {op['threads']} hilos"
+          f"{' (métricas en /metrics)' if metricas else ''}", flush=True)
+    if motor == "gunicorn":
+        _servir_gunicorn(app, op)
+    elif motor == "waitress":
+        _servir_waitress(app, op)
+    else:
+        app.run(host=op["host"], port=op["port"], threaded=True, debug=False, use_reloader=False)
+
+
+def iniciar_proceso(log, opciones=None, espera=15):
+    """
+    Lanza el servidor en un proceso aparte (python -m core.wsgi_server) y espera a que
+    responda /health. El stdout del proceso se reenvía a `log`. Devuelve el Popen.
+    """
+    op = {**OPCIONES_POR_DEFECTO, **(opciones or {})}
+    comando = [sys.executable, "-u", "-m", "core.wsgi_server",
+               "--host", str(op["host"]), "--port", str(op["port"]),
+               "--workers", str(op["workers"]), "--threads", str(op["threads"]),
+               "--keepalive", str(op["keepalive"]), "--apagado", str(op["apagado"]),
+               "--metricas", str(op["metricas"]), "--diferido", str(op["diferido"])]
+    flags = subprocess.CREATE_NEW_PROCESS_GROUP if os.name == "nt" else 0
+    proc = subprocess.Popen(comando, cwd=RAIZ_REPO, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            text=True, encoding="utf-8", errors="replace", creationflags=flags)
+
+    def _reenviar():
+        for linea in proc.stdout:
+            log(f"[servidor] {linea.rstrip()}")
+
+    threading.Thread(target=_reenviar, daemon=True).start()
+
+    url = f"http://127.0.0.1:{op['port']}/health"
+    limite = time.time() + espera
+    while time.time() < limite:
+        if proc.poll() is not None:
+            raise RuntimeError(f"El servidor terminó al iniciar (código {proc.returncode})")
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.25)
+    detener_proceso(log, proc)
+    raise RuntimeError(f"El servidor no respondió en {url} tras {espera} s")
+
+
+def detener_proceso(log, proc, timeout=None):
+    """Pide un apagado ordenado y, si no termina a tiempo, mata el proceso."""
+    if proc is None or proc.poll() is not None:
+        return
+    timeout = timeout or OPCIONES_POR_DEFECTO["apagado"] + 5
+    proc.send_signal(signal.CTRL_BREAK_EVENT if os.name == "nt" else signal.SIGTERM)
+    try:
+        proc.wait(timeout=timeout)
+        log("✓ Servidor de producción detenido")
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        log("⚠ El servidor no terminó a tiempo y fue forzado a cerrar")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor de producción de vista previa y activación")
+    for clave, valor in OPCIONES_POR_DEFECTO.items():
+        parser.add_argument(f"--{clave}", type=type(valor), default=valor)
+    servir(vars(parser.parse_args()))
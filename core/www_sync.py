@@ -0,0 +1,111 @@
+import os
+import shutil
+
+from .io_utils import copiar
+
+# Assets binarios que nadie modifica en su lugar: se enlazan en vez de copiarse. Los
+# archivos de texto (html, js, json...) se copian siempre: son pequeños y varios pasos
+# del build los reescriben en www, lo que con un enlace duro alteraría también el paquete.
+EXT_ENLAZABLES = (".glb", ".gltf", ".bin", ".fbx", ".jpg", ".jpeg", ".png", ".webp", ".ktx2",
+                  ".patt", ".fset", ".fset3", ".iset", ".mind", ".dat", ".mp4", ".webm", ".mp3", ".ogg")
+
+FICLONE = 0x40049409  # ioctl de Linux (btrfs, xfs) para clonar un archivo sin copiar datos
+
+
+def _reflink(origen, destino):
+    import fcntl
+    with open(origen, "rb") as src, open(destino, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+
+def enlazar_o_copiar(origen, destino):
+    """
+    Deja en `destino` el contenido de `origen` sin duplicar datos si se puede: enlace
+    duro, luego reflink y, si el sistema de archivos no admite ninguno, copia.
+    Reemplaza `destino` de forma atómica. Devuelve "enlace", "reflink" o "copia".
+    """
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    temporal = destino + ".sync"
+    if os.path.lexists(temporal):
+        os.remove(temporal)
+    try:
+        os.link(origen, temporal)
+        metodo = "enlace"
+    except OSError:
+        try:
+            _reflink(origen, temporal)
+            shutil.copystat(origen, temporal)
+            metodo = "reflink"
+        except (OSError, ImportError):
+            if os.path.lexists(temporal):
+                os.remove(temporal)
+            shutil.copy2(origen, temporal)
+            metodo = "copia"
+    os.replace(temporal, destino)
+    return metodo
+
+
+def _mismo_archivo(st_a, st_b):
+    return st_a.st_ino != 0 and st_a.st_ino == st_b.st_ino and st_a.st_dev == st_b.st_dev
+
+
+def _archivos(raiz, relativa=""):
+    with os.scandir(os.path.join(raiz, relativa)) as it:
+        for entrada in it:
+            ruta = os.path.join(relativa, entrada.name)
+            if entrada.is_dir(follow_symlinks=False):
+                yield from _archivos(raiz, ruta)
+            elif entrada.is_file():
+                yield ruta
+
+
+def sincronizar(log, origen, destino, enlazables=EXT_ENLAZABLES):
+    """
+    Hace que `destino` refleje `origen` (la fuente única de los assets del paquete):
+    los archivos sin cambios (mismo inodo, o mismo tamaño y mtime) no se tocan, los
+    assets de `enlazables` se enlazan, el resto se copia y lo que sobra en `destino`
+    se borra. Devuelve {"enlazados", "copiados", "sin_cambios", "borrados", "bytes_evitados"}.
+    """
+    r = {"enlazados": 0, "copiados": 0, "sin_cambios": 0, "borrados": 0, "bytes_evitados": 0}
+    presentes = set()
+    os.makedirs(destino, exist_ok=True)
+    for relativa in _archivos(origen):
+        presentes.add(os.path.normcase(relativa))
+        src, dst = os.path.join(origen, relativa), os.path.join(destino, relativa)
+        st_src = os.stat(src)
+        try:
+            st_dst = os.stat(dst)
+            if _mismo_archivo(st_src, st_dst) or (st_src.st_size == st_dst.st_size
+                                                  and st_src.st_mtime_ns == st_dst.st_mtime_ns):
+                r["sin_cambios"] += 1
+                r["bytes_evitados"] += st_src.st_size
+                continue
+        except FileNotFoundError:
+            pass
+        if relativa.lower().endswith(enlazables):
+            if enlazar_o_copiar(src, dst) == "copia":
+                r["copiados"] += 1
+            else:
+                r["enlazados"] += 1
+                r["bytes_evitados"] += st_src.st_size
+        elif copiar(src, dst)[1]:
+            r["copiados"] += 1
+        else:
+            r["sin_cambios"] += 1
+            r["bytes_evitados"] += st_src.st_size
+
+    for relativa in list(_archivos(destino)):
+        if os.path.normcase(relativa) not in presentes:
+            os.remove(os.path.join(destino, relativa))
+            r["borrados"] += 1
+    for carpeta, _, _ in os.walk(destino, topdown=False):
+        if carpeta != destino:
+            try:
+                os.rmdir(carpeta)  # solo tiene éxito si quedó vacía
+            except OSError:
+                pass
+
+    log(f"✓ www sincronizado: {r['enlazados']} enlazados, {r['copiados']} copiados, "
+        f"{r['sin_cambios']} sin cambios, {r['borrados']} borrados; "
+        f"{r['bytes_evitados'] / (1024 * 1024):.1f} MB sin escribir")
+    return r
@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import time # Importar el módulo time
+_T_INICIO = time.perf_counter() # Referencia para medir el arranque en frío
 import os
 import shutil
 import sys
@@ -6,32 +8,33 @@ import uuid
 import subprocess
 import re
 import json
-import sqlite3
 from datetime import datetime
 import threading
-import time # Importar el módulo time
-import requests # Importar requests
-from tkinter import Tk, Frame, Label, Entry, Button, Listbox, Scrollbar, Text, StringVar, filedialog, messagebox, END, LEFT, RIGHT, BOTH, Y, VERTICAL, NORMAL, DISABLED, Toplevel
-from PIL import Image, ImageOps, ImageDraw # Importar ImageOps y ImageDraw
+import queue
+from tkinter import Tk, Frame, Label, Entry, Button, Listbox, Scrollbar, Text, StringVar, OptionMenu, filedialog, messagebox, END, LEFT, RIGHT, BOTH, Y, VERTICAL, NORMAL, DISABLED, Toplevel
+from PIL import Image
 from string import Template # Importar Template para el manejo de plantillas HTML
-
-# --- Dependencias con autoinstalación ---
-try:
-    from flask import Flask, send_from_directory, jsonify
-    from flask_cors import CORS
-    from pyngrok import ngrok
-    import cv2
-    import numpy as np
-    import psutil # Para verificar el espacio en disco
-except ImportError:
-    print("Dependencias críticas no encontradas. Intentando instalar...")
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "Flask", "pyngrok", "opencv-python", "numpy", "Pillow", "psutil", "flask-cors"])
-    from flask import Flask, send_from_directory, jsonify
-    from flask_cors import CORS
-    from pyngrok import ngrok
-    import cv2
-    import numpy as np
-    import psutil
+from core.marker_engine import generar_marcadores, BACKENDS as MARKER_BACKENDS
+from core.glb_optimize import optimizar_modelos
+from core.lod import generar_lods
+from core.vendor import vendorizar_runtime, etiquetas_script, urls_cdn, usa_nft
+from core.offline import generar_precache, SCRIPT_REGISTRO as SW_REGISTRO
+from core.static_cache import precomprimir, enviar_estatico
+from core.db import init_db, insertar_tokens, listar_tokens, crear_particion
+from core.toolchain import sondear, sonda, sonda_npm
+from core.book_import import escanear_libro
+from core.disk_usage import IndiceDisco
+from core.android_res import generar_recursos_android
+from core.utils import escribir_si_cambia
+from core.package_archive import exportar as exportar_paquetes, importar as importar_paquetes
+from core.asset_store import AlmacenAssets
+from core.io_utils import copiar
+from core.www_sync import sincronizar as sincronizar_www, enlazar_o_copiar
+from core.cache_budget import gobernar_caches, grupos_por_defecto, PRESUPUESTO_GB, LIBRE_MINIMO_GB
+from core.wsgi_server import iniciar_proceso, detener_proceso, OPCIONES_POR_DEFECTO as OPCIONES_SERVIDOR
+
+# Flask, flask_cors, pyngrok, requests y cv2/numpy (vía core.markers) se importan al usarse:
+# la ventana no espera a cargarlos y la falta de uno solo afecta a la función que lo necesita.
 
 # ---------------- RUTAS BASE ----------------
 # Directorio base donde se encuentran todos los proyectos y salidas
@@ -60,6 +63,10 @@ LOGS_DIR = os.path.join(OUTPUT_APK_DIR, "logs")
 STRINGS_XML = os.path.join(ANDROID_DIR, "app", "src", "main", "res", "values", "strings.xml")
 # Base de datos para las claves de activación del backend
 BACKEND_DB = os.path.join(BASE_DIR, "backend", "activaciones.db")
+# Almacén global de assets por contenido (SHA-256) compartido por todos los libros
+ALMACEN_DIR = os.path.join(BASE_DIR, "assets_store")
+# Tiempo máximo aceptable desde el inicio del proceso hasta la ventana visible (ver --medir-arranque)
+OBJETIVO_ARRANQUE_MS = 1500
 # Script de PowerShell para la compilación del APK (se mantiene para referencia, aunque ahora se usa Gradle directo)
 PS_SCRIPT = os.path.join(GEN_DIR, "generador_apk.ps1")
 
@@ -218,6 +225,7 @@ def ensure_camera_para_dat(logbox, www_data_dir):
         "https://raw.githubusercontent.com/AR-js-org/AR.js/master/data/camera_para.dat" # URL de Respaldo
     ]
 
+    import requests
     for i, url in enumerate(urls):
         safe_log(logbox, f"Intentando descargar `camera_para.dat` desde: {url} (Intento {i+1}/{len(urls)})...")
         try:
@@ -237,11 +245,44 @@ def ensure_camera_para_dat(logbox, www_data_dir):
     messagebox.showerror("Error Crítico", "No se pudo obtener `camera_para.dat` desde la fuente local ni desde internet. La funcionalidad AR no funcionará. Verifica tu conexión y la disponibilidad del archivo.")
     return False
 
+# Tareas para el hilo de Tk enviadas desde hilos de fondo (Tk no es seguro entre hilos)
+COLA_GUI = queue.SimpleQueue()
+
+def en_hilo_gui(funcion, *args):
+    """Ejecuta `funcion` en el hilo principal: directo si ya estamos en él, si no vía COLA_GUI."""
+    if threading.current_thread() is threading.main_thread():
+        funcion(*args)
+    else:
+        COLA_GUI.put((funcion, args))
+
+_vaciando = False
+
+def vaciar_cola_gui():
+    """Ejecuta en orden lo encolado por los hilos de fondo; se llama solo desde el hilo de Tk."""
+    global _vaciando
+    if _vaciando:
+        return
+    _vaciando = True
+    try:
+        while True:
+            try:
+                funcion, args = COLA_GUI.get_nowait()
+            except queue.Empty:
+                return
+            funcion(*args)
+    finally:
+        _vaciando = False
+
 def safe_log(logbox, msg: str):
     """
     Escribe mensajes en el cuadro de log de la GUI con un timestamp,
     asegurando que el widget esté en un estado editable y visible.
+    Desde otros hilos el mensaje se encola y lo escribe el hilo principal.
     """
+    if threading.current_thread() is not threading.main_thread():
+        COLA_GUI.put((safe_log, (logbox, msg)))
+        return
+    vaciar_cola_gui() # Primero lo que llegó antes desde otros hilos, para conservar el orden
     if logbox and logbox.winfo_exists():
         timestamp = datetime.now().strftime("%H:%M:%S")
         logbox.config(state=NORMAL) # Habilitar edición
@@ -290,54 +331,29 @@ def verificar_entorno(logbox) -> bool:
     y la accesibilidad de la base de datos SQLite y la plantilla de Capacitor.
     """
     ok = True
-    try:
-        result = subprocess.run(["java", "-version"], capture_output=True, text=True, check=True, encoding="utf-8", shell=True)
-        safe_log(logbox, f"✓ Java detectado: {result.stderr.splitlines()[0]}")
-    except Exception as e:
-        safe_log(logbox, f"✗ ERROR: Java no está instalado o no accesible: {e}")
-        ok = False
+    # Java, npx y npm se sondean en paralelo; si sus binarios no cambiaron desde la última
+    # verificación correcta, el resultado sale de la caché sin lanzar procesos.
+    herramientas = sondear([
+        sonda("java", ["java", "-version"]),
+        sonda_npm("npx"),
+        sonda_npm("npm"),
+    ], os.path.join(GEN_DIR, "toolchain_cache.json"))
+    for nombre, r in herramientas.items():
+        origen = " (caché)" if r["cache"] else ""
+        if r["ok"]:
+            safe_log(logbox, f"✓ {nombre} detectado y ejecutable: {r['salida']}{origen}")
+        else:
+            safe_log(logbox, f"✗ ERROR: {nombre} no está instalado o no ejecuta correctamente: {r['salida']}")
+            ok = False
     if not os.path.exists(BLENDER_PATH):
         safe_log(logbox, f"✗ ERROR: Blender no encontrado en {BLENDER_PATH}")
         ok = False
     else:
         safe_log(logbox, "✓ Blender encontrado.")
-    
-    if not shutil.which("npx"):
-        safe_log(logbox, "✗ ERROR: 'npx' no encontrado en el PATH del sistema. (¿Node.js instalado?)")
-        ok = False
-    else:
-        try:
-            result = subprocess.run(["npx", "--version"], check=True, capture_output=True, text=True, shell=True)
-            safe_log(logbox, f"✓ npx detectado y ejecutable: {result.stdout.strip()}")
-        except Exception as e:
-            safe_log(logbox, f"✗ ERROR: npx no ejecuta correctamente: {e}")
-            ok = False
 
-    if not shutil.which("npm"):
-        safe_log(logbox, "✗ ERROR: 'npm' no encontrado en el PATH del sistema. (¿Node.js instalado?)")
-        ok = False
-    else:
-        try:
-            result = subprocess.run(["npm", "--version"], check=True, capture_output=True, text=True, shell=True)
-            safe_log(logbox, f"✓ npm detectado y ejecutable: {result.stdout.strip()}")
-        except Exception as e:
-            safe_log(logbox, f"✗ ERROR: npm no ejecuta correctamente: {e}")
-            ok = False
     try:
-        conn = sqlite3.connect(BACKEND_DB)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS activaciones (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                token TEXT NOT NULL UNIQUE,
-                device_id TEXT,
-                fecha_creacion TEXT NOT NULL,
-                usado INTEGER DEFAULT 0,
-                fecha_uso TEXT
-            )
-        """)
-        conn.commit()
-        conn.close()
+        # Crea la tabla si falta y aplica las migraciones de esquema pendientes (core/migrations.py)
+        init_db(lambda m: safe_log(logbox, m))
         safe_log(logbox, f"✓ Base de datos SQLite accesible y tabla 'activaciones' verificada en: {BACKEND_DB}")
     except Exception as e:
         safe_log(logbox, f"✗ ERROR: No se pudo conectar o verificar la base dea bd Sqlite: {e}")
@@ -351,26 +367,17 @@ def verificar_entorno(logbox) -> bool:
         safe_log(logbox, "✓ capacitor.config.json encontrado.")
     return ok
 
-def insertar_claves_en_backend(logbox, claves: list):
+def insertar_claves_en_backend(logbox, claves: list, libro: str = ""):
     """
-    Agrega las claves de activación generadas a la tabla 'activaciones'.
+    Agrega las claves de activación generadas a la tabla 'activaciones', etiquetadas
+    con el libro y en su partición si el libro tiene base propia.
     """
     safe_log(logbox, f"Iniciando inserción de {len(claves)} claves en la base de datos...")
     try:
-        conn = sqlite3.connect(BACKEND_DB)
-        cursor = conn.cursor()
-        fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        inserted_count = 0
-        for clave in claves:
-            # Inserta solo el token y la fecha. El device_id se asociará en el primer uso.
-            try:
-                cursor.execute("INSERT INTO activaciones (token, fecha_creacion) VALUES (?, ?)",
-                              (clave, fecha))
-                inserted_count += 1
-            except sqlite3.IntegrityError:
-                safe_log(logbox, f"  - La clave {clave} ya existe en la base de datos. Se omite.")
-        conn.commit()
-        conn.close()
+        # Inserta solo el token, el libro y la fecha. El device_id se asociará en el primer uso.
+        inserted_count = insertar_tokens(claves, libro)
+        if inserted_count < len(claves):
+            safe_log(logbox, f"  - {len(claves) - inserted_count} claves ya existían en la base de datos. Se omiten.")
         safe_log(logbox, f"✓ Inserción completada. {inserted_count} nuevas claves añadidas a la base de datos.")
     except Exception as e:
         safe_log(logbox, f"✗ ERROR CRÍTICO insertando claves en SQLite: {e}")
@@ -783,44 +790,6 @@ def ensure_capacitor_js(logbox, project_dir):
         safe_log(logbox, f"✗ ERROR: Fallo al copiar manually capacitor.js: {e}")
         messagebox.showerror("Error de Copia", f"No se pudo copiar capacitor.js: {e}")
 
-def verificar_nft_marker_creator(logbox):
-    if not os.path.exists(NFT_CREATOR_PATH):
-        safe_log(logbox, "ADVERTENCIA: Directorio de NFT-Marker-Creator no encontrado.")
-        return False
-    
-    # El script principal correcto, según la investigación, es app.js
-    main_script_path = os.path.join(NFT_CREATOR_PATH, "app.js")
-    
-    if not os.path.exists(main_script_path):
-        safe_log(logbox, f"ADVERTENCIA: No se encontró el script principal 'app.js' en {NFT_CREATOR_PATH}.")
-        return False
-
-    try:
-        result = subprocess.run(["node", "--version"], cwd=NFT_CREATOR_PATH, capture_output=True, text=True, shell=True, check=True)
-        safe_log(logbox, f"✓ NFT-Marker-Creator verificado con Node.js {result.stdout.strip()}")
-        return True
-    except Exception as e:
-        safe_log(logbox, f"✗ Error verificando NFT-Marker-Creator: {e}")
-        return False
-
-def generar_patt_opencv(logbox, imagen_path, patron_path):
-    try:
-        img = cv2.imread(imagen_path, cv2.IMREAD_GRAYSCALE)
-        if img is None: raise IOError(f"No se pudo cargar la imagen con OpenCV: {imagen_path}")
-        img_resized = cv2.resize(img, (16, 16), interpolation=cv2.INTER_AREA)
-        patt_content = ""
-        for _ in range(3):
-            for row in img_resized:
-                patt_content += " ".join(f"{val:3d}" for val in row) + "\n"
-            patt_content += "\n"
-        with open(patron_path, 'w', encoding='utf-8') as f:
-            f.write(patt_content.strip())
-        safe_log(logbox, f"✓ Patrón .patt generado con OpenCV para: {os.path.basename(imagen_path)}")
-        return True
-    except Exception as e:
-        safe_log(logbox, f"✗ Error generando .patt con OpenCV: {e}")
-        return False
-
 def diagnosticar_espacio_disco(logbox):
     '''
     Diagnostica en detalle el uso de espacio en disco
@@ -831,7 +800,7 @@ def diagnosticar_espacio_disco(logbox):
         # Verificar discos principales
         for letra in ['C:', 'F:']:
             try:
-                disk = psutil.disk_usage(letra)
+                disk = shutil.disk_usage(letra)
                 total_gb = disk.total / (1024**3)
                 used_gb = disk.used / (1024**3)
                 free_gb = disk.free / (1024**3)
@@ -860,32 +829,28 @@ def diagnosticar_espacio_disco(logbox):
         ]
         
         safe_log(logbox, "\n=== TAMAÑO DE DIRECTORIOS ===")
+        indice = IndiceDisco(os.path.join(GEN_DIR, "disk_index.json"))
         for dir_path, name in dirs_to_check:
             if os.path.exists(dir_path):
                 try:
-                    total_size = 0
-                    for dirpath, dirnames, filenames in os.walk(dir_path):
-                        for filename in filenames:
-                            filepath = os.path.join(dirpath, filename)
-                            if os.path.exists(filepath):
-                                total_size += os.path.getsize(filepath)
-                    
+                    inicio = time.perf_counter()
+                    total_size, archivos = indice.tamano(dir_path)
                     size_gb = total_size / (1024**3)
-                    safe_log(logbox, f"{name}: {size_gb:.2f} GB")
+                    safe_log(logbox, f"{name}: {size_gb:.2f} GB en {archivos} archivos ({(time.perf_counter() - inicio) * 1000:.0f} ms)")
                     
                 except Exception as e:
                     safe_log(logbox, f"{name}: Error calculando tamaño - {e}")
             else:
                 safe_log(logbox, f"{name}: No existe")
         
+        indice.guardar()
+
         safe_log(logbox, "=== RECOMENDACIONES ===")
         safe_log(logbox, "1. Libere espacio en disco eliminando archivos innecesarios")
         safe_log(logbox, "2. Considere mover el proyecto a un disco con más espacio")
-        safe_log(logbox, "3. Limpie el cache de Gradle manualmente")
+        safe_log(logbox, f"3. Las cachés se podan solas antes de cada build (presupuesto: {PRESUPUESTO_GB} GB)")
         safe_log(logbox, "4. Use 'Liberador de espacio en disco' de Windows")
         
-    except ImportError:
-        safe_log(logbox, "Para diagnóstico completo, instale: pip install psutil")
     except Exception as e:
         safe_log(logbox, f"Error en diagnóstico: {e}")
 
@@ -895,11 +860,11 @@ def verificar_espacio_disco(logbox):
     '''
     try:
         # Verificar disco C: (cache de Gradle)
-        disk_c = psutil.disk_usage('C:')
+        disk_c = shutil.disk_usage('C:')
         free_gb_c = disk_c.free / (1024**3)
         
         # Verificar disco F: (proyecto)
-        disk_f = psutil.disk_usage('F:')
+        disk_f = shutil.disk_usage('F:')
         free_gb_f = disk_f.free / (1024**3)
         
         safe_log(logbox, f"Espacio libre en C: {free_gb_c:.1f} GB")
@@ -917,9 +882,6 @@ def verificar_espacio_disco(logbox):
         safe_log(logbox, "✓ Espacio en disco suficiente para build")
         return True
         
-    except ImportError:
-        safe_log(logbox, "⚠ No se puede verificar espacio (instale psutil): pip install psutil")
-        return True
     except Exception as e:
         safe_log(logbox, f"⚠ Error verificando espacio en disco: {e}")
         return True
@@ -1014,12 +976,22 @@ def compilar_apk_usando_disco_f(logbox, nombre_paquete_limpio):
         safe_log(logbox, f"✓ Variables de entorno configuradas para disco F")
         safe_log(logbox, f"  GRADLE_USER_HOME: {os.environ['GRADLE_USER_HOME']}")
         
-        # 2. Verificar espacio una vez más
-        disk_f = psutil.disk_usage('F:')
+        # 2. Mantener las cachés dentro del presupuesto de disco antes de compilar
+        safe_log(logbox, "Revisando presupuesto de cachés...")
+        gobernar_caches(
+            lambda m: safe_log(logbox, m),
+            grupos_por_defecto(BASE_DIR, GEN_DIR, os.path.join(BASE_DIR, "node_cache"), PAQUETES_DIR, OUTPUT_APK_DIR,
+                               ALMACEN_DIR),
+            IndiceDisco(os.path.join(GEN_DIR, "disk_index.json")),
+            BASE_DIR,
+            protegidos=[nombre_paquete_limpio],
+            recolectar=AlmacenAssets(ALMACEN_DIR).recolectar,
+        )
+        disk_f = shutil.disk_usage(BASE_DIR)
         free_gb_f = disk_f.free / (1024**3)
         safe_log(logbox, f"Espacio disponible en F: {free_gb_f:.1f} GB")
         
-        if free_gb_f < 8:
+        if free_gb_f < LIBRE_MINIMO_GB:
             safe_log(logbox, f"⚠ ADVERTENCIA: Poco espacio en F: {free_gb_f:.1f} GB")
         
         # 3. Limpiar build anterior
@@ -1156,8 +1128,9 @@ android.suppressUnsupportedCompileSdk=34
                         os.makedirs(apk_dst_dir, exist_ok=True)
                         apk_dst_file = os.path.join(apk_dst_dir, f"{nombre_paquete_limpio}.apk")
 
-                        shutil.copy2(apk_origen, apk_dst_file)
+                        apk_sha, _ = copiar(apk_origen, apk_dst_file)
                         safe_log(logbox, f"✓ APK copiado exitosamente a: {apk_dst_file}")
+                        safe_log(logbox, f"  SHA-256: {apk_sha}")
 
                         # Verificar tamaño del APK
                         apk_size_mb = os.path.getsize(apk_dst_file) / (1024 * 1024)
@@ -1319,37 +1292,6 @@ public class MainActivity extends BridgeActivity {{
         safe_log(logbox, f"✗ ERROR al generar/actualizar MainActivity.java: {e}")
         raise
 
-def elimina_foreground_icons(logbox):
-    """
-    Elimina los archivos de íconos 'foreground' antiguos de las carpetas mipmap.
-    Estos son parte de los íconos adaptativos que reemplazaremos.
-    """
-    # Asegurarse de que ICONO_BASE_DIR apunte al proyecto de trabajo
-    carpetas = ["mipmap-mdpi", "mipmap-hdpi", "mipmap-xhdpi", "mipmap-xxhdpi", "mipmap-xxxhdpi"]
-    for carpeta in carpetas:
-        path = os.path.join(ICONO_BASE_DIR, carpeta, "ic_launcher_foreground.png")
-        if os.path.exists(path):
-            try:
-                os.remove(path)
-                safe_log(logbox, f"  - Eliminado: {os.path.basename(path)}")
-            except Exception as e:
-                safe_log(logbox, f"  - Error eliminando foreground icon {path}: {e}")
-
-def elimina_xml_adaptativos(logbox):
-    """
-    Elimina los archivos XML de íconos adaptativos antiguos (ic_launcher.xml, ic_launcher_round.xml).
-    """
-    # Asegurarse de que ICONO_BASE_DIR apunte al proyecto de trabajo
-    v26_dir = os.path.join(ICONO_BASE_DIR, "mipmap-anydpi-v26")
-    for archivo_xml in ["ic_launcher.xml", "ic_launcher_round.xml"]:
-        path = os.path.join(v26_dir, archivo_xml)
-        if os.path.exists(path):
-            try:
-                os.remove(path)
-                safe_log(logbox, f"  - Eliminado: {os.path.basename(path)}")
-            except Exception as e:
-                safe_log(logbox, f"  - Error eliminando xml adaptativo {path}: {e}")
-
 def preparar_proyecto_capacitor(logbox):
     """
     Prepara el proyecto Capacitor en el directorio de trabajo, preservando
@@ -1488,9 +1430,8 @@ def crear_styles_xml(logbox):
 </resources>"""
     
     styles_path = os.path.join(values_dir, "styles.xml")
-    with open(styles_path, "w", encoding="utf-8") as f:
-        f.write(styles_content)
-    safe_log(logbox, f"✓ styles.xml creado en: {styles_path}")
+    if escribir_si_cambia(styles_path, styles_content):
+        safe_log(logbox, f"✓ styles.xml creado en: {styles_path}")
 
 def crear_colors_xml(logbox):
     """Crea el archivo colors.xml con colores básicos"""
@@ -1506,29 +1447,8 @@ def crear_colors_xml(logbox):
 </resources>"""
     
     colors_path = os.path.join(values_dir, "colors.xml")
-    with open(colors_path, "w", encoding="utf-8") as f:
-        f.write(colors_content)
-    safe_log(logbox, f"✓ colors.xml creado en: {colors_path}")
-
-def crear_splash_background(logbox):
-    """Crea el drawable para el fondo del SplashScreen"""
-    drawable_dir = os.path.join(ANDROID_DIR, "app", "src", "main", "res", "drawable")
-    os.makedirs(drawable_dir, exist_ok=True)
-    
-    splash_content = """<?xml version="1.0" encoding="utf-8"?>
-<layer-list xmlns:android="http://schemas.android.com/apk/res/android">
-    <item android:drawable="@color/splash_background" />
-    <item>
-        <bitmap
-            android:gravity="center"
-            android:src="@mipmap/ic_launcher" />
-    </item>
-</layer-list>"""
-    
-    splash_path = os.path.join(drawable_dir, "splash_background.xml")
-    with open(splash_path, "w", encoding="utf-8") as f:
-        f.write(splash_content)
-    safe_log(logbox, f"✓ splash_background.xml creado en: {splash_path}")
+    if escribir_si_cambia(colors_path, colors_content):
+        safe_log(logbox, f"✓ colors.xml creado en: {colors_path}")
 
 def instalar_o_actualizar_arjs_si_necesario(logbox):
     """
@@ -1544,11 +1464,40 @@ def instalar_o_actualizar_arjs_si_necesario(logbox):
         return instalar_arjs_y_limpiar(logbox)
 
 
+def huella_plantilla_android():
+    """
+    Versiones instaladas de @capacitor/android y @capacitor/cli: es lo que determina el
+    proyecto que genera 'npx cap add android'. None si no se pueden leer.
+    """
+    versiones = []
+    for paquete in ("android", "cli"):
+        pkg_json = os.path.join(PROJECT_DIR, "node_modules", "@capacitor", paquete, "package.json")
+        try:
+            with open(pkg_json, "r", encoding="utf-8") as f:
+                versiones.append(f"{paquete}@{json.load(f)['version']}")
+        except (OSError, ValueError, KeyError):
+            return None
+    return " ".join(versiones)
+
+
 def limpiar_y_regenerar_android(logbox):
     """
-    Elimina por completo el directorio 'android' y lo regenera con 'npx cap add android'.
-    Esta es una medida drástica para asegurar que no queden configuraciones cacheadas.
+    Deja listo el directorio 'android'. Si ya existe y se generó con la misma versión de
+    Capacitor, se conserva (res/ con sus íconos ya escritos) y solo se quita el
+    código Java, que cada build vuelve a escribir para su packageName. Si la versión
+    cambió o no se puede determinar, se elimina por completo y se regenera con
+    'npx cap add android'.
     """
+    huella = huella_plantilla_android()
+    marca = os.path.join(ANDROID_DIR, ".plantilla_capacitor")
+    if huella and os.path.isdir(ANDROID_DIR) and os.path.exists(marca):
+        with open(marca, "r", encoding="utf-8") as f:
+            if f.read().strip() == huella:
+                # MainActivity de otros libros (otro packageName) no debe quedar en el build
+                shutil.rmtree(os.path.join(ANDROID_DIR, "app", "src", "main", "java"), ignore_errors=True)
+                safe_log(logbox, f"✓ Proyecto Android conservado (plantilla sin cambios: {huella}).")
+                return True
+
     safe_log(logbox, "--- INICIANDO LIMPIEZA Y REGENERACIÓN AGRESIVA DEL PROYECTO ANDROID ---")
     if os.path.exists(ANDROID_DIR):
         safe_log(logbox, f"Eliminando el directorio Android existente en: {ANDROID_DIR}")
@@ -1578,6 +1527,9 @@ def limpiar_y_regenerar_android(logbox):
         )
         safe_log(logbox, "✓ Proyecto Android regenerado exitosamente.")
         safe_log(logbox, f"Salida de Capacitor:\n{result.stdout}")
+        if huella:
+            with open(marca, "w", encoding="utf-8") as f:
+                f.write(huella)
         return True
     except subprocess.CalledProcessError as e:
         safe_log(logbox, f"✗ ERROR CRÍTICO: 'npx cap add android' falló.")
@@ -1609,14 +1561,50 @@ class GeneradorGUI:
         self.propaganda_var = StringVar(value="https://www.youtube.com/shorts/6P7IkbiVGP8")
         self.explicacion_var = StringVar()
         self.cant_claves_var = StringVar(value="100")
+        # Tipo de marcador por defecto para las páginas nuevas: 'pattern', 'nft' o 'barcode'
+        self.tipo_marcador_var = StringVar(value="pattern")
+        self.presupuesto_modelos_var = StringVar(value="80") # MB permitidos para los modelos del libro
+        # 'desarrollo' = Flask en un hilo de la GUI; 'producción' = create_app en un proceso multi-worker
+        self.modo_servidor_var = StringVar(value="desarrollo")
+        self.workers_var = StringVar(value=str(OPCIONES_SERVIDOR["workers"]))
+        self.threads_var = StringVar(value=str(OPCIONES_SERVIDOR["threads"]))
+        self.servidor_proc = None # Proceso del servidor de producción, si está corriendo
         self.pares = [] # Lista para almacenar pares de imagen-modelo
+        self.indice_pares = {} # base limpia -> fila de su primer par en self.pares, para emparejar en O(1)
         self.claves = [] # Lista para almacenar las claves generadas
         self._portada_path_full = None # Ruta completa de la portada seleccionada
         self.ps_script_path = PS_SCRIPT # Almacenar PS_SCRIPT como atributo de instancia
         self._init_layout() # Inicializar la interfaz de usuario
+        self.root.protocol("WM_DELETE_WINDOW", self.al_cerrar)
         validar_y_crear_carpetas(self.logbox) # Crea carpetas base que no dependen de la estructura de Capacitor
-        # Verificar el entorno al inicio
-        if not verificar_entorno(self.logbox):
+        self._vaciar_cola_gui()
+        self.root.after_idle(self._arranque_listo)
+        # Verificar el entorno en segundo plano: los resultados aparecen en el log a medida que llegan
+        self.set_progress("Verificando entorno...")
+        threading.Thread(target=self._verificar_entorno_fondo, daemon=True).start()
+
+    def _vaciar_cola_gui(self):
+        """Bombea cada 50 ms lo encolado por los hilos de fondo (logs, avisos)."""
+        vaciar_cola_gui()
+        self.root.after(50, self._vaciar_cola_gui)
+
+    def _arranque_listo(self):
+        ms = (time.perf_counter() - _T_INICIO) * 1000
+        marca = "✓" if ms <= OBJETIVO_ARRANQUE_MS else "⚠"
+        safe_log(self.logbox, f"{marca} Ventana lista en {ms:.0f} ms (objetivo {OBJETIVO_ARRANQUE_MS} ms)")
+        if "--medir-arranque" in sys.argv:
+            print(f"arranque_ms={ms:.0f}")
+            self.root.after(0, self.root.destroy)
+
+    def _verificar_entorno_fondo(self):
+        ok = verificar_entorno(self.logbox)
+        en_hilo_gui(self._entorno_verificado, ok)
+
+    def _entorno_verificado(self, ok):
+        if ok:
+            self.set_progress("Entorno verificado.", "green")
+        else:
+            self.set_progress("Faltan herramientas: revisa el log.", "red")
             messagebox.showerror("Error de entorno", "Faltan herramientas necesarias. Revisa el log.")
 
     def _init_layout(self):
@@ -1649,6 +1637,12 @@ class GeneradorGUI:
         Label(col_izq, text="7. Contenido (Imágenes y Modelos) *", font=("Segoe UI", 10, "bold")).pack(anchor="w")
         Button(col_izq, text="Agregar Imágenes", command=self.agregar_imagenes).pack(anchor="w", pady=2)
         Button(col_izq, text="Agregar Modelos 3D", command=self.agregar_modelos).pack(anchor="w", pady=2)
+        Button(col_izq, text="Importar Carpeta del Libro", command=self.importar_carpeta).pack(anchor="w", pady=2)
+
+        Label(col_izq, text="Tipo de marcador (barcode = detección más rápida)", font=("Segoe UI", 9)).pack(anchor="w", pady=(8, 0))
+        OptionMenu(col_izq, self.tipo_marcador_var, *MARKER_BACKENDS.keys()).pack(anchor="w")
+        Label(col_izq, text="Presupuesto de modelos (MB, 0 = sin límite)", font=("Segoe UI", 9)).pack(anchor="w", pady=(8, 0))
+        Entry(col_izq, textvariable=self.presupuesto_modelos_var, width=10).pack(anchor="w")
 
         col_der = Frame(main)
         col_der.pack(side=LEFT, fill=Y)
@@ -1657,6 +1651,7 @@ class GeneradorGUI:
         self.lista = Listbox(col_der, width=66, height=12, selectmode="single")
         self.lista.pack(pady=5)
         Button(col_der, text="Quitar Seleccionado", fg="red", command=self.quitar_seleccionado).pack(anchor="w")
+        Button(col_der, text="Aplicar tipo de marcador al seleccionado", command=self.aplicar_tipo_marcador).pack(anchor="w", pady=(5, 0))
 
         acciones_frame = Frame(main, pady=20)
         acciones_frame.pack(side=LEFT, fill=Y, padx=(20, 0))
@@ -1668,10 +1663,22 @@ class GeneradorGUI:
                command=self.generar_apk, width=18, height=2).pack(pady=5)
         Button(acciones_frame, text="Iniciar Servidor y Ngrok", bg="#ffc107", fg="black",
                command=self.iniciar_servidor_ngrok, width=18, height=2).pack(pady=5)
+        servidor_frame = Frame(acciones_frame)
+        servidor_frame.pack(anchor="w")
+        Label(servidor_frame, text="Modo:").grid(row=0, column=0, sticky="w")
+        OptionMenu(servidor_frame, self.modo_servidor_var, "desarrollo", "producción").grid(row=0, column=1, columnspan=3, sticky="w")
+        Label(servidor_frame, text="Workers:").grid(row=1, column=0, sticky="w")
+        Entry(servidor_frame, textvariable=self.workers_var, width=4).grid(row=1, column=1, sticky="w")
+        Label(servidor_frame, text="Hilos:").grid(row=1, column=2, sticky="w")
+        Entry(servidor_frame, textvariable=self.threads_var, width=4).grid(row=1, column=3, sticky="w")
+        Button(acciones_frame, text="Detener Servidor", command=self.detener_servidor, width=18).pack(pady=5)
+        Button(acciones_frame, text="Exportar Paquete", command=self.exportar_paquete, width=18).pack(pady=5)
+        Button(acciones_frame, text="Importar Paquete", command=self.importar_paquete, width=18).pack(pady=5)
 
         Label(acciones_frame, text="9. Verificación:", font=("Segoe UI", 10, "bold")).pack(anchor="w", pady=(20, 10))
         Button(acciones_frame, text="Verificar Conexión", command=self.verify_backend_connection, width=18).pack(pady=5)
         Button(acciones_frame, text="Ver Claves en BD", command=self.view_activation_keys, width=18).pack(pady=5)
+        Button(acciones_frame, text="Base Propia del Libro", command=self.crear_particion_libro, width=18).pack(pady=5)
 
         Button(acciones_frame, text="Limpiar Formulario", fg="black",
                command=self.limpiar_todo, width=18).pack(pady=20)
@@ -1691,6 +1698,10 @@ class GeneradorGUI:
 
     def set_progress(self, text, color="black"):
         """Actualiza el texto y color de la barra de progreso en la GUI."""
+        if threading.current_thread() is not threading.main_thread():
+            COLA_GUI.put((self.set_progress, (text, color)))
+            return
+        vaciar_cola_gui()
         self.label_progreso.config(text=text, fg=color)
         self.root.update_idletasks() # Forzar actualización de la GUI
 
@@ -1722,9 +1733,8 @@ class GeneradorGUI:
         for archivo in archivos:
             # Usa limpiar_nombre para el nombre base del archivo
             base = limpiar_nombre(os.path.splitext(os.path.basename(archivo))[0])
-            self.pares.append({"imagen": archivo, "modelo": None, "base": base})
+            self._agregar_par({"imagen": archivo, "modelo": None, "base": base, "marcador": self.tipo_marcador_var.get()})
             safe_log(self.logbox, f"Imagen marcador agregada: {os.path.basename(archivo)}")
-        self.actualizar_lista()
 
     def agregar_modelos(self):
         """Permite al usuario agregar múltiples modelos 3D (GLB/FBX)."""
@@ -1732,18 +1742,56 @@ class GeneradorGUI:
         for archivo in archivos:
             # Usa limpiar_nombre para el nombre base del archivo
             base = limpiar_nombre(os.path.splitext(os.path.basename(archivo))[0])
-            agregado = False
-            for par in self.pares:
-                # Intenta emparejar el modelo con una imagen existente si tienen el mismo nombre base
-                if par['base'] == base and not par['modelo']:
-                    par['modelo'] = archivo
-                    agregado = True
-                    break
-            if not agregado:
+            # Intenta emparejar el modelo con una imagen existente si tienen el mismo nombre base
+            idx = self.indice_pares.get(base)
+            if idx is not None and not self.pares[idx]['modelo']:
+                self.pares[idx]['modelo'] = archivo
+                self._refrescar_fila(idx)
+            else:
                 # Si no se emparejó, añade un nuevo par (modelo sin imagen por ahora)
-                self.pares.append({"imagen": None, "modelo": archivo, "base": base})
+                self._agregar_par({"imagen": None, "modelo": archivo, "base": base, "marcador": self.tipo_marcador_var.get()})
             safe_log(self.logbox, f"Modelo 3D agregado: {os.path.basename(archivo)}")
-        self.actualizar_lista()
+
+    def importar_carpeta(self):
+        """Importa de una vez todas las imágenes y modelos de la carpeta de un libro, emparejados por nombre."""
+        carpeta = filedialog.askdirectory(title="Carpeta del libro (imágenes y modelos con el mismo nombre)")
+        if not carpeta:
+            return
+        inicio = time.perf_counter()
+        resultado = escanear_libro(carpeta)
+        nuevos, completados, repetidos = [], [], []
+        for par in resultado["pares"]:
+            if par["base"] in self.indice_pares:
+                # Ya estaba: se completa la mitad que le falte (p. ej. se había agregado solo la imagen)
+                if self._completar_par(par["base"], par["imagen"], par["modelo"]):
+                    completados.append(par["base"])
+                else:
+                    repetidos.append(par["base"])
+                continue
+            par["marcador"] = self.tipo_marcador_var.get()
+            nuevos.append(par)
+        self._agregar_pares(nuevos)
+        # Los huérfanos de la carpeta pueden completar páginas que ya estaban en la lista
+        huerfanos = {"imagenes_huerfanas": [], "modelos_huerfanos": []}
+        for clave, es_imagen in (("imagenes_huerfanas", True), ("modelos_huerfanos", False)):
+            for ruta in resultado[clave]:
+                base = limpiar_nombre(os.path.splitext(os.path.basename(ruta))[0])
+                if base in self.indice_pares and self._completar_par(base, ruta if es_imagen else None,
+                                                                     None if es_imagen else ruta):
+                    completados.append(base)
+                else:
+                    huerfanos[clave].append(ruta)
+
+        safe_log(self.logbox, f"✓ Carpeta importada: {len(nuevos)} páginas nuevas, {len(completados)} completadas "
+                              f"en {(time.perf_counter() - inicio) * 1000:.0f} ms ({carpeta})")
+        for base, tipo, rutas in resultado["duplicados"]:
+            safe_log(self.logbox, f"⚠ Duplicado ({tipo}) '{base}': se usa {os.path.basename(rutas[0])}, se ignoran {', '.join(os.path.basename(r) for r in rutas[1:])}")
+        if repetidos:
+            safe_log(self.logbox, f"⚠ Ya estaban en la lista y se omiten: {', '.join(repetidos)}")
+        for ruta in huerfanos["imagenes_huerfanas"]:
+            safe_log(self.logbox, f"⚠ Imagen sin modelo: {os.path.basename(ruta)}")
+        for ruta in huerfanos["modelos_huerfanos"]:
+            safe_log(self.logbox, f"⚠ Modelo sin imagen: {os.path.basename(ruta)}")
 
     def quitar_seleccionado(self):
         """Elimina el elemento seleccionado de la lista de archivos emparejados."""
@@ -1752,8 +1800,27 @@ class GeneradorGUI:
             return
         idx = seleccion[0]
         quitado = self.pares.pop(idx)
+        self.lista.delete(idx)
+        if self.indice_pares.get(quitado['base']) == idx:
+            del self.indice_pares[quitado['base']]
+        # Las filas siguientes suben una posición; si había otra entrada con la base
+        # quitada, la primera de ellas pasa a ser la indexada
+        for i in range(idx, len(self.pares)):
+            base = self.pares[i]['base']
+            fila = self.indice_pares.get(base)
+            if fila is None or fila == i + 1:
+                self.indice_pares[base] = i
         safe_log(self.logbox, f"Elemento quitado: {quitado['base']}")
-        self.actualizar_lista()
+
+    def aplicar_tipo_marcador(self):
+        """Asigna el tipo de marcador elegido en el selector a la página seleccionada."""
+        seleccion = self.lista.curselection()
+        if not seleccion:
+            return
+        par = self.pares[seleccion[0]]
+        par['marcador'] = self.tipo_marcador_var.get()
+        safe_log(self.logbox, f"Marcador de '{par['base']}' cambiado a: {par['marcador']}")
+        self._refrescar_fila(seleccion[0])
 
     def limpiar_todo(self):
         """Reinicia todos los campos del formulario y la lista de archivos."""
@@ -1773,12 +1840,50 @@ class GeneradorGUI:
         safe_log(self.logbox, "Formulario reiniciado.")
 
     def actualizar_lista(self):
-        """Actualiza la Listbox en la GUI para mostrar los archivos emparejados."""
+        """Reconstruye la Listbox y el índice por nombre base a partir de self.pares."""
         self.lista.delete(0, END) # Limpiar la lista actual
-        for par in self.pares:
-            img_status = "✓" if par['imagen'] else "✗"
-            mod_status = "✓" if par['modelo'] else "✗"
-            self.lista.insert(END, f"{par['base']} | Imagen: {img_status} | Modelo: {mod_status}")
+        self.indice_pares = {}
+        for i, par in enumerate(self.pares):
+            self.indice_pares.setdefault(par['base'], i)
+        if self.pares:
+            self.lista.insert(END, *(self._texto_par(par) for par in self.pares))
+
+    @staticmethod
+    def _texto_par(par):
+        img_status = "✓" if par['imagen'] else "✗"
+        mod_status = "✓" if par['modelo'] else "✗"
+        return f"{par['base']} | Imagen: {img_status} | Modelo: {mod_status} | Marcador: {par.get('marcador', 'pattern')}"
+
+    def _agregar_par(self, par):
+        self._agregar_pares([par])
+
+    def _agregar_pares(self, pares):
+        """Agrega al final de la lista sin redibujar las filas existentes."""
+        if not pares:
+            return
+        for par in pares:
+            self.indice_pares.setdefault(par['base'], len(self.pares))
+            self.pares.append(par)
+        self.lista.insert(END, *(self._texto_par(par) for par in pares))
+
+    def _completar_par(self, base, imagen=None, modelo=None):
+        """Llena la imagen y/o el modelo que le falten al par de `base`. True si cambió algo."""
+        idx = self.indice_pares[base]
+        par = self.pares[idx]
+        cambio = False
+        if imagen and not par['imagen']:
+            par['imagen'] = imagen
+            cambio = True
+        if modelo and not par['modelo']:
+            par['modelo'] = modelo
+            cambio = True
+        if cambio:
+            self._refrescar_fila(idx)
+        return cambio
+
+    def _refrescar_fila(self, idx):
+        self.lista.delete(idx)
+        self.lista.insert(idx, self._texto_par(self.pares[idx]))
 
     def validar_entrada(self) -> bool:
         """
@@ -1854,7 +1959,7 @@ class GeneradorGUI:
                 img.convert("RGB").save(portada_dest_paquete, "JPEG", quality=95)
             
             # Copiar portada a www para la pantalla de activación
-            shutil.copy2(portada_dest_paquete, os.path.join(WWW_DIR, "portada.jpg"))
+            enlazar_o_copiar(portada_dest_paquete, os.path.join(WWW_DIR, "portada.jpg"))
             safe_log(self.logbox, f"✓ Portada copiada a: {portada_dest_paquete} y a www/")
 
             # Crear directorios para assets en www
@@ -1873,55 +1978,100 @@ class GeneradorGUI:
 
 
             ar_content_list = []
+            trabajos_marcadores = []
+            modelos_paquete = []
             for par in self.pares:
                 if par['imagen'] and par['modelo']:
                     # Procesar y copiar modelo 3D
                     mod_dest_paquete = os.path.join(paquete_dir, "models", f"{par['base']}.glb")
-                    mod_dest_www = os.path.join(www_models_dir, f"{par['base']}.glb")
                     os.makedirs(os.path.dirname(mod_dest_paquete), exist_ok=True)
                     if os.path.splitext(par['modelo'])[1].lower() == ".glb":
-                        shutil.copy2(par['modelo'], mod_dest_paquete)
+                        copiar(par['modelo'], mod_dest_paquete)
                     else:
                         self.convertir_con_blender(par['modelo'], mod_dest_paquete)
-                    shutil.copy2(mod_dest_paquete, mod_dest_www)
+                    modelos_paquete.append(mod_dest_paquete)
                     
                     # Copiar imagen original al paquete (para referencia)
                     img_dest_paquete = os.path.join(paquete_dir, "images", f"{par['base']}.jpg")
                     os.makedirs(os.path.dirname(img_dest_paquete), exist_ok=True)
-                    shutil.copy2(par['imagen'], img_dest_paquete)
+                    copiar(par['imagen'], img_dest_paquete)
 
-                    # --- Lógica de Generación de Marcadores Simplificada (Solo .patt) ---
-                    nombre_limpio = par['base']
-                    marker_type = 'pattern' # El nuevo frontend está diseñado para 'pattern'
-                    
-                    # Generar patrón .patt con OpenCV
-                    patt_dest_www = os.path.join(www_patterns_dir, f"{nombre_limpio}.patt")
-                    if generar_patt_opencv(self.logbox, img_dest_paquete, patt_dest_www):
-                        marker_url = os.path.join("patterns", f"{nombre_limpio}.patt").replace("\\", "/")
-                        model_url = os.path.join("models", f"{nombre_limpio}.glb").replace("\\", "/")
-                        
-                        ar_content_list.append({
-                            "type": marker_type,
-                            "markerUrl": marker_url,
-                            "modelUrl": model_url
-                        })
-                        safe_log(self.logbox, f"✓ Marcador '{marker_type}' procesado para: {nombre_limpio}")
-                    else:
-                        safe_log(self.logbox, f"✗ ERROR: Falló la generación del marcador .patt para {nombre_limpio}.")
+                    trabajos_marcadores.append({
+                        "imagen": img_dest_paquete,
+                        "tipo": par.get('marcador', 'pattern'),
+                        "nombre": par['base'],
+                    })
+
+            # --- LODs decimados con Blender (antes de comprimir: Blender no importa meshopt) ---
+            lods_por_modelo = generar_lods(lambda m: safe_log(self.logbox, m), modelos_paquete, BLENDER_PATH, GEN_DIR)
+            modelos_paquete += [lod for lods in lods_por_modelo.values() for lod in lods]
+
+            # --- Optimización de modelos (cuantización, meshopt, texturas) antes de copiarlos a www ---
+            try:
+                presupuesto_mb = float(self.presupuesto_modelos_var.get().strip() or 0)
+            except ValueError:
+                presupuesto_mb = 0
+            optimizar_modelos(
+                lambda m: safe_log(self.logbox, m),
+                modelos_paquete,
+                {"presupuesto_mb": presupuesto_mb},
+                reporte_path=os.path.join(paquete_dir, "optimizacion_modelos.json"),
+            )
+            # Modelos e imágenes al almacén por contenido: lo que otro libro ya tiene no ocupa disco de nuevo
+            almacen = AlmacenAssets(ALMACEN_DIR)
+            almacen.adoptar_todos(
+                lambda m: safe_log(self.logbox, m),
+                [portada_dest_paquete] + modelos_paquete + [t["imagen"] for t in trabajos_marcadores],
+            )
+            # El paquete es la fuente única: en www los modelos son enlaces, no una segunda copia
+            for mod_dest_paquete in modelos_paquete:
+                enlazar_o_copiar(mod_dest_paquete, os.path.join(www_models_dir, os.path.basename(mod_dest_paquete)))
+
+            # --- Generación de marcadores con el motor unificado (caché + paralelo) ---
+            marcadores = generar_marcadores(
+                lambda m: safe_log(self.logbox, m),
+                trabajos_marcadores,
+                www_patterns_dir,
+                cache_dir=os.path.join(GEN_DIR, "marker_cache"),
+                ids_barcode_path=os.path.join(paquete_dir, "barcodes.json"),
+            )
+            for trabajo, marcador in zip(trabajos_marcadores, marcadores):
+                nombre_limpio = trabajo['nombre']
+                if marcador:
+                    mod_paquete = os.path.join(paquete_dir, "models", f"{nombre_limpio}.glb")
+                    marcador["modelUrl"] = f"models/{nombre_limpio}.glb"
+                    # LODs del más liviano al más detallado; el visor termina en modelUrl
+                    marcador["lods"] = [f"models/{os.path.basename(l)}" for l in lods_por_modelo.get(mod_paquete, [])]
+                    ar_content_list.append(marcador)
+                    safe_log(self.logbox, f"✓ Marcador '{marcador['type']}' procesado para: {nombre_limpio}")
+                else:
+                    safe_log(self.logbox, f"✗ ERROR: Falló la generación del marcador '{trabajo['tipo']}' para {nombre_limpio}.")
 
 
             # 2. Generar y guardar claves
             self.claves = [self._generar_codigo_eco() for _ in range(cantidad)]
-            insertar_claves_en_backend(self.logbox, self.claves)
+            insertar_claves_en_backend(self.logbox, self.claves, nombre)
             claves_file = os.path.join(OUTPUT_APK_DIR, f"{nombre}_claves.txt")
             with open(claves_file, "w", encoding="utf-8") as f: f.write("\n".join(self.claves))
             safe_log(self.logbox, f"✓ {cantidad} claves generadas.")
 
-            # 3. Generar y guardar los 4 archivos HTML (incluyendo la nueva vista web)
+            # 3. Runtime AR local (sin CDN) con hash de contenido en el nombre
+            vendor_urls = vendorizar_runtime(
+                lambda m: safe_log(self.logbox, m),
+                os.path.join(PROJECT_DIR, "node_modules"),
+                WWW_DIR,
+                os.path.join(GEN_DIR, "vendor_cache"),
+                nft=usa_nft(ar_content_list),
+            )
+            # Espejo de www/vendor (ya podado): solo se escriben los archivos que cambiaron
+            sincronizar_www(lambda m: safe_log(self.logbox, m), os.path.join(WWW_DIR, "vendor"),
+                            os.path.join(paquete_dir, "vendor"))
+
+            # 4. Generar y guardar los 4 archivos HTML (incluyendo la nueva vista web)
             activation_html = self.generate_activation_html(nombre, backend_url)
             main_menu_html = self.generate_main_menu_html(nombre)
-            ar_viewer_html = self.generate_ar_viewer_html(nombre, ar_content_list)
-            web_ar_viewer_html = self.generate_web_ar_viewer_html(nombre, ar_content_list)
+            ar_viewer_html = self.generate_ar_viewer_html(nombre, ar_content_list, vendor_urls)
+            web_ar_viewer_html = self.generate_web_ar_viewer_html(nombre, ar_content_list, vendor_urls)
 
             for filename, content in [
                 ("index.html", activation_html),
@@ -1934,12 +2084,20 @@ class GeneradorGUI:
                 with open(os.path.join(paquete_dir, filename), "w", encoding="utf-8") as f:
                     f.write(content)
                 safe_log(self.logbox, f"✓ Archivo HTML generado y guardado: {filename}")
+            os.utime(paquete_dir)  # último uso del paquete para la poda LRU de cachés
 
             # Crear ambos archivos frontend-ar
             self.crear_y_copiar_frontend_ar(self.logbox)
             self.crear_y_copiar_web_frontend_ar(self.logbox)
 
-            # 4. Actualizar config de Capacitor
+            # Service worker + manifiesto de precarga con los hashes finales de www
+            generar_precache(lambda m: safe_log(self.logbox, m), WWW_DIR)
+            # Variantes .gz/.br para que el servidor de prueba no comprima en cada petición
+            precomprimir(lambda m: safe_log(self.logbox, m), WWW_DIR)
+            # Los assets del paquete anterior de este libro ya no tienen referencias
+            almacen.recolectar(lambda m: safe_log(self.logbox, m))
+
+            # 5. Actualizar config de Capacitor
             package_name = get_package_name(nombre)
             config_path = os.path.join(PROJECT_DIR, "capacitor.config.json")
             capacitor_config = {
@@ -1996,6 +2154,7 @@ class GeneradorGUI:
 
         self.set_progress(f"Verificando conexión con {base_url}...")
         safe_log(self.logbox, f"Verificando conexión con {base_url}...")
+        import requests
         try:
             # We don't want to verify SSL cert for ngrok free tier, as it can be tricky.
             # For a production app, you'd want to handle this properly.
@@ -2010,75 +2169,49 @@ class GeneradorGUI:
             messagebox.showerror("Error de Conexión", f"No se pudo conectar al backend en {base_url}.\nAsegúrate de que el servidor esté corriendo y la URL sea correcta.\n\nError: {e}")
             self.set_progress("Fallo en la conexión con backend.", "red")
 
-    def view_activation_keys(self):
-        """Muestra las claves de activación desde el backend con manejo robusto de errores."""
-        backend_url = self.backend_url.get().strip()
-        if not backend_url:
-            messagebox.showerror("Error", "La URL del Backend está vacía.")
-            safe_log(self.logbox, "ERROR: URL del backend no configurada")
+    def crear_particion_libro(self):
+        """Mueve las claves del libro actual a su propia base (activaciones_<libro>.db)."""
+        nombre = limpiar_nombre(self.nombre_libro.get().strip())
+        if not nombre:
+            messagebox.showwarning("Falta nombre", "Ingrese el nombre del libro cuyas claves se moverán a su propia base.")
+            return
+        if not messagebox.askyesno(
+                "Base propia del libro",
+                f"¿Mover las claves de '{nombre}' a una base propia?\n\n"
+                "Las activaciones de este libro dejan de competir con las de los demás. "
+                "Puede hacerse con el servidor en marcha."):
             return
-        
         try:
-            # Validación y normalización de URL
-            if not backend_url.startswith(('http://', 'https://')):
-                backend_url = 'https://' + backend_url
-                
-            base_url_match = re.match(r'https?://[^/]+', backend_url)
-            if not base_url_match:
-                raise ValueError("Formato de URL inválido")
-                
-            keys_url = f"{base_url_match.group(0)}/keys"
-            safe_log(self.logbox, f"Conectando a: {keys_url}")
-            
-            # Implementar reintentos con backoff exponencial
-            for attempt in range(3):
-                try:
-                    timeout_duration = 10 + (attempt * 5)  # Incrementar timeout
-                    response = requests.get(
-                        keys_url, 
-                        timeout=timeout_duration, 
-                        verify=False,
-                        headers={'User-Agent': 'LibrosAR-GUI/1.0'}
-                    )
-                    
-                    safe_log(self.logbox, f"Respuesta HTTP: {response.status_code}")
-                    
-                    if response.status_code == 200:
-                        keys = response.json()
-                        # Display keys in a new window
-                        top = Toplevel(self.root)
-                        top.title("Claves de Activación en la Base de Datos")
-                        top.geometry("600x400")
-                        text = Text(top, wrap="word")
-                        text.pack(expand=True, fill=BOTH)
-                        text.insert(END, json.dumps(keys, indent=4))
-                        self.set_progress("Claves obtenidas exitosamente.")
-                        return
-                    elif response.status_code == 404:
-                        raise ValueError("Endpoint /keys no encontrado en el backend")
-                    else:
-                        safe_log(self.logbox, f"Error HTTP {response.status_code}: {response.text[:200]}")
-                        
-                except requests.exceptions.Timeout:
-                    safe_log(self.logbox, f"Timeout en intento {attempt + 1}/3 ({timeout_duration}s)")
-                    if attempt < 2:
-                        time.sleep(2 ** attempt)  # Backoff exponencial
-                        continue
-                        
-                except requests.exceptions.ConnectionError as e:
-                    safe_log(self.logbox, f"Error de conexión en intento {attempt + 1}/3: {str(e)[:100]}")
-                    if attempt < 2:
-                        time.sleep(2 ** attempt)
-                        continue
-                        
-            # Si llegamos aquí, todos los intentos fallaron
-            raise Exception("No se pudo conectar después de 3 intentos")
-            
+            crear_particion(lambda m: safe_log(self.logbox, m), nombre)
+            self.set_progress("Base propia del libro lista.")
+        except Exception as e:
+            safe_log(self.logbox, f"✗ Error al crear la base propia de '{nombre}': {e}")
+            messagebox.showerror("Error", f"No se pudo crear la base propia: {e}")
+            self.set_progress("Fallo al crear la base propia.", "red")
+
+    def view_activation_keys(self):
+        """
+        Muestra las claves de activación leyendo la base local. El servidor no expone
+        un listado de claves: está publicado por ngrok y cualquiera con la URL lo vería.
+        """
+        nombre = limpiar_nombre(self.nombre_libro.get().strip())
+        try:
+            init_db()
+            keys = listar_tokens(nombre or None)
         except Exception as e:
-            error_msg = f"Error al obtener claves: {str(e)}"
+            error_msg = f"Error al leer las claves de la base local: {e}"
             safe_log(self.logbox, error_msg)
-            messagebox.showerror("Error de Conexión", error_msg)
+            messagebox.showerror("Error", error_msg)
             self.set_progress("Fallo al obtener claves.", "red")
+            return
+        top = Toplevel(self.root)
+        top.title(f"Claves de Activación en la Base de Datos{f' ({nombre})' if nombre else ''}")
+        top.geometry("600x400")
+        text = Text(top, wrap="word")
+        text.pack(expand=True, fill=BOTH)
+        text.insert(END, json.dumps(keys, indent=4, ensure_ascii=False))
+        safe_log(self.logbox, f"✓ {len(keys)} claves leídas de la base local.")
+        self.set_progress("Claves obtenidas exitosamente.")
 
     def generate_activation_html(self, nombre, backend_url):
         # Asegurarse de que la URL termine con /activar
@@ -2171,7 +2304,7 @@ class GeneradorGUI:
 
             try {{
                 const deviceId = await getOrCreateDeviceId();
-                const payload = {{ token: code, device_id: deviceId }};
+                const payload = {{ token: code, device_id: deviceId, libro: '{nombre}' }};
                 
                 const response = await fetch('{activation_url}', {{
                     method: 'POST',
@@ -2181,7 +2314,8 @@ class GeneradorGUI:
                     signal: AbortSignal.timeout(15000) // 15 segundos
                 }});
 
-                if (!response.ok) {{
+                // 429 = demasiados intentos: el servidor explica el motivo en result.error
+                if (!response.ok && response.status !== 429) {{
                     throw new Error(`Error HTTP: ${{response.status}}`);
                 }}
                 
@@ -2205,6 +2339,7 @@ class GeneradorGUI:
             }}
         }}
     </script>
+{SW_REGISTRO}
 </body>
 </html>"""
 
@@ -2283,12 +2418,16 @@ window.location.href = 'ar-viewer.html';
 }}
 }}
 </script>
+{SW_REGISTRO}
 </body>
 </html>"""
 
-    def generate_ar_viewer_html(self, nombre, ar_content_list):
+    def generate_ar_viewer_html(self, nombre, ar_content_list, vendor_urls=None):
         # Convertir la lista de diccionarios de Python a una cadena JSON
         ar_content_json = json.dumps(ar_content_list)
+        vendor_urls = vendor_urls or urls_cdn()
+        vendor_json = json.dumps(vendor_urls)
+        runtime_scripts = etiquetas_script(vendor_urls, "    ", nft=usa_nft(ar_content_list))
 
         return f"""
 <!DOCTYPE html>
@@ -2313,20 +2452,23 @@ window.location.href = 'ar-viewer.html';
     <!-- Inyectar el contenido AR como una variable global de JavaScript -->
     <script>
         window.arContent = {ar_content_json};
+        window.arVendor = {vendor_json};
     </script>
 
-    <!-- Scripts requeridos para la nueva implementación de AR -->
-    <script src="https://cdn.jsdelivr.net/npm/three@0.128.0/build/three.min.js"></script>
-    <script src="https://cdn.jsdelivr.net/npm/three@0.128.0/examples/js/loaders/GLTFLoader.js"></script>
-    <script src="https://cdn.jsdelivr.net/gh/AR-js-org/AR.js@3.4.7/three.js/build/ar-threex.js"></script>
+    <!-- Runtime AR empaquetado localmente en www/vendor (funciona sin conexión) -->
+{runtime_scripts}
 
     <!-- El script principal que contiene la lógica de AR -->
     <script src="js/frontend-ar.js"></script>
+{SW_REGISTRO}
 </body>
 </html>"""
 
-    def generate_web_ar_viewer_html(self, nombre, ar_content_list):
+    def generate_web_ar_viewer_html(self, nombre, ar_content_list, vendor_urls=None):
         ar_content_json = json.dumps(ar_content_list)
+        vendor_urls = vendor_urls or urls_cdn()
+        vendor_json = json.dumps(vendor_urls)
+        runtime_scripts = etiquetas_script(vendor_urls, nft=usa_nft(ar_content_list))
 
         return f"""
 <!DOCTYPE html>
@@ -2374,12 +2516,12 @@ margin-bottom: 10px; padding-bottom: 10px; border-bottom: 1px solid #555;
 
 <script>
 window.arContent = {ar_content_json};
+window.arVendor = {vendor_json};
 </script>
 
-<script src="https://cdn.jsdelivr.net/npm/three@0.128.0/build/three.min.js"></script>
-<script src="https://cdn.jsdelivr.net/npm/three@0.128.0/examples/js/loaders/GLTFLoader.js"></script>
-<script src="https://cdn.jsdelivr.net/gh/AR-js-org/AR.js@3.4.7/three.js/build/ar-threex.js"></script>
+{runtime_scripts}
 <script src="js/web-frontend-ar.js"></script>
+{SW_REGISTRO}
 </body>
 </html>"""
 
@@ -2453,6 +2595,9 @@ function initializeAR() {
         sourceHeight: window.innerHeight,
     });
 
+    // Se asigna al inicializar la fuente; animate() no hace nada hasta entonces
+    let arToolkitContext = null;
+
     arToolkitSource.init(() => {
         // Redimensionar el video para que ocupe toda la pantalla
         arToolkitSource.domElement.style.position = 'fixed';
@@ -2464,9 +2609,12 @@ function initializeAR() {
         
         console.log("ARToolkitSource inicializado correctamente.");
 
-        const arToolkitContext = new THREEx.ArToolkitContext({
+        // Los marcadores 'barcode' requieren detección de matriz además de patrones
+        const usaBarcode = (window.arContent || []).some(c => c.type === 'barcode');
+        arToolkitContext = new THREEx.ArToolkitContext({
             cameraParametersUrl: 'data/camera_para.dat',
-            detectionMode: 'mono',
+            detectionMode: usaBarcode ? 'mono_and_matrix' : 'mono',
+            matrixCodeType: '3x3',
             maxDetectionRate: 30
         });
 
@@ -2485,25 +2633,113 @@ function initializeAR() {
         });
     });
 
+    // --- Carga bajo demanda: cada modelo se descarga al detectar su marcador por primera vez ---
+    // y se libera si no se ve por un tiempo. Luego se mejora el LOD si el dispositivo lo permite.
+    const MAX_LOADED_MODELS = 4;
+    const EVICT_AFTER_MS = 60000;
+    const modelEntries = [];
+    let avgFrameMs = 16;
+    let lastFrame = performance.now();
+    let lastLodCheck = 0;
+    let lodCap = deviceLodTier();
+
+    function deviceLodTier() {
+        // deviceMemory manda cuando existe (Chrome/Android); Safari y Firefox no lo exponen
+        // y entonces los núcleos son la única pista. Solo 1-2 núcleos fuerzan el nivel mínimo.
+        const memory = navigator.deviceMemory;
+        const cores = navigator.hardwareConcurrency || 0;
+        if (cores && cores <= 2) return 0;
+        if (memory !== undefined) return memory <= 2 ? 0 : (memory <= 4 ? 1 : 2);
+        return cores >= 6 ? 2 : 1;
+    }
+
     function animate() {
         requestAnimationFrame(animate);
-        if (arToolkitSource.ready === false) return;
+        if (!arToolkitContext || arToolkitSource.ready === false) return;
         arToolkitContext.update(arToolkitSource.domElement);
+
+        const now = performance.now();
+        for (const entry of modelEntries) {
+            if (!entry.root.visible) continue;
+            entry.lastSeen = now;
+            if (entry.level < 0 && !entry.loading && !entry.failed) {
+                loadLevel(entry, 0);
+                prefetchNext(entry);
+            }
+        }
         renderer.render(scene, camera);
+
+        avgFrameMs = avgFrameMs * 0.95 + (now - lastFrame) * 0.05;
+        lastFrame = now;
+        if (now - lastLodCheck > 1000) {
+            lastLodCheck = now;
+            evictModels(now);
+            updateLODs();
+        }
+    }
+
+    // Se anticipa la página siguiente del libro con su nivel más liviano
+    function prefetchNext(entry) {
+        const next = modelEntries[entry.index + 1];
+        if (next && next.level < 0 && !next.loading && !next.failed) {
+            next.lastSeen = performance.now();
+            loadLevel(next, 0);
+        }
+    }
+
+    function evictModels(now) {
+        const loaded = modelEntries
+            .filter(e => e.model && !e.loading && !e.root.visible)
+            .sort((a, b) => a.lastSeen - b.lastSeen);
+        let excess = modelEntries.filter(e => e.model).length - MAX_LOADED_MODELS;
+        for (const entry of loaded) {
+            if (excess <= 0 && now - entry.lastSeen < EVICT_AFTER_MS) break;
+            entry.root.remove(entry.model);
+            disposeModel(entry.model);
+            entry.model = null;
+            entry.level = -1;
+            excess--;
+        }
+    }
+
+    function updateLODs() {
+        // Si el rendimiento cae, se baja el tope de calidad para el resto de la sesión
+        if (avgFrameMs > 40 && lodCap > 0) {
+            lodCap--;
+            return;
+        }
+        if (avgFrameMs > 28) return;
+        for (const entry of modelEntries) {
+            const target = Math.min(lodCap, entry.levels.length - 1);
+            if (!entry.loading && !entry.failed && entry.root.visible && entry.level >= 0 && entry.level < target) {
+                loadLevel(entry, entry.level + 1);
+                return; // una mejora por vez para no saturar la red ni la GPU
+            }
+        }
     }
 
     function createMarker(content, scene, arToolkitContext) {
         const markerRoot = new THREE.Group();
         scene.add(markerRoot);
 
-        new THREEx.ArMarkerControls(arToolkitContext, markerRoot, {
-            type: 'pattern',
-            patternUrl: content.markerUrl,
-            changeMatrixMode: 'cameraTransformMatrix'
+        new THREEx.ArMarkerControls(arToolkitContext, markerRoot, markerControlsOptions(content));
+
+        // Niveles ordenados del más liviano al original; nada se descarga hasta detectar el marcador
+        modelEntries.push({
+            index: modelEntries.length,
+            root: markerRoot,
+            levels: (content.lods || []).concat([content.modelUrl]),
+            level: -1,
+            model: null,
+            loading: false,
+            failed: false,
+            lastSeen: 0
         });
+    }
 
-        const loader = new THREE.GLTFLoader();
-        loader.load(content.modelUrl, (gltf) => {
+    function loadLevel(entry, level) {
+        entry.loading = true;
+        createGLTFLoader().load(entry.levels[level], (gltf) => {
             const model = gltf.scene;
             const box = new THREE.Box3().setFromObject(model);
             const size = box.getSize(new THREE.Vector3());
@@ -2511,9 +2747,60 @@ function initializeAR() {
             model.scale.set(scale, scale, scale);
             const center = box.getCenter(new THREE.Vector3());
             model.position.sub(center);
-            markerRoot.add(model);
+            if (entry.model) {
+                entry.root.remove(entry.model);
+                disposeModel(entry.model);
+            }
+            entry.model = model;
+            entry.level = level;
+            entry.loading = false;
+            entry.root.add(model);
+        }, undefined, (error) => {
+            entry.loading = false;
+            entry.failed = true;
+            console.error(`Error cargando modelo ${entry.levels[level]}:`, error);
         });
     }
+
+    function disposeModel(model) {
+        model.traverse((obj) => {
+            if (obj.geometry) obj.geometry.dispose();
+            const materials = Array.isArray(obj.material) ? obj.material : (obj.material ? [obj.material] : []);
+            materials.forEach((material) => {
+                Object.values(material).forEach((value) => {
+                    if (value && value.isTexture) value.dispose();
+                });
+                material.dispose();
+            });
+        });
+    }
+
+    // Los modelos pasan por la etapa de optimización (meshopt + texturas WebP/KTX2)
+    // Un único loader compartido: el transcodificador KTX2 usa workers propios
+    let sharedLoader = null;
+    function createGLTFLoader() {
+        if (sharedLoader) return sharedLoader;
+        sharedLoader = new THREE.GLTFLoader();
+        if (window.MeshoptDecoder) sharedLoader.setMeshoptDecoder(MeshoptDecoder);
+        if (THREE.KTX2Loader) {
+            sharedLoader.setKTX2Loader(new THREE.KTX2Loader()
+                .setTranscoderPath((window.arVendor && window.arVendor.basis) || 'https://cdn.jsdelivr.net/npm/three@0.128.0/examples/js/libs/basis/')
+                .detectSupport(renderer));
+        }
+        return sharedLoader;
+    }
+
+    function markerControlsOptions(content) {
+        const options = { type: content.type || 'pattern', changeMatrixMode: 'cameraTransformMatrix' };
+        if (options.type === 'nft') {
+            options.descriptorsUrl = content.descriptorsUrl;
+        } else if (options.type === 'barcode') {
+            options.barcodeValue = content.barcodeValue;
+        } else {
+            options.patternUrl = content.markerUrl;
+        }
+        return options;
+    }
 }
 """
         src_path = os.path.join(GEN_DIR, "frontend-ar.js")
@@ -2522,7 +2809,7 @@ function initializeAR() {
         
         destino_js_dir = os.path.join(WWW_DIR, "js")
         os.makedirs(destino_js_dir, exist_ok=True)
-        shutil.copy2(src_path, destino_js_dir)
+        copiar(src_path, os.path.join(destino_js_dir, os.path.basename(src_path)))
         safe_log(self.logbox, f"✓ frontend-ar.js (versión simplificada) creado y copiado a {destino_js_dir}")
 
     def crear_y_copiar_web_frontend_ar(self, logbox):
@@ -2543,8 +2830,9 @@ window.arContent.forEach((content, index) => {
 const markerInfo = document.createElement('div');
 markerInfo.className = 'marker-info';
 markerInfo.innerHTML = `
-<strong>Marcador ${index + 1}:</strong><br>
+<strong>Marcador ${index + 1}:</strong> ${content.type === 'barcode' ? 'código de barras #' + content.barcodeValue : content.type}<br>
 Modelo: ${content.modelUrl.split('/').pop()}
+${content.markerImage ? `<br><a href="${content.markerImage}" target="_blank" style="color:#8cf">Imprimir marcador</a>` : ''}
 `;
 markersList.appendChild(markerInfo);
 });
@@ -2578,12 +2866,18 @@ sourceWidth: window.innerWidth,
 sourceHeight: window.innerHeight,
 });
 
+// Se asigna al inicializar la fuente; animate() no hace nada hasta entonces
+let arToolkitContext = null;
+
 arToolkitSource.init(() => {
 console.log("ARToolkitSource inicializado correctamente para web.");
 
-const arToolkitContext = new THREEx.ArToolkitContext({
+// Los marcadores 'barcode' requieren detección de matriz además de patrones
+const usaBarcode = (window.arContent || []).some(c => c.type === 'barcode');
+arToolkitContext = new THREEx.ArToolkitContext({
 cameraParametersUrl: 'data/camera_para.dat',
-detectionMode: 'mono',
+detectionMode: usaBarcode ? 'mono_and_matrix' : 'mono',
+matrixCodeType: '3x3',
 maxDetectionRate: 30
 });
 
@@ -2602,25 +2896,113 @@ animate();
 });
 });
 
+// --- Carga bajo demanda: cada modelo se descarga al detectar su marcador por primera vez ---
+// y se libera si no se ve por un tiempo. Luego se mejora el LOD si el dispositivo lo permite.
+const MAX_LOADED_MODELS = 4;
+const EVICT_AFTER_MS = 60000;
+const modelEntries = [];
+let avgFrameMs = 16;
+let lastFrame = performance.now();
+let lastLodCheck = 0;
+let lodCap = deviceLodTier();
+
+function deviceLodTier() {
+// deviceMemory manda cuando existe (Chrome/Android); Safari y Firefox no lo exponen
+// y entonces los núcleos son la única pista. Solo 1-2 núcleos fuerzan el nivel mínimo.
+const memory = navigator.deviceMemory;
+const cores = navigator.hardwareConcurrency || 0;
+if (cores && cores <= 2) return 0;
+if (memory !== undefined) return memory <= 2 ? 0 : (memory <= 4 ? 1 : 2);
+return cores >= 6 ? 2 : 1;
+}
+
 function animate() {
 requestAnimationFrame(animate);
-if (arToolkitSource.ready === false) return;
+if (!arToolkitContext || arToolkitSource.ready === false) return;
 arToolkitContext.update(arToolkitSource.domElement);
+
+const now = performance.now();
+for (const entry of modelEntries) {
+if (!entry.root.visible) continue;
+entry.lastSeen = now;
+if (entry.level < 0 && !entry.loading && !entry.failed) {
+loadLevel(entry, 0);
+prefetchNext(entry);
+}
+}
 renderer.render(scene, camera);
+
+avgFrameMs = avgFrameMs * 0.95 + (now - lastFrame) * 0.05;
+lastFrame = now;
+if (now - lastLodCheck > 1000) {
+lastLodCheck = now;
+evictModels(now);
+updateLODs();
+}
+}
+
+// Se anticipa la página siguiente del libro con su nivel más liviano
+function prefetchNext(entry) {
+const next = modelEntries[entry.index + 1];
+if (next && next.level < 0 && !next.loading && !next.failed) {
+next.lastSeen = performance.now();
+loadLevel(next, 0);
+}
+}
+
+function evictModels(now) {
+const loaded = modelEntries
+.filter(e => e.model && !e.loading && !e.root.visible)
+.sort((a, b) => a.lastSeen - b.lastSeen);
+let excess = modelEntries.filter(e => e.model).length - MAX_LOADED_MODELS;
+for (const entry of loaded) {
+if (excess <= 0 && now - entry.lastSeen < EVICT_AFTER_MS) break;
+entry.root.remove(entry.model);
+disposeModel(entry.model);
+entry.model = null;
+entry.level = -1;
+excess--;
+}
+}
+
+function updateLODs() {
+// Si el rendimiento cae, se baja el tope de calidad para el resto de la sesión
+if (avgFrameMs > 40 && lodCap > 0) {
+lodCap--;
+return;
+}
+if (avgFrameMs > 28) return;
+for (const entry of modelEntries) {
+const target = Math.min(lodCap, entry.levels.length - 1);
+if (!entry.loading && !entry.failed && entry.root.visible && entry.level >= 0 && entry.level < target) {
+loadLevel(entry, entry.level + 1);
+return; // una mejora por vez para no saturar la red ni la GPU
+}
+}
 }
 
 function createMarker(content, scene, arToolkitContext) {
 const markerRoot = new THREE.Group();
 scene.add(markerRoot);
 
-new THREEx.ArMarkerControls(arToolkitContext, markerRoot, {
-type: 'pattern',
-patternUrl: content.markerUrl,
-changeMatrixMode: 'cameraTransformMatrix'
+new THREEx.ArMarkerControls(arToolkitContext, markerRoot, markerControlsOptions(content));
+
+// Niveles ordenados del más liviano al original; nada se descarga hasta detectar el marcador
+modelEntries.push({
+index: modelEntries.length,
+root: markerRoot,
+levels: (content.lods || []).concat([content.modelUrl]),
+level: -1,
+model: null,
+loading: false,
+failed: false,
+lastSeen: 0
 });
+}
 
-const loader = new THREE.GLTFLoader();
-loader.load(content.modelUrl, (gltf) => {
+function loadLevel(entry, level) {
+entry.loading = true;
+createGLTFLoader().load(entry.levels[level], (gltf) => {
 const model = gltf.scene;
 const box = new THREE.Box3().setFromObject(model);
 const size = box.getSize(new THREE.Vector3());
@@ -2628,13 +3010,62 @@ const scale = 0.8 / Math.max(size.x, size.y, size.z);
 model.scale.set(scale, scale, scale);
 const center = box.getCenter(new THREE.Vector3());
 model.position.sub(center);
-markerRoot.add(model);
+if (entry.model) {
+entry.root.remove(entry.model);
+disposeModel(entry.model);
+}
+entry.model = model;
+entry.level = level;
+entry.loading = false;
+entry.root.add(model);
 
-console.log(`Modelo cargado: ${content.modelUrl}`);
+console.log(`Modelo cargado: ${entry.levels[level]}`);
 }, undefined, (error) => {
-console.error(`Error cargando modelo ${content.modelUrl}:`, error);
+entry.loading = false;
+entry.failed = true;
+console.error(`Error cargando modelo ${entry.levels[level]}:`, error);
+});
+}
+
+function disposeModel(model) {
+model.traverse((obj) => {
+if (obj.geometry) obj.geometry.dispose();
+const materials = Array.isArray(obj.material) ? obj.material : (obj.material ? [obj.material] : []);
+materials.forEach((material) => {
+Object.values(material).forEach((value) => {
+if (value && value.isTexture) value.dispose();
+});
+material.dispose();
+});
 });
 }
+
+// Los modelos pasan por la etapa de optimización (meshopt + texturas WebP/KTX2)
+// Un único loader compartido: el transcodificador KTX2 usa workers propios
+let sharedLoader = null;
+function createGLTFLoader() {
+if (sharedLoader) return sharedLoader;
+sharedLoader = new THREE.GLTFLoader();
+if (window.MeshoptDecoder) sharedLoader.setMeshoptDecoder(MeshoptDecoder);
+if (THREE.KTX2Loader) {
+sharedLoader.setKTX2Loader(new THREE.KTX2Loader()
+.setTranscoderPath((window.arVendor && window.arVendor.basis) || 'https://cdn.jsdelivr.net/npm/three@0.128.0/examples/js/libs/basis/')
+.detectSupport(renderer));
+}
+return sharedLoader;
+}
+
+function markerControlsOptions(content) {
+const options = { type: content.type || 'pattern', changeMatrixMode: 'cameraTransformMatrix' };
+if (options.type === 'nft') {
+options.descriptorsUrl = content.descriptorsUrl;
+} else if (options.type === 'barcode') {
+options.barcodeValue = content.barcodeValue;
+} else {
+options.patternUrl = content.markerUrl;
+}
+return options;
+}
 }
 """
         src_path = os.path.join(GEN_DIR, "web-frontend-ar.js")
@@ -2643,86 +3074,85 @@ console.error(`Error cargando modelo ${content.modelUrl}:`, error);
 
         destino_js_dir = os.path.join(WWW_DIR, "js")
         os.makedirs(destino_js_dir, exist_ok=True)
-        shutil.copy2(src_path, destino_js_dir)
+        copiar(src_path, os.path.join(destino_js_dir, os.path.basename(src_path)))
         safe_log(self.logbox, f"✓ web-frontend-ar.js creado y copiado a {destino_js_dir}")
 
+    def exportar_paquete(self):
+        """Exporta el libro actual (o todos, deduplicados) a un .zip o .tar.zst."""
+        todos = messagebox.askyesnocancel(
+            "Exportar Paquete",
+            "¿Exportar TODOS los libros de paquetes/ en un solo archivo, guardando una sola vez los assets compartidos?\n\n"
+            "No = solo el libro actual.")
+        if todos is None:
+            return
+        if todos:
+            paquetes = [e.path for e in os.scandir(PAQUETES_DIR) if e.is_dir()] if os.path.isdir(PAQUETES_DIR) else []
+            sugerido = "libros"
+        else:
+            nombre = limpiar_nombre(self.nombre_libro.get().strip())
+            paquetes = [os.path.join(PAQUETES_DIR, nombre)] if nombre else []
+            sugerido = nombre
+        paquetes = [p for p in paquetes if os.path.isdir(p)]
+        if not paquetes:
+            messagebox.showerror("Error", "No hay paquetes generados para exportar.")
+            return
+        destino = filedialog.asksaveasfilename(
+            title="Exportar paquete", initialfile=f"{sugerido}.zip", defaultextension=".zip",
+            filetypes=[("Zip", "*.zip"), ("Tar + Zstandard", "*.tar.zst")])
+        if not destino:
+            return
+
+        def _exportar():
+            try:
+                exportar_paquetes(lambda m: safe_log(self.logbox, m), paquetes, destino, dedup=todos)
+            except Exception as e:
+                safe_log(self.logbox, f"✗ ERROR exportando paquete: {e}")
+        threading.Thread(target=_exportar, daemon=True).start()
+
+    def importar_paquete(self):
+        """Restaura en paquetes/ los libros de un archivo exportado."""
+        archivo = filedialog.askopenfilename(
+            title="Importar paquete", filetypes=[("Paquetes exportados", "*.zip *.tar.zst")])
+        if not archivo:
+            return
+        reemplazar = messagebox.askyesno(
+            "Importar paquete",
+            "Si el archivo trae libros que ya existen en paquetes/, ¿reemplazarlos?\n\n"
+            "No = cancelar la importación si hay alguno repetido.")
+
+        def _importar():
+            try:
+                importar_paquetes(lambda m: safe_log(self.logbox, m), archivo, PAQUETES_DIR, reemplazar=reemplazar)
+            except Exception as e:
+                safe_log(self.logbox, f"✗ ERROR importando paquete: {e}")
+        threading.Thread(target=_importar, daemon=True).start()
+
     def generar_iconos(self):
         """
-        Genera los íconos de la aplicación en diferentes resoluciones
-        basados en la imagen de portada y los coloca en las carpetas mipmap.
-        También corrige el AndroidManifest.xml y elimina íconos adaptativos antiguos.
+        Genera los íconos de la aplicación (clásicos, redondos y adaptativos) y el splash
+        a partir de la imagen de portada, y corrige el AndroidManifest.xml.
+        Solo se reescriben los recursos que cambiaron.
         """
         self.set_progress("Generando íconos para el APK...")
         safe_log(self.logbox, "Iniciando generación de íconos...")
         try:
-            # Limpiar íconos existentes en mipmap-* del proyecto de trabajo antes de generar nuevos
-            safe_log(self.logbox, "Limpiando íconos antiguos en mipmap-* del proyecto de trabajo.")
-            mipmap_folders = [f for f in os.listdir(ICONO_BASE_DIR) if f.startswith("mipmap-")]
-            for mipmap in mipmap_folders:
-                folder_path = os.path.join(ICONO_BASE_DIR, mipmap)
-                for file in os.listdir(folder_path):
-                    file_path = os.path.join(folder_path, file)
-                    if os.path.isfile(file_path) and file.endswith((".png", ".xml")):
-                        try:
-                            os.remove(file_path)
-                            safe_log(self.logbox, f"  - Eliminado: {os.path.basename(file_path)}")
-                        except Exception as e:
-                            safe_log(self.logbox, f"  - Error eliminando archivo de ícono {file_path}: {e}")
-                        time.sleep(0.05) # Pequeña pausa después de eliminar
-            safe_log(self.logbox, "✓ Íconos antiguos en mipmap-* limpiados.")
-
             # Ruta a la portada que se usará para generar los íconos
             portada_path_for_icons = os.path.join(PAQUETES_DIR, limpiar_nombre(self.nombre_libro.get().strip()), "portada.jpg")
             if not os.path.exists(portada_path_for_icons):
                 raise FileNotFoundError(f"No se encontró la portada para generar íconos en: {portada_path_for_icons}")
-            
-            with Image.open(portada_path_for_icons) as img:
-                img = img.convert("RGBA") # Asegurar que la imagen tenga canal alfa para transparencia
-                resample_mode = Image.Resampling.LANCZOS # Mejor calidad de redimensionado
-                mipmaps = { # Definición de tamaños de íconos para diferentes densidades
-                    "mipmap-mdpi": 48,
-                    "mipmap-hdpi": 72,
-                    "mipmap-xhdpi": 96,
-                    "mipmap-xxhdpi": 144,
-                    "mipmap-xxxhdpi": 192,
-                }
-                for d, s in mipmaps.items():
-                    dest = os.path.join(ICONO_BASE_DIR, d)
-                    os.makedirs(dest, exist_ok=True) # Asegurarse de que la carpeta exista
-                    
-                    # Generar ícono cuadrado (ic_launcher.png)
-                    try:
-                        ImageOps.fit(img, (s, s), resample_mode).save(os.path.join(dest, "ic_launcher.png"), "PNG")
-                        safe_log(self.logbox, f"  - Generado: {os.path.join(d, 'ic_launcher.png')}")
-                    except Exception as e:
-                        safe_log(self.logbox, f"  - Error generando ic_launcher.png en {d}: {e}")
-                    time.sleep(0.05) # Pausa
-                    
-                    # Generar ícono redondo (ic_launcher_round.png)
-                    try:
-                        mask = Image.new("L", (s, s), 0)
-                        draw = ImageDraw.Draw(mask)
-                        draw.ellipse((0, 0, s, s), fill=255) # Máscara circular
-                        imgr = ImageOps.fit(img, (s, s), resample_mode)
-                        imgr.putalpha(mask) # Aplicar máscara
-                        imgr.save(os.path.join(dest, "ic_launcher_round.png"), "PNG")
-                        safe_log(self.logbox, f"  - Generado: {os.path.join(d, 'ic_launcher_round.png')}")
-                    except Exception as e:
-                        safe_log(self.logbox, f"  - Error generando ic_launcher_round.png en {d}: {e}")
-                    time.sleep(0.05) # Pausa
-            safe_log(self.logbox, "✓ Íconos generados en todos los mipmap del proyecto de trabajo.")
+
+            generar_recursos_android(
+                lambda m: safe_log(self.logbox, m),
+                portada_path_for_icons,
+                ICONO_BASE_DIR,
+                os.path.join(GEN_DIR, "icon_cache"),
+            )
             
             # Llama a corrige_android_manifest con el nombre del paquete unificado
             nombre_limpio = limpiar_nombre(self.nombre_libro.get().strip())
             package_name = get_package_name(nombre_limpio)
             corregir_android_manifest(self.logbox, package_name)
-            time.sleep(0.1) # Pausa
-            
-            elimina_foreground_icons(self.logbox) # Pasar logbox
-            time.sleep(0.1) # Pausa
-            elimina_xml_adaptativos(self.logbox) # Pasar logbox
-            time.sleep(0.1) # Pausa
-            safe_log(self.logbox, "✓ Manifest corregido, foregrounds e XML adaptativos eliminados.")
+            safe_log(self.logbox, "✓ Manifest corregido.")
             return True
         except Exception as e:
             safe_log(self.logbox, f"✗ ERROR CRÍTICO generando íconos: {e}")
@@ -2761,17 +3191,16 @@ console.error(`Error cargando modelo ${content.modelUrl}:`, error);
         if not os.path.exists(libro_dir):
              messagebox.showerror("Error", f"No se encontró el paquete de contenido para '{nombre}'. Por favor, 'Generar Paquete' primero.")
              return
+        os.utime(libro_dir)
 
         paquete_www_dir = os.path.join(libro_dir)
         capacitor_www_dir = WWW_DIR
-        if os.path.exists(capacitor_www_dir): shutil.rmtree(capacitor_www_dir)
-        shutil.copytree(paquete_www_dir, capacitor_www_dir, dirs_exist_ok=True)
-        safe_log(self.logbox, f"✓ Contenido web copiado a '{capacitor_www_dir}'.")
+        sincronizar_www(lambda m: safe_log(self.logbox, m), paquete_www_dir, capacitor_www_dir)
+        safe_log(self.logbox, f"✓ Contenido web sincronizado en '{capacitor_www_dir}'.")
         
         # Crear recursos de estilo para evitar errores de compilación de tema
         crear_styles_xml(self.logbox)
         crear_colors_xml(self.logbox)
-        crear_splash_background(self.logbox)
 
         try:
             # --- LÓGICA UNIFICADA Y DEFINITIVA PARA CONFIGURAR PAQUETE ---
@@ -2802,6 +3231,7 @@ console.error(`Error cargando modelo ${content.modelUrl}:`, error);
             crear_archivos_adicionales_android(self.logbox, backend_host)
             self.generar_iconos()
             self.crear_y_copiar_frontend_ar(self.logbox) # Crear e inyectar el script de AR
+            generar_precache(lambda m: safe_log(self.logbox, m), WWW_DIR)
             
         except Exception as e:
             self.set_progress("Error durante la configuración de Android.", "red")
@@ -2902,6 +3332,15 @@ console.error(`Error cargando modelo ${content.modelUrl}:`, error);
         """
         El hilo que realmente corre el servidor y ngrok.
         """
+        try:
+            from flask import Flask, jsonify
+            from flask_cors import CORS
+            from pyngrok import ngrok
+        except ImportError as e:
+            safe_log(self.logbox, f"✗ Falta una dependencia del servidor: {e}. Instale: pip install Flask flask-cors pyngrok")
+            self.set_progress("Faltan dependencias del servidor.", "red")
+            return
+
         # Define a simple Flask app to serve the 'www' directory
         app = Flask(__name__)
         CORS(app) # Habilitar CORS para todas las rutas
@@ -2910,24 +3349,41 @@ console.error(`Error cargando modelo ${content.modelUrl}:`, error);
         def serve_static(path):
             if not os.path.exists(WWW_DIR):
                 return "El directorio 'www' no ha sido generado todavía.", 404
-            return send_from_directory(WWW_DIR, path)
+            return enviar_estatico(WWW_DIR, path)
 
         @app.route('/')
         def serve_index():
             index_path = os.path.join(WWW_DIR, 'index.html')
             if not os.path.exists(index_path):
                 return "index.html no encontrado. Por favor, genere el paquete primero.", 404
-            return send_from_directory(WWW_DIR, 'index.html')
+            return enviar_estatico(WWW_DIR, 'index.html')
         
         @app.route('/activar', methods=['POST'])
         def activar_ruta():
             # Simulación de la respuesta del backend para pruebas locales
             return jsonify({"valid": True, "message": "Activado exitosamente (simulado)"})
 
-        # Start Flask in a separate thread, ensuring debug/reloader are off to prevent threading issues.
-        flask_thread = threading.Thread(target=lambda: app.run(port=5001, host='0.0.0.0', debug=False, use_reloader=False), daemon=True)
-        flask_thread.start()
-        safe_log(self.logbox, "✓ Servidor Flask de prueba iniciado en http://localhost:5001")
+        if self.modo_servidor_var.get() == "producción":
+            # create_app (activación real contra SQLite y /metrics) en su propio proceso
+            try:
+                opciones = {"port": 5001, "workers": int(self.workers_var.get()), "threads": int(self.threads_var.get())}
+            except ValueError:
+                safe_log(self.logbox, "✗ Workers e hilos deben ser números enteros.")
+                self.set_progress("Configuración de servidor inválida.", "red")
+                return
+            try:
+                detener_proceso(lambda m: safe_log(self.logbox, m), self.servidor_proc)
+                self.servidor_proc = iniciar_proceso(lambda m: safe_log(self.logbox, m), opciones)
+            except Exception as e:
+                safe_log(self.logbox, f"✗ ERROR al iniciar el servidor de producción: {e}")
+                self.set_progress("Error al iniciar el servidor.", "red")
+                return
+            safe_log(self.logbox, "✓ Servidor de producción iniciado en http://localhost:5001")
+        else:
+            # Start Flask in a separate thread, ensuring debug/reloader are off to prevent threading issues.
+            flask_thread = threading.Thread(target=lambda: app.run(port=5001, host='0.0.0.0', debug=False, use_reloader=False), daemon=True)
+            flask_thread.start()
+            safe_log(self.logbox, "✓ Servidor Flask de prueba iniciado en http://localhost:5001")
         
         # Start ngrok tunnel
         try:
@@ -2952,6 +3408,17 @@ console.error(`Error cargando modelo ${content.modelUrl}:`, error);
             self.set_progress("Error al iniciar ngrok.", "red")
             messagebox.showerror("Error de Ngrok", f"No se pudo iniciar ngrok. Asegúrate de que esté configurado correctamente.\nError: {e}")
 
+    def detener_servidor(self):
+        """Detiene el servidor de producción (el de desarrollo vive en un hilo daemon de la GUI)."""
+        if self.servidor_proc is None or self.servidor_proc.poll() is not None:
+            safe_log(self.logbox, "No hay un servidor de producción en ejecución.")
+            return
+        threading.Thread(target=detener_proceso, args=(lambda m: safe_log(self.logbox, m), self.servidor_proc), daemon=True).start()
+
+    def al_cerrar(self):
+        detener_proceso(lambda m: None, self.servidor_proc, timeout=5)
+        self.root.destroy()
+
 if __name__ == "__main__":
     root = Tk()
     app = GeneradorGUI(root)